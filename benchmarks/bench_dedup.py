@@ -0,0 +1,75 @@
+"""近似重复消息合并微基准
+
+用模拟的聊天记录测量 ``chatsummary/dedup.py`` 中 ``collapse_duplicates``
+的耗时和合并效果，消息数量每次翻倍，耗时也应大致翻倍（线性）。
+不需要安装 Red。
+
+用法:
+    python benchmarks/bench_dedup.py [最大消息数]
+"""
+import importlib.util
+import os
+import random
+import sys
+import time
+
+_MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chatsummary", "dedup.py")
+_spec = importlib.util.spec_from_file_location("dedup", _MODULE_PATH)
+dedup = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dedup)
+
+ANNOUNCEMENTS = [
+    "📢 公告：今晚 22:00 服务器维护，预计持续一小时，请提前保存进度",
+    "Free nitro giveaway!!! claim at discord-gift.example before it expires",
+    "欢迎新成员加入！请先阅读规则频道并在自我介绍频道打个招呼",
+]
+REACTIONS = ["+1", "👍", "哈哈哈", "lol", "同意", "+1!", "😂😂"]
+
+
+def random_chat(rng: random.Random) -> str:
+    length = rng.randrange(8, 80)
+    return "".join(chr(0x4E00 + rng.randrange(3000)) for _ in range(length))
+
+
+def make_messages(n: int, seed: int = 1) -> list:
+    """约 60% 普通聊天、25% 简短回应、15% 带少量改动的重复公告"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.6:
+            messages.append(random_chat(rng))
+        elif roll < 0.85:
+            messages.append(rng.choice(REACTIONS))
+        else:
+            text = rng.choice(ANNOUNCEMENTS)
+            messages.append(text + "!" * rng.randrange(3))
+    return messages
+
+
+def measure(messages: list, repeat: int = 3):
+    best = float("inf")
+    counts = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counts = dedup.collapse_duplicates(messages)
+        best = min(best, time.perf_counter() - start)
+    kept = sum(1 for count in counts if count)
+    return best, kept
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 64_000
+    size = 2_000
+    previous = None
+    print(f"{'消息数':>10}{'耗时':>12}{'保留':>10}{'增长比':>10}")
+    while size <= max_size:
+        seconds, kept = measure(make_messages(size))
+        ratio = seconds / previous if previous else 0.0
+        print(f"{size:>10,}{seconds * 1000:>10.1f}ms{kept:>10,}{ratio:>10.2f}")
+        previous = seconds
+        size *= 2
+
+
+if __name__ == "__main__":
+    main()
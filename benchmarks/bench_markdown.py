@@ -0,0 +1,71 @@
+"""Markdown 解析器微基准
+
+用病态输入测量 ``chatsummary/markdown_pdf.py`` 中 ``tokenize`` 和
+``inline_markup`` 的耗时，输入规模每次翻倍，耗时也应大致翻倍（线性）。
+只测量解析部分，不需要安装 reportlab 或 Red。
+
+用法:
+    python benchmarks/bench_markdown.py [最大规模]
+"""
+import importlib.util
+import os
+import sys
+import time
+
+_MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chatsummary", "markdown_pdf.py")
+_spec = importlib.util.spec_from_file_location("markdown_pdf", _MODULE_PATH)
+markdown_pdf = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(markdown_pdf)
+
+# 病态输入：名称 -> 根据规模 n 生成文本的函数
+CASES = {
+    "大量 **": lambda n: "**" * n,
+    "未闭合的粗体": lambda n: "**" + "a" * n,
+    "交替粗体": lambda n: "**a** " * (n // 6),
+    "单行超长文本": lambda n: "x" * n,
+    "大量列表项": lambda n: "- **项目**：说明\n" * (n // 12),
+    "不带空格的 #": lambda n: "#" * n,
+    "只有 * 的行": lambda n: "*\n" * (n // 2),
+    "XML 特殊字符": lambda n: "<&>" * (n // 3),
+    "大量标题": lambda n: "### 标题\n" * (n // 7),
+}
+
+
+def parse(text: str) -> int:
+    count = 0
+    for kind, value in markdown_pdf.tokenize(text):
+        if kind == markdown_pdf.HEADING:
+            markdown_pdf.inline_markup(value[1])
+        elif value is not None:
+            markdown_pdf.inline_markup(value)
+        count += 1
+    return count
+
+
+def measure(text: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_600_000
+    sizes = []
+    size = 100_000
+    while size <= max_size:
+        sizes.append(size)
+        size *= 2
+
+    print(f"{'输入':<14}" + "".join(f"{s:>12,}" for s in sizes) + f"{'增长比':>10}")
+    for name, make in CASES.items():
+        timings = [measure(make(s)) for s in sizes]
+        # 规模每翻倍一次的平均耗时增长比，线性时约为 2
+        ratio = (timings[-1] / timings[0]) ** (1 / max(len(timings) - 1, 1)) if timings[0] else 0.0
+        print(f"{name:<14}" + "".join(f"{t * 1000:>10.1f}ms" for t in timings) + f"{ratio:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""小频道批量总结
+
+全服务器总结时，大多数频道只有寥寥几条消息，却各自要发送一次带完整
+提示词的请求。这里把多个小频道的聊天记录放进同一个请求，用分隔标记区分
+各个频道，再从回复中按标记拆出每个频道的总结。某个频道的总结缺失或无法
+解析时返回 None，由调用方改为单独总结该频道。
+
+``BatchCollector`` 在频道并发读取消息的同时收集小频道：批次达到 token 预算
+或频道数上限时立即发出，所有频道都已提交或确定不参与批量后发出剩余的批次。
+"""
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .llm import TokenUsage
+
+log = logging.getLogger("red.chatsummary.batching")
+
+# 分隔标记：请求中为 <<<频道 序号: 标题>>>，回复中为 <<<频道 序号>>>
+SECTION_MARK = "<<<频道 {index}: {title}>>>"
+RESPONSE_MARK = "<<<频道 {index}>>>"
+
+# 回复中的分隔标记（容忍模型添加的标题符号、加粗和标题文字）
+_RESPONSE_MARK_RE = re.compile(r"^[#*\s]*<<<\s*频道\s*(\d+)[^>\n]*>>>[*\s]*$", re.MULTILINE)
+
+
+class BatchItem(NamedTuple):
+    """批次中的一个频道"""
+
+    title: str
+    transcript: str
+    tokens: int
+    cache_key: Optional[str] = None
+
+
+def build_batch_content(items: Sequence[BatchItem]) -> str:
+    """把各频道的聊天记录用分隔标记连接起来"""
+    return "\n\n".join(
+        f"{SECTION_MARK.format(index=index, title=item.title)}\n{item.transcript}"
+        for index, item in enumerate(items, 1)
+    )
+
+
+def parse_batch_response(text: str, count: int) -> List[Optional[str]]:
+    """按分隔标记拆出每个频道的总结
+
+    返回:
+        长度为 count 的列表，缺失、重复或为空的部分为 None
+    """
+    sections: List[Optional[str]] = [None] * count
+    seen: Set[int] = set()
+    marks = list(_RESPONSE_MARK_RE.finditer(text))
+    for position, mark in enumerate(marks):
+        index = int(mark.group(1))
+        end = marks[position + 1].start() if position + 1 < len(marks) else len(text)
+        body = text[mark.end():end].strip()
+        if not 1 <= index <= count:
+            continue
+        if index in seen:
+            # 同一个频道出现两次，无法确定哪一段是对的
+            sections[index - 1] = None
+            continue
+        seen.add(index)
+        sections[index - 1] = body or None
+    return sections
+
+
+# 总结一个批次：返回与批次对应的 (总结文本, 分摊的 token 用量)，None 表示需要单独总结
+BatchRunner = Callable[[List[BatchItem]], Awaitable[List[Optional[Tuple[str, TokenUsage]]]]]
+
+
+class BatchCollector:
+    """收集小频道并按批次调用 run_batch
+
+    参数:
+        run_batch: 总结一个批次的协程函数（见 ``BatchRunner``）
+        token_budget: 每个批次聊天记录的 token 上限
+        max_items: 每个批次最多的频道数
+        expected: 参与收集的频道总数（每个频道必须调用一次 submit 或 decline）
+    """
+
+    def __init__(self, run_batch: BatchRunner, token_budget: int, max_items: int, expected: int):
+        self._run_batch = run_batch
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self._remaining = expected
+        self._pending: List[Tuple[BatchItem, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, item: BatchItem) -> asyncio.Future:
+        """加入批次，返回该频道结果的 Future（None 表示需要单独总结）"""
+        if self._pending and (
+            self._pending_tokens + item.tokens > self.token_budget or len(self._pending) >= self.max_items
+        ):
+            self._flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._pending_tokens += item.tokens
+        self._remaining -= 1
+        if self._remaining <= 0 or len(self._pending) >= self.max_items:
+            self._flush()
+        return future
+
+    def decline(self):
+        """该频道不参与批量（没有消息、消息较多或读取失败）"""
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._flush()
+
+    def close(self):
+        """取消尚未完成的批次"""
+        for task in list(self._tasks):
+            task.cancel()
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = []
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        self._pending_tokens = 0
+        if not batch:
+            return
+        if len(batch) == 1:
+            # 只有一个频道时没有合并的意义，直接单独总结
+            future = batch[0][1]
+            if not future.done():
+                future.set_result(None)
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[BatchItem, asyncio.Future]]):
+        try:
+            results = await self._run_batch([item for item, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            log.error(f"批量总结失败，改为逐个频道总结: {e}", exc_info=True)
+            results = [None] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
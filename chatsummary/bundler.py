@@ -0,0 +1,186 @@
+"""导出文件打包
+
+把导出生成的文件压缩打包为 zip（或 tar.zst）压缩包，多个频道的文件
+合并到尽量少的压缩包中，并保证每个压缩包都不超过服务器的上传大小限制。
+文件按估算的压缩后大小分组（导出的 CSV、NDJSON 通常能压缩到原来的几分之一），
+写出的压缩包超过限制时把该组拆成两半重新打包。
+单个文件压缩后仍然超过限制时，按字节拆分为编号的分卷（``.001``、``.002``……），
+下载后按顺序拼接即可还原（``cat name.zip.* > name.zip`` 或 7-Zip 直接打开）。
+
+打包是同步的 CPU/磁盘操作，由插件放到导出线程池中执行。
+"""
+import logging
+import os
+import tarfile
+import zipfile
+import zlib
+from collections import deque
+from typing import List, Tuple
+
+log = logging.getLogger("red.chatsummary.bundle")
+
+# 打包格式及扩展名
+BUNDLE_FORMATS = {
+    "zip": ".zip",
+    "zstd": ".tar.zst",
+}
+
+# 已经压缩过的文件类型，打包时直接存储，不再重复压缩
+_COMPRESSED_EXTENSIONS = (".xlsx", ".gz", ".parquet", ".zip", ".zst")
+
+# 每个压缩包条目的额外开销估计（文件头、目录项等）
+_ENTRY_OVERHEAD = 1024
+
+# 估算压缩率时读取的样本大小（导出文件的各行结构相同，开头的样本足以代表整个文件）
+_SAMPLE_SIZE = 4 * 1024 * 1024
+
+# 压缩率估算的余量（估算偏大时只是多一个压缩包，偏小时需要重新打包）
+_ESTIMATE_MARGIN = 1.1
+
+# 拆分分卷时每次读写的块大小
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def estimate_compressed_size(path: str, arcname: str) -> int:
+    """估算文件打包后占用的字节数
+
+    已压缩的文件按原始大小计算；其他文件用开头的样本按 deflate 压缩，
+    按样本的压缩率换算整个文件（zstd 的压缩率通常更高，估算偏保守）。
+    """
+    size = os.path.getsize(path)
+    if arcname.lower().endswith(_COMPRESSED_EXTENSIONS) or size == 0:
+        return size + _ENTRY_OVERHEAD
+    with open(path, "rb") as f:
+        sample = f.read(_SAMPLE_SIZE)
+    ratio = len(zlib.compress(sample, 6)) / len(sample)
+    return int(size * min(ratio * _ESTIMATE_MARGIN, 1.0)) + _ENTRY_OVERHEAD
+
+
+def _pack_groups(files: List[Tuple[str, str]], max_size: int) -> List[List[Tuple[str, str]]]:
+    """按估算的压缩后大小把文件依次分组，每组估算总大小不超过 max_size
+
+    超过限制的单个文件单独成组，之后再拆分。
+    """
+    groups = []
+    current = []
+    current_size = 0
+    for path, arcname in files:
+        size = estimate_compressed_size(path, arcname)
+        if current and current_size + size > max_size:
+            groups.append(current)
+            current = []
+            current_size = 0
+        current.append((path, arcname))
+        current_size += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _write_zip(archive_path: str, group: List[Tuple[str, str]]):
+    with zipfile.ZipFile(archive_path, "w", allowZip64=True) as zf:
+        for path, arcname in group:
+            if arcname.lower().endswith(_COMPRESSED_EXTENSIONS):
+                zf.write(path, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                zf.write(path, arcname, compress_type=zipfile.ZIP_DEFLATED, compresslevel=6)
+
+
+def _write_tar_zst(archive_path: str, group: List[Tuple[str, str]]):
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=6, threads=-1)
+    with open(archive_path, "wb") as raw:
+        with compressor.stream_writer(raw) as stream:
+            with tarfile.open(fileobj=stream, mode="w|") as tar:
+                for path, arcname in group:
+                    tar.add(path, arcname=arcname)
+
+
+def split_file(path: str, part_size: int) -> List[str]:
+    """把文件按字节拆分为编号的分卷（原文件会被删除）
+
+    返回:
+        分卷文件路径列表（name.001、name.002……）
+    """
+    parts = []
+    with open(path, "rb") as src:
+        index = 1
+        while True:
+            part_path = f"{path}.{index:03d}"
+            written = 0
+            with open(part_path, "wb") as dst:
+                while written < part_size:
+                    chunk = src.read(min(_COPY_CHUNK_SIZE, part_size - written))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    written += len(chunk)
+            if written == 0:
+                os.remove(part_path)
+                break
+            parts.append(part_path)
+            index += 1
+    os.remove(path)
+    return parts
+
+
+def bundle_files(files: List[Tuple[str, str]], base_path: str, max_part_size: int, bundle_format: str = "zip") -> List[str]:
+    """把导出文件打包为不超过 max_part_size 的压缩包
+
+    参数:
+        files: [(文件路径, 压缩包内的文件名), ...]，按顺序打包
+        base_path: 压缩包路径（不含扩展名）；多个压缩包时追加 ``.partN``
+        max_part_size: 每个上传文件的最大字节数
+        bundle_format: zip 或 zstd（tar.zst，需要 zstandard，未安装时改用 zip）
+
+    返回:
+        需要上传的文件路径列表（按顺序）
+    """
+    writer = _write_zip
+    if bundle_format == "zstd":
+        try:
+            import zstandard  # noqa: F401
+            writer = _write_tar_zst
+        except ImportError:
+            log.warning("zstandard库未安装，改用zip格式打包")
+            bundle_format = "zip"
+    extension = BUNDLE_FORMATS[bundle_format]
+
+    pending = deque(_pack_groups(files, max_part_size))
+    archives = []
+    try:
+        while pending:
+            group = pending.popleft()
+            archive_path = f"{base_path}.tmp{len(archives) + 1}{extension}"
+            writer(archive_path, group)
+            size = os.path.getsize(archive_path)
+            if size > max_part_size and len(group) > 1:
+                # 压缩率估算偏小：把这一组拆成两半重新打包
+                os.remove(archive_path)
+                middle = len(group) // 2
+                pending.extendleft([group[middle:], group[:middle]])
+                continue
+            archives.append((archive_path, size))
+    except BaseException:
+        for path in [archive_path] + [path for path, _ in archives]:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    outputs = []
+    for index, (temp_path, size) in enumerate(archives, 1):
+        if len(archives) == 1:
+            archive_path = f"{base_path}{extension}"
+        else:
+            archive_path = f"{base_path}.part{index}{extension}"
+        os.replace(temp_path, archive_path)
+
+        if size > max_part_size:
+            # 单个文件压缩后仍然过大，拆分为分卷
+            outputs.extend(split_file(archive_path, max_part_size))
+        else:
+            outputs.append(archive_path)
+
+    log.info(f"已将 {len(files)} 个文件打包为 {len(outputs)} 个上传文件")
+    return outputs
@@ -1,17 +1,134 @@
 import discord
 from redbot.core import commands, Config, checks
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 from datetime import datetime, timedelta
 import asyncio
-from typing import Optional, List, Dict, Tuple
-from collections import defaultdict
+from typing import Awaitable, Callable, Optional, List, Tuple
+from collections import Counter, defaultdict
 import json
 import logging
 import os
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+from .batching import BatchCollector, BatchItem, build_batch_content, parse_batch_response
+from .bundler import BUNDLE_FORMATS, bundle_files
+from .config_view import build_config_embed
+from .exporters import EXPORT_FORMATS, ChannelStats, build_channel_export, build_multi_channel_export
+from .fonts import font_registry
+from .http_pool import HTTPSessionPool
+from .live_embed import LiveEmbed
+from .llm import Completion, LLMError, TokenUsage
+from .llm_scheduler import CircuitOpenError, LLMRequestScheduler
+from .message_store import MessageStore, MessageRecord
+from .pdf_report import render_pdf_report, warm_up as warm_up_pdf_worker
+from .ratelimit import DiscordRateBudget
+from .render_pool import RenderError, RenderPool, RenderPoolBusy
+from .scheduler import JobScheduler
+from .summary_result import STATUS_EMPTY, STATUS_SUMMARIZED, STATUS_UNCHANGED, ChannelSummary, SummaryStats
+from .summary_cache import SummaryCache, make_cache_key
+from .transcript import (
+    chunk_lines,
+    estimate_tokens,
+    join_lines,
+    model_profile,
+    pack_lines,
+    prompt_token_budget,
+    transcript_lines,
+)
 
 log = logging.getLogger("red.chatsummary")
 
+# 单条消息保留的最大 token 数（普通模式 / 分层总结模式）
+MESSAGE_TOKEN_LIMIT = 100
+HIERARCHICAL_MESSAGE_TOKEN_LIMIT = 400
+
+# 提示词版本：修改提示词或总结流程后递增，使旧的缓存总结失效
+PROMPT_VERSION = 2
+
+# 总结的最大输出 token 数
+SUMMARY_MAX_TOKENS = 500
+
+# 系统提示词和消息格式占用的 token 数
+PROMPT_OVERHEAD_TOKENS = 50
+
+# 流式总结的占位文本和生成中的光标
+STREAM_PLACEHOLDER = "⏳ 正在生成总结..."
+STREAM_CURSOR = " ▌"
+
+# 分层总结中每个分块总结的最大输出 token 数
+PARTIAL_MAX_TOKENS = 400
+
+# 批量总结：聊天记录不超过该 token 数的频道视为小频道
+BATCH_CHANNEL_TOKENS = 800
+# 每个批次最多的频道数，以及每个频道总结的最大输出 token 数
+BATCH_MAX_CHANNELS = 8
+BATCH_SECTION_MAX_TOKENS = 300
+
+# 导出线程池的线程数（同时构建的工作簿数量上限）
+EXPORT_WORKERS = 2
+
+# 多频道流水线导出的线程数：写入线程在整个同步过程中等待频道就绪，
+# 使用单独的线程池，不占用单频道导出和打包使用的导出线程
+EXPORT_PIPELINE_WORKERS = 2
+
+# 上传文件大小占服务器上传限制的比例（留出余量）
+UPLOAD_SIZE_MARGIN = 0.95
+
+# 多频道导出时最多提前同步好、等待写入的频道数
+EXPORT_PREFETCH_CHANNELS = 4
+
+# 调度器中的任务类型
+SUMMARY_JOB = "summary"
+EXPORT_JOB = "export"
+
+# 报告渲染进程池：默认工作进程数、单个报告的默认超时秒数、最多等待的报告数
+RENDER_WORKERS = 2
+RENDER_TIMEOUT = 300
+RENDER_QUEUE_LIMIT = 8
+
+SUMMARY_PROMPT = """You are an **expert in summarizing Discord content**, skilled at extracting key information and generating **high-quality, well-structured summaries**.
+Based on the provided Video Transcript, complete the following tasks:
+
+**Task Description:**
+Act as a helpful assistant. Your task is to summarize the key points from [meeting notes]. The summary should be concise yet comprehensive, capturing the essence of the meeting. Your summary should enable someone who wasn't present at the meeting to understand its outcomes and next steps clearly.Length: - Ensure the response has a minimum of 800 words
+
+Language: - The entire output, including **section titles and labels**, must be written in the "简体中文" language (For example, Summary, Highlights, Key Insights, Outline, Core Concepts, Keywords, FAQ, etc. all need to be translated into 简体中文 language.).
+- Do **not** include any separators (`---`), or additional text outside of the task results.
+
+The Discord content:
+{content}"""
+
+PARTIAL_PROMPT = """以下是一段 Discord 聊天记录（第 {index}/{total} 部分，按时间顺序排列）。
+请用简体中文列出这部分的要点：讨论的话题、重要结论、决定和待办事项，以及关键参与者。
+只输出要点列表，不要添加其他说明。
+
+{content}"""
+
+REDUCE_PREFIX = "（以下是按时间顺序排列的各部分聊天记录要点）\n\n"
+
+BATCH_PROMPT = """以下是同一个 Discord 服务器中 {count} 个频道的聊天记录，每个频道以 <<<频道 序号: 分类 / 频道名>>> 开头，按时间顺序排列。
+请分别为每个频道写一段简洁的简体中文总结：讨论的话题、重要结论、决定和待办事项，以及关键参与者。不要把不同频道的内容混在一起。
+
+输出格式：每个频道的总结单独以一行 <<<频道 序号>>> 开头（序号与输入一致，不加频道名），从 <<<频道 1>>> 到 <<<频道 {count}>>> 依次输出，不要添加其他说明。
+
+{content}"""
+
+ROLLING_PROMPT = """You are an **expert in summarizing Discord content**. Below is the previous summary of a Discord channel, followed by the messages posted since then.
+Update the summary: keep the information from the previous summary that is still relevant, merge in the new discussions, conclusions and next steps, and drop details that have become outdated. Output the complete updated summary, not only the changes.
+
+Language: - The entire output, including **section titles and labels**, must be written in the "简体中文" language.
+- Do **not** include any separators (`---`), or additional text outside of the task results.
+
+The previous summary:
+{previous}
+
+The new Discord content:
+{content}"""
+
 
 class ChatSummary(commands.Cog):
     """聊天频道总结插件
@@ -31,6 +148,8 @@ class ChatSummary(commands.Cog):
             "model": "gpt-3.5-turbo",
             "max_messages": 100,  # 总结功能的最大消息数
             "export_max_messages": 1000,  # 导出功能的最大消息数
+            "export_format": "xlsx",  # 默认导出格式：xlsx / csv / ndjson / parquet
+            "export_bundle_format": "zip",  # 打包导出文件的格式：zip / zstd
             "summary_channel": None,  # 总结消息发送的频道
             "export_channel": None,  # Excel导出文件发送的频道
             "scheduled_tasks": {},  # {channel_id: {"interval": hours, "enabled": True}}
@@ -40,123 +159,171 @@ class ChatSummary(commands.Cog):
             "export_excluded_channels": [],  # 导出功能排除的频道
             "export_excluded_categories": [],  # 导出功能排除的分类列表
             "include_bots": False,
+            "summary_concurrency": 3,  # 批量总结时同时处理的频道数
+            "api_max_connections": 10,  # 与 API 服务器的最大并发连接数
+            "api_rpm": 0,  # 每分钟最多请求数（0 表示不限制）
+            "api_tpm": 0,  # 每分钟最多 token 数（0 表示不限制）
+            "hierarchical_summary": False,  # 分层总结（分块总结后合并），适合大量消息
+            "summary_chunk_tokens": 2000,  # 分层总结时每个分块的 token 预算
+            "summary_prompt_tokens": 3000,  # 普通模式下聊天记录的 token 预算（不超过模型的上下文窗口）
+            "summary_dedup": True,  # 合并近似重复的消息后再发送给 AI
+            "summary_batching": False,  # 批量总结时把多个小频道合并到一个请求中
+            "summary_cache_enabled": True,  # 频道没有新消息时复用上次的总结
+            "stream_summaries": False,  # summary channel 以流式方式边生成边显示总结
+            "schedule_catch_up": True,  # 机器人离线期间错过的定时任务，启动后是否补跑一次
+            "schedule_jitter": 0,  # 定时任务每次运行随机推迟的最大分钟数（0 表示不推迟）
         }
         
         self.config.register_guild(**default_guild)
         
-        # 定时任务字典
-        self.scheduled_jobs = {}
-        self.export_jobs = {}  # Excel导出定时任务
+        # 机器人级别的配置（所有服务器共用）
+        default_global = {
+            "render_workers": RENDER_WORKERS,  # 报告渲染进程数
+            "render_timeout": RENDER_TIMEOUT,  # 单个报告的渲染超时（秒）
+        }
+        self.config.register_global(**default_global)
+        
+        # 定时总结和定时导出共用一个调度器（下次运行时间保存在任务配置中）
+        self.scheduler = JobScheduler(self._run_scheduled_job, self._save_next_run)
+        
+        # Discord 请求速率预算（所有服务器共享，按 429 自动调整）
+        self.rate_budget = DiscordRateBudget()
+        
+        # 本地消息存储（增量同步频道历史）
+        self.message_store = MessageStore(cog_data_path(self) / "messages.sqlite3", self.rate_budget)
+        
+        # 总结结果缓存（按频道状态命中）
+        self.summary_cache = SummaryCache(cog_data_path(self) / "summary_cache.sqlite3")
+        
+        # 共享的 AI API 连接池（插件卸载时关闭）
+        self.http_pool = HTTPSessionPool()
+        
+        # AI 请求调度（按 API 地址和 Key 限制 RPM/TPM，429/5xx 退避重试）
+        self.llm_scheduler = LLMRequestScheduler()
+        
+        # 导出专用线程池：工作簿构建和保存不在事件循环上执行
+        self.export_executor = ThreadPoolExecutor(
+            max_workers=EXPORT_WORKERS,
+            thread_name_prefix="chatsummary-export"
+        )
+        self.export_pipeline_executor = ThreadPoolExecutor(
+            max_workers=EXPORT_PIPELINE_WORKERS,
+            thread_name_prefix="chatsummary-export-pipeline"
+        )
+        
+        # PDF报告渲染进程池（所有服务器共用，工作进程启动时预热中文字体）
+        self.render_pool = RenderPool(
+            workers=RENDER_WORKERS,
+            max_queue=RENDER_QUEUE_LIMIT,
+            timeout=RENDER_TIMEOUT,
+            initializer=warm_up_pdf_worker
+        )
+        self.bot.loop.create_task(self.start_render_pool())
         
         # 启动时加载定时任务
         self.bot.loop.create_task(self.load_scheduled_tasks())
-        self.bot.loop.create_task(self.load_export_tasks())
     
-    def cog_unload(self):
-        """卸载时取消所有定时任务"""
-        for task in self.scheduled_jobs.values():
-            task.cancel()
-        for task in self.export_jobs.values():
-            task.cancel()
+    async def cog_unload(self):
+        """卸载时取消所有定时任务并释放资源"""
+        self.scheduler.stop()
+        self.rate_budget.close()
+        await self.http_pool.close()
+        self.message_store.close()
+        self.summary_cache.close()
+        self.export_executor.shutdown(wait=False)
+        self.export_pipeline_executor.shutdown(wait=False)
+        await asyncio.get_running_loop().run_in_executor(None, self.render_pool.close)
+    
+    async def start_render_pool(self):
+        """按全局配置调整渲染进程池并预先启动工作进程"""
+        self.render_pool.timeout = await self.config.render_timeout()
+        await self.render_pool.resize(await self.config.render_workers())
+        try:
+            await self.render_pool.start()
+        except Exception as e:
+            log.error(f"启动渲染进程池时出错: {e}", exc_info=True)
     
     async def load_scheduled_tasks(self):
-        """加载并启动所有已配置的定时任务"""
+        """从配置加载所有定时总结和定时导出任务，并启动调度器"""
         await self.bot.wait_until_ready()
         
         for guild in self.bot.guilds:
+            catch_up = await self.config.guild(guild).schedule_catch_up()
+            jitter = await self.config.guild(guild).schedule_jitter() * 60
             scheduled_tasks = await self.config.guild(guild).scheduled_tasks()
-            
-            for channel_id_str, task_config in scheduled_tasks.items():
+            for task_id, task_config in scheduled_tasks.items():
                 if task_config.get("enabled", False):
-                    channel_id = int(channel_id_str)
-                    interval = task_config.get("interval", 24)
-                    self.start_scheduled_task(guild.id, channel_id, interval)
-    
-    async def load_export_tasks(self):
-        """加载并启动所有已配置的导出定时任务"""
-        await self.bot.wait_until_ready()
-        
-        for guild in self.bot.guilds:
-            export_tasks = await self.config.guild(guild).export_tasks()
+                    self.scheduler.add(
+                        (SUMMARY_JOB, guild.id, task_id),
+                        task_config.get("interval", 24) * 3600,
+                        task_config.get("next_run"),
+                        catch_up,
+                        jitter
+                    )
             
+            export_tasks = await self.config.guild(guild).export_tasks()
             for task_id, task_config in export_tasks.items():
                 if task_config.get("enabled", False):
-                    self.start_export_task(guild.id, task_id, task_config)
-    
-    def start_scheduled_task(self, guild_id: int, channel_id: int, interval_hours: int):
-        """启动一个定时任务"""
-        task_key = f"{guild_id}_{channel_id}"
-        
-        # 如果任务已存在，先取消
-        if task_key in self.scheduled_jobs:
-            self.scheduled_jobs[task_key].cancel()
+                    self.scheduler.add(
+                        (EXPORT_JOB, guild.id, task_id),
+                        task_config.get("interval", 24) * 3600,
+                        task_config.get("next_run"),
+                        catch_up,
+                        jitter
+                    )
         
-        # 创建新任务
-        task = self.bot.loop.create_task(
-            self._scheduled_summary_loop(guild_id, channel_id, interval_hours)
-        )
-        self.scheduled_jobs[task_key] = task
+        log.info(f"已加载 {len(self.scheduler)} 个定时任务")
+        self.scheduler.start()
     
-    async def _scheduled_summary_loop(self, guild_id: int, channel_id: int, interval_hours: int):
-        """定时任务循环"""
-        while True:
-            try:
-                # 先等待指定时间
-                await asyncio.sleep(interval_hours * 3600)
-                
-                guild = self.bot.get_guild(guild_id)
-                if not guild:
-                    continue
-                
-                # 检查是否是全服务器总结任务（channel_id 为 0）
-                if channel_id == 0:
-                    # 执行全服务器总结
-                    await self._execute_all_summary(guild)
-                else:
-                    # 执行单个频道总结
-                    channel = guild.get_channel(channel_id)
-                    if not channel:
-                        continue
-                    await self._execute_summary(guild, channel)
-                    
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                log.error(f"定时任务执行错误 (Guild: {guild_id}, Channel: {channel_id}): {e}", exc_info=True)
+    async def start_scheduled_task(self, guild_id: int, channel_id: int, interval_hours: int):
+        """添加（或重新设置）一个定时总结任务，在一个间隔内该任务的固定相位上第一次运行"""
+        jitter = await self.config.guild_from_id(guild_id).schedule_jitter() * 60
+        self.scheduler.add((SUMMARY_JOB, guild_id, str(channel_id)), interval_hours * 3600, jitter=jitter)
     
-    def start_export_task(self, guild_id: int, task_id: str, task_config: dict):
-        """启动一个导出定时任务"""
-        task_key = f"{guild_id}_{task_id}"
-        
-        # 如果任务已存在，先取消
-        if task_key in self.export_jobs:
-            self.export_jobs[task_key].cancel()
-        
-        # 创建新任务
-        task = self.bot.loop.create_task(
-            self._export_task_loop(guild_id, task_id, task_config)
-        )
-        self.export_jobs[task_key] = task
+    async def start_export_task(self, guild_id: int, task_id: str, task_config: dict):
+        """添加（或重新设置）一个导出定时任务，在一个间隔内该任务的固定相位上第一次运行"""
+        jitter = await self.config.guild_from_id(guild_id).schedule_jitter() * 60
+        self.scheduler.add((EXPORT_JOB, guild_id, task_id), task_config.get("interval", 24) * 3600, jitter=jitter)
     
-    async def _export_task_loop(self, guild_id: int, task_id: str, task_config: dict):
-        """导出定时任务循环"""
-        while True:
-            try:
-                # 先等待指定时间
-                interval_hours = task_config.get("interval", 24)
-                await asyncio.sleep(interval_hours * 3600)
-                
-                guild = self.bot.get_guild(guild_id)
-                if not guild:
-                    continue
-                
-                # 执行导出任务
+    async def _run_scheduled_job(self, key: tuple):
+        """调度器回调：执行到期的定时总结或导出任务"""
+        kind, guild_id, task_id = key
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            return
+        
+        if kind == EXPORT_JOB:
+            # 每次运行时读取最新的任务配置
+            task_config = (await self.config.guild(guild).export_tasks()).get(task_id)
+            if task_config:
                 await self._execute_export_task(guild, task_config)
-                    
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                log.error(f"导出定时任务执行错误 (Guild: {guild_id}, Task: {task_id}): {e}", exc_info=True)
+            return
+        
+        # 检查是否是全服务器总结任务（task_id 为 "0"）
+        rolling_task = await self._rolling_task_id(guild, task_id)
+        if task_id == "0":
+            # 执行全服务器总结
+            await self._execute_all_summary(guild, rolling_task)
+        else:
+            # 执行单个频道总结
+            channel = guild.get_channel(int(task_id))
+            if not channel:
+                return
+            await self._execute_summary(guild, channel, rolling_task)
+    
+    def _next_run_text(self, key: tuple) -> str:
+        """任务下次运行时间的显示文本（Discord 相对时间戳）"""
+        next_run = self.scheduler.next_run(key)
+        return f"<t:{int(next_run)}:R>" if next_run else "未调度"
+    
+    async def _save_next_run(self, key: tuple, next_run: float):
+        """调度器回调：把下次运行时间保存到任务配置中（重启后继续原来的节奏）"""
+        kind, guild_id, task_id = key
+        group = self.config.guild_from_id(guild_id)
+        tasks_value = group.export_tasks if kind == EXPORT_JOB else group.scheduled_tasks
+        async with tasks_value() as tasks:
+            if task_id in tasks:
+                tasks[task_id]["next_run"] = next_run
     
     async def _execute_export_task(self, guild: discord.Guild, task_config: dict):
         """执行导出任务"""
@@ -165,6 +332,10 @@ class ChatSummary(commands.Cog):
             target = task_config.get("target", "")
             single_file = task_config.get("single_file", True)
             max_messages = task_config.get("max_messages", 0)
+            export_format = await self._export_format(guild, task_config.get("format"))
+            if export_format is None:
+                log.error(f"导出任务的格式无效: {task_config.get('format')} (Guild: {guild.name})")
+                return
             
             # 获取发送目标频道（优先使用导出频道，否则使用总结频道）
             export_channel_id = await self.config.guild(guild).export_channel()
@@ -202,38 +373,33 @@ class ChatSummary(commands.Cog):
                 
                 if single_file:
                     # 单文件模式
-                    await target_channel.send("📄 正在执行定时导出任务（所有频道）...")
+                    await self.rate_budget.send(target_channel, "📄 正在执行定时导出任务（所有频道）...")
                     report_title = "全服务器聊天记录"
                     excel_path = await self.generate_multi_channel_excel_report(
-                        guild, categories_dict, report_title, max_msgs
+                        guild, categories_dict, report_title, max_msgs, export_format
                     )
                     
                     if excel_path and os.path.exists(excel_path):
                         file_size = os.path.getsize(excel_path) / (1024 * 1024)
-                        await target_channel.send(
-                            f"✅ 定时导出完成（文件大小: {file_size:.2f} MB）",
-                            file=discord.File(excel_path, filename=f"{guild.name}_全服务器聊天记录.xlsx")
+                        await self._upload_export_files(
+                            guild,
+                            target_channel,
+                            [(excel_path, f"{guild.name}_全服务器聊天记录{EXPORT_FORMATS[export_format]}")],
+                            f"{guild.name}_全服务器聊天记录",
+                            f"✅ 定时导出完成（文件大小: {file_size:.2f} MB）"
                         )
-                        os.remove(excel_path)
                         log.info(f"成功完成定时导出任务：所有频道 (Guild: {guild.name})")
                 else:
-                    # 多文件模式
-                    await target_channel.send("📄 正在执行定时导出任务（所有频道，多文件模式）...")
-                    total_exported = 0
-                    for category_name in sorted(categories_dict.keys(), key=lambda x: (x == "未分类", x)):
-                        for channel in sorted(categories_dict[category_name], key=lambda c: c.position):
-                            try:
-                                excel_path = await self.generate_excel_report(channel, max_msgs)
-                                if excel_path and os.path.exists(excel_path):
-                                    await target_channel.send(
-                                        file=discord.File(excel_path, filename=f"{category_name}-{channel.name}.xlsx")
-                                    )
-                                    os.remove(excel_path)
-                                    total_exported += 1
-                                await asyncio.sleep(2)
-                            except Exception as e:
-                                log.error(f"导出频道 {channel.name} 时出错: {e}")
-                    await target_channel.send(f"✅ 定时导出完成！共导出 {total_exported} 个频道。")
+                    # 多文件模式：每个频道一个文件，打包后上传
+                    await self.rate_budget.send(target_channel, "📄 正在执行定时导出任务（所有频道，多文件模式）...")
+                    files, _ = await self._export_channel_files(categories_dict, max_msgs, export_format)
+                    await self._upload_export_files(
+                        guild,
+                        target_channel,
+                        files,
+                        f"{guild.name}_全服务器聊天记录",
+                        f"✅ 定时导出完成！共导出 {len(files)} 个频道。"
+                    )
                     
             elif task_type == "category":
                 # 导出指定分类
@@ -257,37 +423,33 @@ class ChatSummary(commands.Cog):
                     return
                 
                 if single_file:
-                    await target_channel.send(f"📄 正在执行定时导出任务（分类：{target}）...")
+                    await self.rate_budget.send(target_channel, f"📄 正在执行定时导出任务（分类：{target}）...")
                     categories_dict = {target: channels_in_category}
                     report_title = f"{target}_聊天记录"
                     excel_path = await self.generate_multi_channel_excel_report(
-                        guild, categories_dict, report_title, max_msgs
+                        guild, categories_dict, report_title, max_msgs, export_format
                     )
                     
                     if excel_path and os.path.exists(excel_path):
                         file_size = os.path.getsize(excel_path) / (1024 * 1024)
-                        await target_channel.send(
-                            f"✅ 定时导出完成（分类：{target}，文件大小: {file_size:.2f} MB）",
-                            file=discord.File(excel_path, filename=f"{target}_聊天记录.xlsx")
+                        await self._upload_export_files(
+                            guild,
+                            target_channel,
+                            [(excel_path, f"{target}_聊天记录{EXPORT_FORMATS[export_format]}")],
+                            f"{target}_聊天记录",
+                            f"✅ 定时导出完成（分类：{target}，文件大小: {file_size:.2f} MB）"
                         )
-                        os.remove(excel_path)
                         log.info(f"成功完成定时导出任务：分类 {target} (Guild: {guild.name})")
                 else:
-                    await target_channel.send(f"📄 正在执行定时导出任务（分类：{target}，多文件模式）...")
-                    total_exported = 0
-                    for channel in sorted(channels_in_category, key=lambda c: c.position):
-                        try:
-                            excel_path = await self.generate_excel_report(channel, max_msgs)
-                            if excel_path and os.path.exists(excel_path):
-                                await target_channel.send(
-                                    file=discord.File(excel_path, filename=f"{target}-{channel.name}.xlsx")
-                                )
-                                os.remove(excel_path)
-                                total_exported += 1
-                            await asyncio.sleep(2)
-                        except Exception as e:
-                            log.error(f"导出频道 {channel.name} 时出错: {e}")
-                    await target_channel.send(f"✅ 定时导出完成（分类：{target}）！共导出 {total_exported} 个频道。")
+                    await self.rate_budget.send(target_channel, f"📄 正在执行定时导出任务（分类：{target}，多文件模式）...")
+                    files, _ = await self._export_channel_files({target: channels_in_category}, max_msgs, export_format)
+                    await self._upload_export_files(
+                        guild,
+                        target_channel,
+                        files,
+                        f"{target}_聊天记录",
+                        f"✅ 定时导出完成（分类：{target}）！共导出 {len(files)} 个频道。"
+                    )
                     
             elif task_type == "channel":
                 # 导出指定频道
@@ -299,40 +461,42 @@ class ChatSummary(commands.Cog):
                     return
                 
                 log.info(f"执行定时导出任务：频道 {channel.name} (Guild: {guild.name})")
-                await target_channel.send(f"📄 正在执行定时导出任务（频道：{channel.mention}）...")
+                await self.rate_budget.send(target_channel, f"📄 正在执行定时导出任务（频道：{channel.mention}）...")
                 
-                excel_path = await self.generate_excel_report(channel, max_msgs)
+                excel_path = await self.generate_excel_report(channel, max_msgs, export_format)
                 if excel_path and os.path.exists(excel_path):
                     category_name = channel.category.name if channel.category else "未分类"
-                    await target_channel.send(
-                        f"✅ 定时导出完成（频道：{channel.mention}）",
-                        file=discord.File(excel_path, filename=f"{category_name}-{channel.name}.xlsx")
+                    await self._upload_export_files(
+                        guild,
+                        target_channel,
+                        [(excel_path, f"{category_name}-{channel.name}{EXPORT_FORMATS[export_format]}")],
+                        f"{category_name}-{channel.name}",
+                        f"✅ 定时导出完成（频道：{channel.mention}）"
                     )
-                    os.remove(excel_path)
                     log.info(f"成功完成定时导出任务：频道 {channel.name} (Guild: {guild.name})")
                     
         except Exception as e:
             log.error(f"执行导出任务时出错 (Guild: {guild.name}): {e}", exc_info=True)
     
-    async def _execute_summary(self, guild: discord.Guild, channel: discord.TextChannel):
+    async def _execute_summary(self, guild: discord.Guild, channel: discord.TextChannel, rolling_task: Optional[str] = None):
         """执行单个频道总结并发送结果"""
         try:
             # 生成总结
-            summary = await self.generate_channel_summary(channel)
+            summary = self._summary_embed(await self.generate_channel_summary(channel, rolling_task))
             
             # 发送到指定频道
             summary_channel_id = await self.config.guild(guild).summary_channel()
             if summary_channel_id:
                 summary_channel = guild.get_channel(summary_channel_id)
                 if summary_channel:
-                    await summary_channel.send(embed=summary)
+                    await self.rate_budget.send(summary_channel, embed=summary)
                     log.info(f"总结已发送到指定频道 {summary_channel.name} (Guild: {guild.name})")
                 else:
                     log.warning(f"配置的总结频道不存在 (ID: {summary_channel_id}, Guild: {guild.name})")
-                    await channel.send(embed=summary)
+                    await self.rate_budget.send(channel, embed=summary)
             else:
                 # 发送到原频道
-                await channel.send(embed=summary)
+                await self.rate_budget.send(channel, embed=summary)
                 log.info(f"总结已发送到原频道 {channel.name} (Guild: {guild.name})")
         except Exception as e:
             log.error(f"执行总结时出错 (Channel: {channel.name}, Guild: {guild.name}): {e}", exc_info=True)
@@ -356,6 +520,13 @@ class ChatSummary(commands.Cog):
         
         return False
     
+    async def _export_format(self, guild: discord.Guild, export_format: Optional[str]) -> Optional[str]:
+        """解析导出格式（未指定时使用服务器的默认格式），格式无效时返回 None"""
+        if not export_format:
+            export_format = await self.config.guild(guild).export_format()
+        export_format = export_format.lower()
+        return export_format if export_format in EXPORT_FORMATS else None
+    
     async def _is_channel_excluded_from_export(self, guild: discord.Guild, channel: discord.TextChannel) -> bool:
         """检查频道是否应该被排除（基于频道本身或其分类）- 用于导出功能"""
         excluded_channels = await self.config.guild(guild).export_excluded_channels()
@@ -375,7 +546,7 @@ class ChatSummary(commands.Cog):
         
         return False
     
-    async def _execute_all_summary(self, guild: discord.Guild):
+    async def _execute_all_summary(self, guild: discord.Guild, rolling_task: Optional[str] = None):
         """执行全服务器总结并发送结果（包括PDF生成）"""
         try:
             # 按分类分组频道
@@ -406,63 +577,26 @@ class ChatSummary(commands.Cog):
                 return
             
             # 发送报告标题
-            await target_channel.send(f"## 📊 服务器全频道总结报告\n生成时间: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
+            await self.rate_budget.send(target_channel, f"## 📊 服务器全频道总结报告\n生成时间: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
             
-            total_channels = 0
-            summaries_data = []  # 收集PDF数据
-            
-            # 按分类名称排序（"未分类"放在最后）
-            sorted_categories = sorted(categories_dict.keys(), key=lambda x: (x == "未分类", x))
-            
-            for category_name in sorted_categories:
-                channels = categories_dict[category_name]
-                
-                # 发送分类标题
-                await target_channel.send(f"\n## 📁 {category_name}\n")
-                
-                # 总结该分类下的所有频道
-                for channel in sorted(channels, key=lambda c: c.position):
-                    try:
-                        summary_embed = await self.generate_channel_summary(channel)
-                        await target_channel.send(embed=summary_embed)
-                        total_channels += 1
-                        
-                        # 收集PDF数据
-                        summary_text = summary_embed.description or "无总结内容"
-                        stats = {}
-                        for field in summary_embed.fields:
-                            if "消息数量" in field.name:
-                                stats['message_count'] = field.value
-                            elif "参与人数" in field.name:
-                                stats['user_count'] = field.value
-                            elif "时间范围" in field.name:
-                                stats['time_range'] = field.value
-                        
-                        summaries_data.append({
-                            'category': category_name,
-                            'channel_name': channel.name,
-                            'summary_text': summary_text,
-                            'stats': stats
-                        })
-                        
-                        log.info(f"成功总结频道 {channel.name} (分类: {category_name}, Guild: {guild.name})")
-                        await asyncio.sleep(1)  # 避免速率限制
-                    except Exception as e:
-                        log.error(f"总结频道 {channel.name} 时出错 (分类: {category_name}, Guild: {guild.name}): {e}", exc_info=True)
+            # 并发生成各频道总结，按分类/频道位置顺序发送
+            summaries_data = await self._run_channel_summaries(guild, target_channel, categories_dict, rolling_task=rolling_task)
+            total_channels = len(summaries_data)
             
             # 发送完成消息
-            await target_channel.send(f"✅ 定时总结完成！共总结了 {total_channels} 个频道，分布在 {len(categories_dict)} 个分类中。")
+            await self.rate_budget.send(target_channel, f"✅ 定时总结完成！共总结了 {total_channels} 个频道，分布在 {len(categories_dict)} 个分类中。")
             log.info(f"完成全服务器总结 (Guild: {guild.name}, 总频道数: {total_channels})")
             
             # 生成并发送PDF
             if summaries_data:
-                await target_channel.send("📄 正在生成PDF报告...")
+                await self.rate_budget.send(target_channel, "📄 正在生成PDF报告...")
                 report_title = f"{guild.name} - Server Summary Report"
                 pdf_path = await self.generate_pdf_report(guild, summaries_data, report_title)
                 
                 if pdf_path and os.path.exists(pdf_path):
                     try:
-                        await target_channel.send(
+                        await self.rate_budget.send(
+                            target_channel,
                             "📊 总结报告PDF文件：",
                             file=discord.File(pdf_path, filename=f"summary_{guild.name}_{datetime.utcnow().strftime('%Y%m%d')}.pdf")
                         )
@@ -471,139 +605,572 @@ class ChatSummary(commands.Cog):
                         os.remove(pdf_path)
                     except Exception as e:
                         log.error(f"发送PDF文件时出错: {e}", exc_info=True)
-                        await target_channel.send("❌ PDF文件生成成功但发送失败。")
+                        await self.rate_budget.send(target_channel, "❌ PDF文件生成成功但发送失败。")
                 else:
-                    await target_channel.send("❌ PDF文件生成失败。请检查日志。")
+                    await self.rate_budget.send(target_channel, "❌ PDF文件生成失败。请检查日志。")
             
         except Exception as e:
             log.error(f"执行全服务器总结时出错 (Guild: {guild.name}): {e}", exc_info=True)
     
-    async def generate_channel_summary(self, channel: discord.TextChannel) -> discord.Embed:
-        """生成频道总结"""
+    async def _run_channel_summaries(self, guild: discord.Guild, target_channel: discord.TextChannel, channels_dict: dict, send_headers: bool = True, rolling_task: Optional[str] = None) -> List[ChannelSummary]:
+        """并发生成多个频道的总结，并按分类/频道位置顺序发送结果
+        
+        同时最多有 summary_concurrency 个频道在拉取消息和调用 AI，
+        结果仍然按照分类名称（"未分类"放在最后）和频道位置的顺序发送。
+        启用批量总结时，消息较少的频道会合并到同一个请求中（增量总结除外）。
+        
+        参数:
+            guild: Discord服务器
+            target_channel: 发送总结的频道
+            channels_dict: 频道字典 {category_name: [channels]}
+            send_headers: 是否在每个分类前发送分类标题
+            rolling_task: 增量总结所属的定时任务ID（None 表示普通总结）
+        
+        返回:
+            成功总结的频道结果列表（用于生成PDF）
+        """
+        settings = await self.config.guild(guild).all()
+        semaphore = asyncio.Semaphore(max(1, settings["summary_concurrency"]))
+        
+        # 按分类名称排序（"未分类"放在最后），分类内按频道位置排序
+        sorted_categories = sorted(channels_dict.keys(), key=lambda x: (x == "未分类", x))
+        ordered = [
+            (category_name, channel)
+            for category_name in sorted_categories
+            for channel in sorted(channels_dict[category_name], key=lambda c: c.position)
+        ]
+        
+        batcher = None
+        if settings["summary_batching"] and settings["api_key"] and rolling_task is None:
+            # 批次的输出按频道数计算，从上下文窗口中预留
+            reserved = (
+                estimate_tokens(BATCH_PROMPT, model_profile(settings["model"]).cjk_ratio)
+                + BATCH_SECTION_MAX_TOKENS * BATCH_MAX_CHANNELS
+                + PROMPT_OVERHEAD_TOKENS
+            )
+            batcher = BatchCollector(
+                lambda items: self._summarize_batch(guild, semaphore, items),
+                prompt_token_budget(settings["model"], settings["summary_prompt_tokens"], reserved),
+                BATCH_MAX_CHANNELS,
+                len(ordered)
+            )
+        
+        async def summarize(channel):
+            if batcher is None:
+                async with semaphore:
+                    return await self.generate_channel_summary(channel, rolling_task)
+            
+            # 每个频道必须恰好提交或放弃一次，批次才能在所有频道读取完后发出
+            joined = False
+            try:
+                async with semaphore:
+                    preview, messages, rolling_state = await self._load_channel_messages(channel, rolling_task)
+                    item = await self._batch_item(settings, preview, messages) if messages else None
+                if not messages:
+                    return preview
+                
+                if item is not None:
+                    joined = True
+                    submitted = time.perf_counter()
+                    # 等待批次结果时不占用并发名额
+                    result = await batcher.submit(item)
+                    if result is not None:
+                        text, usage = result
+                        return replace(
+                            preview,
+                            text=text,
+                            ai_generated=True,
+                            usage=usage,
+                            summarize_seconds=time.perf_counter() - submitted
+                        )
+                else:
+                    joined = True
+                    batcher.decline()
+                
+                async with semaphore:
+                    return await self._complete_channel_summary(guild, preview, messages, rolling_state, rolling_task)
+            finally:
+                if not joined:
+                    batcher.decline()
+        
+        tasks = [asyncio.ensure_future(summarize(channel)) for _, channel in ordered]
+        summaries_data = []
+        current_category = None
+        
+        try:
+            for (category_name, channel), task in zip(ordered, tasks):
+                if send_headers and category_name != current_category:
+                    current_category = category_name
+                    # 发送分类标题
+                    await self.rate_budget.send(target_channel, f"\n## 📁 {category_name}\n")
+                
+                try:
+                    summary = await task
+                    await self.rate_budget.send(target_channel, embed=self._summary_embed(summary))
+                    
+                    # 总结结果直接用于PDF报告
+                    summaries_data.append(summary)
+                    
+                    log.info(
+                        f"成功总结频道 {channel.name} (分类: {category_name}, Guild: {guild.name}, "
+                        f"读取 {summary.fetch_seconds:.2f}s, 总结 {summary.summarize_seconds:.2f}s, "
+                        f"tokens: {summary.usage.total_tokens})"
+                    )
+                except Exception as e:
+                    log.error(f"总结频道 {channel.name} 时出错 (分类: {category_name}, Guild: {guild.name}): {e}", exc_info=True)
+        finally:
+            # 发送失败或被取消时，停止尚未完成的总结
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if batcher is not None:
+                batcher.close()
+        
+        return summaries_data
+    
+    async def generate_channel_summary(
+        self,
+        channel: discord.TextChannel,
+        rolling_task: Optional[str] = None,
+        on_start: Optional[Callable[[ChannelSummary], Awaitable[None]]] = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> ChannelSummary:
+        """生成频道总结
+        
+        参数:
+            channel: Discord频道
+            rolling_task: 增量总结所属的定时任务ID。指定时只把上次总结之后的新消息
+                连同上次的总结发送给 AI，生成更新后的总结
+            on_start: 读取消息并完成统计后、调用 AI 之前等待的协程函数，
+                参数为不含总结文本的结果（用于先显示统计数据）
+            on_text: 以流式方式调用 AI，每收到新内容就以目前的全部文本调用
+        
+        返回:
+            不可变的总结结果（用 _summary_embed 生成嵌入消息，或直接用于PDF报告）
+        """
+        preview, messages, rolling_state = await self._load_channel_messages(channel, rolling_task)
+        if not messages:
+            return preview
+        
+        if on_start is not None:
+            await on_start(preview)
+        
+        return await self._complete_channel_summary(channel.guild, preview, messages, rolling_state, rolling_task, on_text)
+    
+    async def _load_channel_messages(
+        self,
+        channel: discord.TextChannel,
+        rolling_task: Optional[str] = None
+    ) -> Tuple[ChannelSummary, List[MessageRecord], Optional[dict]]:
+        """同步并读取频道消息，完成统计
+        
+        返回:
+            (结果, 消息, 增量总结状态)。没有消息时结果已是最终结果；
+            否则结果中只有统计数据，总结文本由 _complete_channel_summary 生成
+        """
         guild = channel.guild
         max_messages = await self.config.guild(guild).max_messages()
         include_bots = await self.config.guild(guild).include_bots()
+        started = time.perf_counter()
         
-        # 获取消息
-        messages = []
-        async for message in channel.history(limit=max_messages):
-            if not include_bots and message.author.bot:
-                continue
-            messages.append(message)
+        # 增量同步后从本地存储读取消息（按时间顺序排列）
+        await self.message_store.sync_channel(channel, max_messages)
         
-        messages.reverse()  # 按时间顺序排列
+        rolling_state = None
+        if rolling_task is not None:
+            rolling_state = await self._get_rolling_state(guild, rolling_task, channel.id)
+        
+        if rolling_state:
+            messages = await self.message_store.fetch_after(
+                guild.id, channel.id, rolling_state["last_message_id"], max_messages, include_bots
+            )
+        else:
+            messages = await self.message_store.fetch_recent(guild.id, channel.id, max_messages, include_bots)
+        fetched = time.perf_counter()
         
         # 获取频道分类
         category_name = channel.category.name if channel.category else "未分类"
         
         if not messages:
-            embed = discord.Embed(
-                title=f"📊 频道总结 - {category_name} / {channel.name}",
-                description="没有找到消息记录。",
-                color=discord.Color.blue(),
-                timestamp=datetime.utcnow()
-            )
-            return embed
-        
-        # 生成总结
-        summary_text = await self.summarize_messages(guild, messages)
-        
-        # 创建统计信息
-        user_count = len(set(m.author.id for m in messages))
-        time_range = f"{messages[0].created_at.strftime('%Y-%m-%d %H:%M')} - {messages[-1].created_at.strftime('%Y-%m-%d %H:%M')}"
-        
+            if rolling_state:
+                # 上次总结之后没有新消息，沿用上次的总结
+                return ChannelSummary(
+                    guild_id=guild.id,
+                    channel_id=channel.id,
+                    category=category_name,
+                    channel_name=channel.name,
+                    text=rolling_state["summary"],
+                    status=STATUS_UNCHANGED,
+                    incremental=True,
+                    fetch_seconds=fetched - started
+                ), messages, rolling_state
+            
+            return ChannelSummary(
+                guild_id=guild.id,
+                channel_id=channel.id,
+                category=category_name,
+                channel_name=channel.name,
+                text="没有找到消息记录。",
+                status=STATUS_EMPTY,
+                fetch_seconds=fetched - started
+            ), messages, rolling_state
+        
+        # 创建统计信息（单次遍历）
+        stats = ChannelStats()
+        stats.add(messages)
+        preview = ChannelSummary(
+            guild_id=guild.id,
+            channel_id=channel.id,
+            category=category_name,
+            channel_name=channel.name,
+            text="",
+            stats=SummaryStats.from_channel_stats(stats),
+            incremental=rolling_state is not None,
+            fetch_seconds=fetched - started
+        )
+        return preview, messages, rolling_state
+    
+    async def _complete_channel_summary(
+        self,
+        guild: discord.Guild,
+        preview: ChannelSummary,
+        messages: List[MessageRecord],
+        rolling_state: Optional[dict],
+        rolling_task: Optional[str] = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> ChannelSummary:
+        """为 _load_channel_messages 读取的消息生成总结"""
+        started = time.perf_counter()
+        previous_summary = rolling_state["summary"] if rolling_state else None
+        summary_text, succeeded, usage = await self._summarize_messages(guild, messages, previous_summary, on_text)
+        
+        # 保存增量总结状态（失败时不更新，下次重新总结）
+        if rolling_task is not None and succeeded:
+            await self._set_rolling_state(guild, rolling_task, preview.channel_id, summary_text, messages[-1].id)
+        
+        return replace(
+            preview,
+            text=summary_text,
+            ai_generated=succeeded,
+            usage=usage,
+            summarize_seconds=time.perf_counter() - started
+        )
+    
+    def _summary_embed(self, summary: ChannelSummary) -> discord.Embed:
+        """根据总结结果生成 Discord 嵌入消息"""
         embed = discord.Embed(
-            title=f"📊 频道总结 - {category_name} / {channel.name}",
-            description=summary_text,
-            color=discord.Color.green(),
-            timestamp=datetime.utcnow()
+            title=f"📊 频道总结 - {summary.title}",
+            description=summary.text,
+            color=discord.Color.green() if summary.status == STATUS_SUMMARIZED else discord.Color.blue(),
+            timestamp=summary.created_at
         )
         
-        embed.add_field(name="📝 消息数量", value=str(len(messages)), inline=True)
-        embed.add_field(name="👥 参与人数", value=str(user_count), inline=True)
-        embed.add_field(name="⏰ 时间范围", value=time_range, inline=False)
+        if summary.status == STATUS_UNCHANGED:
+            embed.set_footer(text="自上次总结以来没有新消息")
+        elif summary.status == STATUS_SUMMARIZED:
+            count_label = "📝 新消息数量" if summary.incremental else "📝 消息数量"
+            embed.add_field(name=count_label, value=str(summary.stats.messages), inline=True)
+            embed.add_field(name="👥 参与人数", value=str(summary.stats.users), inline=True)
+            embed.add_field(name="⏰ 时间范围", value=summary.stats.time_range(), inline=False)
         
         return embed
     
-    async def summarize_messages(self, guild: discord.Guild, messages: List[discord.Message]) -> str:
+    async def _get_rolling_state(self, guild: discord.Guild, task_id: str, channel_id: int) -> Optional[dict]:
+        """读取定时任务中某个频道的增量总结状态"""
+        tasks = await self.config.guild(guild).scheduled_tasks()
+        return tasks.get(task_id, {}).get("rolling", {}).get(str(channel_id))
+    
+    async def _set_rolling_state(self, guild: discord.Guild, task_id: str, channel_id: int, summary: str, last_message_id: int):
+        """保存定时任务中某个频道的增量总结状态"""
+        async with self.config.guild(guild).scheduled_tasks() as tasks:
+            if task_id not in tasks:
+                # 任务已被删除
+                return
+            tasks[task_id].setdefault("rolling", {})[str(channel_id)] = {
+                "summary": summary,
+                "last_message_id": last_message_id
+            }
+    
+    async def _rolling_task_id(self, guild: discord.Guild, task_id: str) -> Optional[str]:
+        """如果定时任务启用了增量总结，返回任务ID，否则返回 None"""
+        tasks = await self.config.guild(guild).scheduled_tasks()
+        if tasks.get(task_id, {}).get("incremental", False):
+            return task_id
+        return None
+    
+    async def summarize_messages(self, guild: discord.Guild, messages: List[MessageRecord]) -> str:
         """使用 AI 总结消息"""
-        api_key = await self.config.guild(guild).api_key()
+        summary_text, _, _ = await self._summarize_messages(guild, messages)
+        return summary_text
+    
+    async def _summarize_messages(
+        self,
+        guild: discord.Guild,
+        messages: List[MessageRecord],
+        previous_summary: Optional[str] = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Tuple[str, bool, TokenUsage]:
+        """使用 AI 总结消息
         
-        if not api_key:
+        参数:
+            guild: Discord服务器
+            messages: 按时间顺序排列的消息
+            previous_summary: 上次的总结（增量总结时提供，messages 为之后的新消息）
+            on_text: 以流式方式生成最终总结，每收到新内容就以目前的全部文本调用
+        
+        返回:
+            (总结文本, 是否由 AI 成功生成, 本次调用的 token 用量)
+        """
+        settings = await self.config.guild(guild).all()
+        no_usage = TokenUsage()
+        
+        if not settings["api_key"]:
             # 如果没有配置 API key，使用简单统计
-            return self.simple_summary(messages)
+            return self.simple_summary(messages), False, no_usage
         
-        # 准备消息文本
-        message_text = "\n".join([
-            f"[{msg.created_at.strftime('%H:%M')}] {msg.author.name}: {msg.content[:200]}"
-            for msg in messages
-            if msg.content
-        ])
+        hierarchical = settings["hierarchical_summary"]
+        cjk_ratio = model_profile(settings["model"]).cjk_ratio
+        lines = await self._transcript_lines(settings, messages)
         
-        if not message_text:
-            return "没有文本消息可以总结。"
+        if not lines:
+            if previous_summary is not None:
+                return previous_summary, True, no_usage
+            return "没有文本消息可以总结。", False, no_usage
+        
+        # 频道没有新消息时直接使用缓存的总结（增量总结自身保存状态，不使用缓存）
+        cache_key = None
+        if settings["summary_cache_enabled"] and previous_summary is None:
+            cache_key = self._summary_cache_key(settings, messages)
+            cached = await self.summary_cache.get(guild.id, cache_key)
+            if cached is not None:
+                return cached, True, no_usage
         
         # 调用 AI API
         try:
-            import aiohttp
-            
-            api_base = await self.config.guild(guild).api_base()
-            model = await self.config.guild(guild).model()
-            
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            prompt = f"""You are an **expert in summarizing Discord content**, skilled at extracting key information and generating **high-quality, well-structured summaries**.
-Based on the provided Video Transcript, complete the following tasks:
-
-**Task Description:**
-Act as a helpful assistant. Your task is to summarize the key points from [meeting notes]. The summary should be concise yet comprehensive, capturing the essence of the meeting. Your summary should enable someone who wasn't present at the meeting to understand its outcomes and next steps clearly.Length: - Ensure the response has a minimum of 800 words
-
-Language: - The entire output, including **section titles and labels**, must be written in the "简体中文" language (For example, Summary, Highlights, Key Insights, Outline, Core Concepts, Keywords, FAQ, etc. all need to be translated into 简体中文 language.).
-- Do **not** include any separators (`---`), or additional text outside of the task results.
-
-The Discord content:
-{message_text[:4000]}"""
-            
-            data = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": "你是一个专业的聊天记录总结助手。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 500,
-                "temperature": 0.7
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{api_base}/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as resp:
-                    if resp.status == 200:
-                        result = await resp.json()
-                        return result["choices"][0]["message"]["content"]
-                    else:
-                        return f"API 调用失败（状态码: {resp.status}），使用简单统计。\n\n" + self.simple_summary(messages)
+            if previous_summary is not None:
+                template = ROLLING_PROMPT.format(previous=previous_summary, content="")
+                message_text = pack_lines(lines, self._prompt_budget(settings, template), cjk_ratio)
+                completion = await self._chat(
+                    settings,
+                    ROLLING_PROMPT.format(previous=previous_summary, content=message_text),
+                    on_text=on_text
+                )
+            elif hierarchical:
+                completion = await self._map_reduce_summary(settings, lines, on_text)
+            else:
+                message_text = pack_lines(lines, self._prompt_budget(settings, SUMMARY_PROMPT), cjk_ratio)
+                completion = await self._chat(settings, SUMMARY_PROMPT.format(content=message_text), on_text=on_text)
+            
+            if cache_key is not None:
+                await self.summary_cache.put(guild.id, cache_key, completion.text)
+            return completion.text, True, completion.usage
+        
+        except CircuitOpenError as e:
+            # 接口熔断期间不等待超时，直接使用简单统计
+            return f"AI 接口暂时不可用（{e}），使用简单统计。\n\n" + self.simple_summary(messages), False, no_usage
+        except LLMError as e:
+            if e.status is not None:
+                return f"API 调用失败（状态码: {e.status}），使用简单统计。\n\n" + self.simple_summary(messages), False, no_usage
+            return f"总结生成失败: {str(e)}\n\n使用简单统计:\n{self.simple_summary(messages)}", False, no_usage
+        except Exception as e:
+            return f"总结生成失败: {str(e)}\n\n使用简单统计:\n{self.simple_summary(messages)}", False, no_usage
+    
+    async def _transcript_lines(self, settings: dict, messages: List[MessageRecord]) -> List[str]:
+        """准备发送给 AI 的聊天记录行
+        
+        清理链接和提及标记，合并同一用户的连续消息和近似重复的消息。
+        大量消息的清理和去重是纯 CPU 工作，放到线程中执行，不阻塞事件循环。
+        """
+        message_tokens = HIERARCHICAL_MESSAGE_TOKEN_LIMIT if settings["hierarchical_summary"] else MESSAGE_TOKEN_LIMIT
+        cjk_ratio = model_profile(settings["model"]).cjk_ratio
+        return await asyncio.get_running_loop().run_in_executor(
+            None, transcript_lines, messages, message_tokens, cjk_ratio, settings["summary_dedup"]
+        )
+    
+    def _summary_cache_key(self, settings: dict, messages: List[MessageRecord]) -> str:
+        """根据频道状态和总结配置生成缓存键"""
+        if settings["hierarchical_summary"]:
+            mode = f"hierarchical:{settings['summary_chunk_tokens']}"
+        else:
+            mode = f"flat:{settings['summary_prompt_tokens']}"
+        if settings["summary_dedup"]:
+            mode += ":dedup"
+        return make_cache_key(
+            messages[0].channel_id,
+            messages[-1].id,
+            messages[0].id,
+            len(messages),
+            # 编辑过的消息会在同步时更新，最近的编辑时间变化后重新总结
+            max((msg.edited_at.timestamp() for msg in messages if msg.edited_at), default=0),
+            settings["model"],
+            PROMPT_VERSION,
+            mode,
+        )
+    
+    async def _batch_item(self, settings: dict, preview: ChannelSummary, messages: List[MessageRecord]) -> Optional[BatchItem]:
+        """小频道返回可以加入批次的聊天记录，否则返回 None（需要单独总结）"""
+        if settings["hierarchical_summary"]:
+            return None
+        lines = await self._transcript_lines(settings, messages)
+        if not lines:
+            return None
+        transcript = join_lines(lines)
+        tokens = estimate_tokens(transcript, model_profile(settings["model"]).cjk_ratio)
+        if tokens > BATCH_CHANNEL_TOKENS:
+            return None
+        cache_key = None
+        if settings["summary_cache_enabled"]:
+            cache_key = self._summary_cache_key(settings, messages)
+            if await self.summary_cache.get(preview.guild_id, cache_key) is not None:
+                # 已有缓存的总结，单独总结时会直接命中缓存
+                return None
+        return BatchItem(preview.title, transcript, tokens, cache_key)
+    
+    async def _summarize_batch(
+        self,
+        guild: discord.Guild,
+        semaphore: asyncio.Semaphore,
+        items: List[BatchItem]
+    ) -> List[Optional[Tuple[str, TokenUsage]]]:
+        """在一个请求中总结多个小频道
         
+        返回:
+            与 items 对应的 (总结文本, 分摊的 token 用量)；请求失败或某个频道的
+            总结无法从回复中解析时，对应位置为 None（改为单独总结）
+        """
+        settings = await self.config.guild(guild).all()
+        prompt = BATCH_PROMPT.format(count=len(items), content=build_batch_content(items))
+        try:
+            async with semaphore:
+                completion = await self._chat(
+                    settings,
+                    prompt,
+                    max_tokens=BATCH_SECTION_MAX_TOKENS * len(items)
+                )
         except Exception as e:
-            return f"总结生成失败: {str(e)}\n\n使用简单统计:\n{self.simple_summary(messages)}"
+            log.warning(f"批量总结 {len(items)} 个频道失败，改为逐个总结 (Guild: {guild.name}): {e}")
+            return [None] * len(items)
+        
+        sections = parse_batch_response(completion.text, len(items))
+        parsed = sum(1 for section in sections if section is not None)
+        if parsed < len(items):
+            log.warning(f"批量总结的回复中有 {len(items) - parsed} 个频道无法解析，改为单独总结 (Guild: {guild.name})")
+        
+        # token 用量按频道平均分摊
+        usage = TokenUsage(
+            completion.usage.prompt_tokens // len(items),
+            completion.usage.completion_tokens // len(items)
+        )
+        results = []
+        for item, section in zip(items, sections):
+            if section is None:
+                results.append(None)
+                continue
+            if item.cache_key is not None:
+                await self.summary_cache.put(guild.id, item.cache_key, section)
+            results.append((section, usage))
+        return results
+    
+    def _prompt_budget(self, settings: dict, template: str, configured: Optional[int] = None) -> int:
+        """聊天记录的 token 预算（扣除提示词模板和输出后不超过模型的上下文窗口）
+        
+        参数:
+            settings: 服务器配置
+            template: 不含聊天记录的提示词
+            configured: 配置的预算（默认为普通模式的 summary_prompt_tokens）
+        """
+        if configured is None:
+            configured = settings["summary_prompt_tokens"]
+        cjk_ratio = model_profile(settings["model"]).cjk_ratio
+        reserved = estimate_tokens(template, cjk_ratio) + SUMMARY_MAX_TOKENS + PROMPT_OVERHEAD_TOKENS
+        return prompt_token_budget(settings["model"], configured, reserved)
+    
+    async def _chat(
+        self,
+        settings: dict,
+        prompt: str,
+        max_tokens: int = SUMMARY_MAX_TOKENS,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Completion:
+        """使用服务器配置调用一次 AI 接口（指定 on_text 时以流式方式调用）"""
+        session = self.http_pool.get(settings["api_base"], settings["api_max_connections"])
+        return await self.llm_scheduler.complete(
+            session,
+            settings["api_base"],
+            settings["api_key"],
+            settings["model"],
+            [
+                {"role": "system", "content": "你是一个专业的聊天记录总结助手。"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            rpm=settings["api_rpm"],
+            tpm=settings["api_tpm"],
+            on_text=on_text
+        )
+    
+    async def _map_reduce_summary(
+        self,
+        settings: dict,
+        lines: List[str],
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Completion:
+        """分层总结：分块并发总结后再合并为最终总结
+        
+        参数:
+            settings: 服务器配置
+            lines: 按时间顺序排列的消息行
+            on_text: 以流式方式生成最终总结（分块总结不流式输出）
+        
+        返回:
+            最终总结及所有调用的 token 用量之和
+        """
+        cjk_ratio = model_profile(settings["model"]).cjk_ratio
+        budget = self._prompt_budget(settings, SUMMARY_PROMPT, settings["summary_chunk_tokens"])
+        chunks = chunk_lines(lines, budget, cjk_ratio)
+        if len(chunks) == 1:
+            return await self._chat(settings, SUMMARY_PROMPT.format(content=chunks[0]), on_text=on_text)
+        
+        semaphore = asyncio.Semaphore(max(1, settings["summary_concurrency"]))
+        usage = TokenUsage()
+        
+        async def summarize_part(index: int, total: int, text: str) -> str:
+            nonlocal usage
+            async with semaphore:
+                partial = await self._chat(
+                    settings,
+                    PARTIAL_PROMPT.format(index=index, total=total, content=text),
+                    max_tokens=PARTIAL_MAX_TOKENS
+                )
+                usage += partial.usage
+                return f"【第 {index}/{total} 部分】\n{partial.text}"
+        
+        # Map：并发总结每个分块
+        partials = await asyncio.gather(*[
+            summarize_part(i, len(chunks), chunk) for i, chunk in enumerate(chunks, 1)
+        ])
+        
+        # 部分总结合起来仍超出预算时，逐层合并
+        while len(partials) > 1:
+            groups = chunk_lines(partials, budget, cjk_ratio)
+            if len(groups) == 1 or len(groups) >= len(partials):
+                break
+            partials = await asyncio.gather(*[
+                summarize_part(i, len(groups), group) for i, group in enumerate(groups, 1)
+            ])
+        
+        # Reduce：合并所有部分总结
+        combined = "\n\n".join(partials)
+        final = await self._chat(settings, SUMMARY_PROMPT.format(content=REDUCE_PREFIX + combined), on_text=on_text)
+        return Completion(final.text, usage + final.usage)
     
-    def simple_summary(self, messages: List[discord.Message]) -> str:
+    def simple_summary(self, messages: List[MessageRecord]) -> str:
         """简单的统计总结（不使用 AI）"""
         if not messages:
             return "没有消息记录。"
         
         # 统计活跃用户
-        user_msg_count = {}
-        for msg in messages:
-            user_msg_count[msg.author.name] = user_msg_count.get(msg.author.name, 0) + 1
-        
-        top_users = sorted(user_msg_count.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_users = Counter(msg.author_name for msg in messages).most_common(5)
         
         summary = "**活跃用户统计：**\n"
         for i, (user, count) in enumerate(top_users, 1):
@@ -611,139 +1178,14 @@ The Discord content:
         
         return summary
     
-    def _parse_markdown_to_pdf_elements(self, markdown_text: str, styles: dict, use_chinese: bool):
-        """将Markdown文本解析为PDF元素列表
-        
-        参数:
-            markdown_text: Markdown格式的文本
-            styles: PDF样式字典
-            use_chinese: 是否使用中文字体
-        
-        返回:
-            PDF元素列表（Paragraph和Spacer对象）
-        """
-        from reportlab.platypus import Paragraph, Spacer
-        from reportlab.lib.units import cm
-        import re
-        
-        elements = []
-        lines = markdown_text.split('\n')
-        i = 0
-        
-        # 选择样式
-        h1_style = styles.get('ChineseH1', styles['Heading1']) if use_chinese else styles['Heading1']
-        h2_style = styles.get('ChineseH2', styles['Heading2']) if use_chinese else styles['Heading2']
-        h3_style = styles.get('ChineseH3', styles['Heading3']) if use_chinese else styles['Heading3']
-        body_style = styles.get('ChineseBody', styles['BodyText']) if use_chinese else styles['BodyText']
-        
-        max_iterations = len(lines) * 2  # 防止无限循环
-        iteration_count = 0
-        
-        while i < len(lines):
-            iteration_count += 1
-            if iteration_count > max_iterations:
-                log.error(f"Markdown解析超过最大迭代次数，强制退出。当前行: {i}/{len(lines)}")
-                break
-            
-            line = lines[i].strip()
-            
-            # 跳过空行
-            if not line:
-                i += 1
-                continue
-            
-            # 清理XML特殊字符
-            def clean_text(text):
-                return (text.replace('&', '&amp;')
-                           .replace('<', '&lt;')
-                           .replace('>', '&gt;'))
-            
-            # 解析一级标题 # 标题
-            if line.startswith('# ') and not line.startswith('## '):
-                title_text = clean_text(line[2:])
-                elements.append(Paragraph(f"<b>{title_text}</b>", h1_style))
-                elements.append(Spacer(1, 0.3*cm))
-                i += 1
-            
-            # 解析二级标题 ## 标题
-            elif line.startswith('## ') and not line.startswith('### '):
-                title_text = clean_text(line[3:])
-                elements.append(Paragraph(f"<b>{title_text}</b>", h2_style))
-                elements.append(Spacer(1, 0.2*cm))
-                i += 1
-            
-            # 解析三级标题 ### 标题
-            elif line.startswith('### '):
-                title_text = clean_text(line[4:])
-                elements.append(Paragraph(f"<b>{title_text}</b>", h3_style))
-                elements.append(Spacer(1, 0.2*cm))
-                i += 1
-            
-            # 解析列表项 - 或 * 开头
-            elif line.startswith('- ') or line.startswith('* '):
-                # 收集连续的列表项
-                list_items = []
-                while i < len(lines):
-                    current_line = lines[i].strip()
-                    if current_line.startswith('- ') or current_line.startswith('* '):
-                        item_text = clean_text(current_line[2:])
-                        # 处理列表项中的粗体标记
-                        item_text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', item_text)
-                        list_items.append(item_text)
-                        i += 1
-                    elif not current_line:
-                        i += 1
-                        break
-                    else:
-                        break
-                
-                # 生成列表
-                for item in list_items:
-                    elements.append(Paragraph(f"• {item}", body_style))
-                elements.append(Spacer(1, 0.2*cm))
-            
-            # 解析粗体 **文本**
-            elif '**' in line:
-                # 处理粗体标记
-                text = clean_text(line)
-                text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
-                elements.append(Paragraph(text, body_style))
-                elements.append(Spacer(1, 0.15*cm))
-                i += 1
-            
-            # 普通段落
-            else:
-                # 收集连续的非空行作为一个段落
-                para_lines = []
-                while i < len(lines):
-                    current_line = lines[i].strip()
-                    if current_line and not current_line.startswith('#') and not current_line.startswith('-') and not current_line.startswith('*'):
-                        para_lines.append(current_line)
-                        i += 1
-                    else:
-                        break
-                
-                if para_lines:
-                    para_text = clean_text(' '.join(para_lines))
-                    # 处理粗体
-                    para_text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', para_text)
-                    elements.append(Paragraph(para_text, body_style))
-                    elements.append(Spacer(1, 0.2*cm))
-                else:
-                    # 如果没有收集到任何段落行，说明遇到了无法处理的行
-                    # 强制跳过以避免无限循环
-                    i += 1
-        
-        return elements
-    
-    async def generate_pdf_report(self, guild: discord.Guild, summaries_data: List[Dict], report_title: str) -> str:
+    async def generate_pdf_report(self, guild: discord.Guild, summaries_data: List[ChannelSummary], report_title: str) -> str:
         """生成PDF报告（异步包装器）
         
-        在单独的线程中运行PDF生成，避免阻塞Discord事件循环
+        在渲染进程池中运行PDF生成，不阻塞Discord事件循环，也不与机器人争抢GIL
         
         参数:
             guild: Discord服务器
-            summaries_data: 总结数据列表
+            summaries_data: 各频道的总结结果
             report_title: 报告标题
         
         返回:
@@ -752,270 +1194,65 @@ The Discord content:
         try:
             log.info(f"开始生成PDF报告 (Guild: {guild.name}, 频道数: {len(summaries_data)})")
             
-            # 深拷贝数据以避免线程安全问题
-            import copy
-            summaries_data_copy = copy.deepcopy(summaries_data)
-            
-            # 在线程池中运行同步PDF生成函数
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                self._generate_pdf_report_sync,
+            # 在专用渲染进程中生成PDF（数据通过管道序列化传递，不共享对象）
+            result = await self.render_pool.run(
+                render_pdf_report,
                 guild.name,
                 guild.id,
-                summaries_data_copy,
+                summaries_data,
                 report_title
             )
             
             log.info(f"PDF报告生成完成: {result}")
             return result
             
-        except Exception as e:
-            log.error(f"异步PDF生成包装器出错: {e}", exc_info=True)
+        except RenderPoolBusy as e:
+            log.warning(f"PDF渲染队列已满，跳过本次报告 (Guild: {guild.name}): {e}")
             return None
-    
-    def _generate_pdf_report_sync(self, guild_name: str, guild_id: int, summaries_data: List[Dict], report_title: str) -> str:
-        """生成PDF报告（同步版本，在单独线程中运行）
-        
-        参数:
-            guild_name: Discord服务器名称
-            guild_id: Discord服务器ID
-            summaries_data: 总结数据列表，每项包含 category, channel_name, summary_text, stats
-            report_title: 报告标题
-        
-        返回:
-            PDF文件路径
-        """
-        try:
-            log.info(f"[PDF线程] 开始同步生成PDF (频道数: {len(summaries_data)})")
-            from reportlab.lib.pagesizes import A4
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import cm
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Flowable
-            from reportlab.pdfbase import pdfmetrics
-            from reportlab.pdfbase.ttfonts import TTFont
-            from reportlab.lib.enums import TA_LEFT, TA_CENTER
-            
-            # 创建书签Flowable
-            class BookmarkFlowable(Flowable):
-                """在PDF中添加书签的Flowable"""
-                def __init__(self, title, key):
-                    Flowable.__init__(self)
-                    self.title = title
-                    self.key = key
-                    self.width = 0
-                    self.height = 0
-                
-                def draw(self):
-                    """在当前位置添加书签"""
-                    self.canv.bookmarkPage(self.key)
-                    self.canv.addOutlineEntry(self.title, self.key, level=0)
-            
-            # 创建临时文件
-            temp_dir = tempfile.gettempdir()
-            pdf_filename = f"summary_{guild_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-            pdf_path = os.path.join(temp_dir, pdf_filename)
-            
-            # 创建PDF文档
-            doc = SimpleDocTemplate(pdf_path, pagesize=A4,
-                                   rightMargin=2*cm, leftMargin=2*cm,
-                                   topMargin=2*cm, bottomMargin=2*cm)
-            
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # 尝试注册中文字体（如果失败则使用默认字体）
-            try:
-                # 常见的中文字体路径（包括TTC和TTF文件）
-                chinese_fonts = [
-                    # macOS
-                    ('/System/Library/Fonts/PingFang.ttc', 0),
-                    ('/System/Library/Fonts/STHeiti Light.ttc', 0),
-                    ('/System/Library/Fonts/Hiragino Sans GB.ttc', 0),
-                    # Linux
-                    ('/usr/share/fonts/truetype/arphic/uming.ttc', 0),
-                    ('/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf', None),
-                    ('/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc', 0),
-                    # Windows
-                    ('C:\\Windows\\Fonts\\msyh.ttc', 0),
-                    ('C:\\Windows\\Fonts\\simhei.ttf', None),
-                    ('C:\\Windows\\Fonts\\simsun.ttc', 0),
-                ]
-                
-                font_registered = False
-                for font_path, subfont_index in chinese_fonts:
-                    if os.path.exists(font_path):
-                        try:
-                            # TTC文件需要指定subfontIndex
-                            if subfont_index is not None:
-                                pdfmetrics.registerFont(TTFont('Chinese', font_path, subfontIndex=subfont_index))
-                            else:
-                                pdfmetrics.registerFont(TTFont('Chinese', font_path))
-                            font_registered = True
-                            log.info(f"成功注册中文字体: {font_path}")
-                            break
-                        except Exception as e:
-                            log.debug(f"尝试注册字体 {font_path} 失败: {e}")
-                            continue
-                
-                if font_registered:
-                    # 创建中文样式
-                    styles.add(ParagraphStyle(name='ChineseTitle',
-                                             parent=styles['Heading1'],
-                                             fontName='Chinese',
-                                             fontSize=18,
-                                             alignment=TA_CENTER,
-                                             wordWrap='CJK'))
-                    styles.add(ParagraphStyle(name='ChineseHeading',
-                                             parent=styles['Heading2'],
-                                             fontName='Chinese',
-                                             fontSize=14,
-                                             wordWrap='CJK'))
-                    styles.add(ParagraphStyle(name='ChineseH1',
-                                             parent=styles['Heading1'],
-                                             fontName='Chinese',
-                                             fontSize=16,
-                                             wordWrap='CJK',
-                                             spaceAfter=12))
-                    styles.add(ParagraphStyle(name='ChineseH2',
-                                             parent=styles['Heading2'],
-                                             fontName='Chinese',
-                                             fontSize=13,
-                                             wordWrap='CJK',
-                                             spaceAfter=10))
-                    styles.add(ParagraphStyle(name='ChineseH3',
-                                             parent=styles['Heading3'],
-                                             fontName='Chinese',
-                                             fontSize=11,
-                                             wordWrap='CJK',
-                                             spaceAfter=8))
-                    styles.add(ParagraphStyle(name='ChineseBody',
-                                             parent=styles['BodyText'],
-                                             fontName='Chinese',
-                                             fontSize=10,
-                                             wordWrap='CJK',
-                                             leading=14))
-                    use_chinese = True
-                else:
-                    log.warning("未找到可用的中文字体，PDF将使用默认字体（中文可能显示为方块）")
-                    use_chinese = False
-            except Exception as e:
-                log.error(f"注册中文字体时出错: {e}", exc_info=True)
-                use_chinese = False
-            
-            # 选择样式
-            title_style = styles['ChineseTitle'] if use_chinese else styles['Title']
-            heading_style = styles['ChineseHeading'] if use_chinese else styles['Heading2']
-            body_style = styles['ChineseBody'] if use_chinese else styles['BodyText']
-            
-            # 添加标题
-            story.append(Paragraph(report_title, title_style))
-            story.append(Spacer(1, 0.5*cm))
-            
-            # 添加生成时间
-            gen_time = f"Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
-            story.append(Paragraph(gen_time, body_style))
-            story.append(Spacer(1, 0.3*cm))
-            
-            # 添加服务器信息
-            server_info = f"Server: {guild_name}"
-            story.append(Paragraph(server_info, body_style))
-            story.append(Spacer(1, 1*cm))
-            
-            # 添加每个频道的总结
-            log.info(f"[PDF线程] 开始处理 {len(summaries_data)} 个频道的内容")
-            for i, data in enumerate(summaries_data):
-                try:
-                    # 分类和频道标题
-                    log.info(f"[PDF线程] 正在处理频道 {i+1}/{len(summaries_data)}")
-                    category = data.get('category', '未知分类')
-                    channel_name = data.get('channel_name', '未知频道')
-                    title = f"{category} / {channel_name}"
-                    
-                    log.info(f"[PDF线程] 频道标题: {title}")
-                    
-                    # 添加书签（使用BookmarkFlowable）
-                    log.info(f"[PDF线程] 添加书签")
-                    bookmark_key = f"channel_{i}"
-                    story.append(BookmarkFlowable(title, bookmark_key))
-                    
-                    # 添加频道标题
-                    log.info(f"[PDF线程] 添加标题段落")
-                    story.append(Paragraph(title, heading_style))
-                    story.append(Spacer(1, 0.3*cm))
-                    
-                    # 总结内容 - 使用Markdown解析器
-                    summary_text = data.get('summary_text', '无总结内容')
-                    log.info(f"[PDF线程] 开始解析Markdown，文本长度: {len(summary_text)}")
-                    
-                    # 解析Markdown并添加到story
-                    try:
-                        # 添加超时保护
-                        import signal
-                        
-                        def timeout_handler(signum, frame):
-                            raise TimeoutError("Markdown解析超时")
-                        
-                        # 设置10秒超时（仅在Unix系统上有效）
-                        old_handler = None
-                        try:
-                            old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-                            signal.alarm(10)
-                        except (AttributeError, ValueError):
-                            # Windows系统不支持SIGALRM，跳过超时设置
-                            pass
-                        
-                        try:
-                            markdown_elements = self._parse_markdown_to_pdf_elements(summary_text, styles, use_chinese)
-                            log.info(f"[PDF线程] Markdown解析完成，生成 {len(markdown_elements)} 个元素")
-                            story.extend(markdown_elements)
-                        finally:
-                            # 取消超时
-                            try:
-                                signal.alarm(0)
-                                if old_handler:
-                                    signal.signal(signal.SIGALRM, old_handler)
-                            except (AttributeError, ValueError):
-                                pass
-                        
-                    except TimeoutError:
-                        log.error(f"[PDF线程] Markdown解析超时 ({title})，使用简单文本")
-                        # 使用简单文本作为备选
-                        clean_text = summary_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                        story.append(Paragraph(clean_text[:500] + "...", body_style))
-                    except Exception as e:
-                        log.error(f"[PDF线程] 解析Markdown时出错 ({title}): {e}", exc_info=True)
-                        # 使用简单文本作为备选
-                        clean_text = summary_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                        story.append(Paragraph(clean_text[:500] + "...", body_style))
-                    
-                except Exception as e:
-                    log.error(f"[PDF线程] 处理频道 {i+1} 时出错: {e}", exc_info=True)
-                    continue
-                
-                # 统计信息
-                stats = data.get('stats', {})
-                stats_text = f"Messages: {stats.get('message_count', 0)} | Users: {stats.get('user_count', 0)} | Time: {stats.get('time_range', 'N/A')}"
-                story.append(Paragraph(stats_text, body_style))
-                story.append(Spacer(1, 0.3*cm))
-                
-                # 如果不是最后一个，添加分页
-                if i < len(summaries_data) - 1:
-                    story.append(PageBreak())
-            
-            # 生成PDF
-            log.info(f"[PDF线程] 开始构建PDF文档，总元素数: {len(story)}")
-            doc.build(story)
-            log.info(f"[PDF线程] 成功生成PDF报告（包含 {len(summaries_data)} 个书签）: {pdf_path}")
-            return pdf_path
-            
-        except ImportError as e:
-            log.error(f"[PDF线程] reportlab库未安装，无法生成PDF: {e}")
+        except RenderError as e:
+            log.error(f"PDF渲染失败 (Guild: {guild.name}): {e}")
             return None
         except Exception as e:
-            log.error(f"[PDF线程] 生成PDF时出错: {e}", exc_info=True)
+            log.error(f"异步PDF生成包装器出错: {e}", exc_info=True)
             return None
-    
+
+    # ---- 本地消息存储的事件同步 ----
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """消息被编辑（包括置顶状态变化），下次同步时重新读取"""
+        self.message_store.mark_changed(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """消息被删除，从本地存储删除"""
+        await self.message_store.delete_messages(payload.channel_id, [payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """消息被批量删除，从本地存储删除"""
+        await self.message_store.delete_messages(payload.channel_id, payload.message_ids)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        """表情数量变化，下次同步时重新读取"""
+        self.message_store.mark_changed(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        """表情数量变化，下次同步时重新读取"""
+        self.message_store.mark_changed(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        """表情被清空，下次同步时重新读取"""
+        self.message_store.mark_changed(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        """某个表情被清空，下次同步时重新读取"""
+        self.message_store.mark_changed(payload.channel_id, payload.message_id)
+
     @commands.group(name="summary", aliases=["总结"])
     @commands.guild_only()
     async def summary(self, ctx: commands.Context):
@@ -1031,14 +1268,46 @@ The Discord content:
             channel: 要总结的频道（不指定则总结当前频道）
         """
         if not await self.config.guild(ctx.guild).enabled():
-            await ctx.send("❌ 聊天总结功能未启用。请管理员使用 `[p]summary enable` 启用。")
+            await self.rate_budget.send(ctx.channel, "❌ 聊天总结功能未启用。请管理员使用 `[p]summary enable` 启用。")
             return
         
         target_channel = channel or ctx.channel
         
-        async with ctx.typing():
-            summary_embed = await self.generate_channel_summary(target_channel)
-            await ctx.send(embed=summary_embed)
+        settings = await self.config.guild(ctx.guild).all()
+        if not (settings["stream_summaries"] and settings["api_key"]):
+            async with ctx.typing():
+                summary = await self.generate_channel_summary(target_channel)
+                await self.rate_budget.send(ctx.channel, embed=self._summary_embed(summary))
+            return
+        
+        # 流式总结：统计完成后立即发送占位消息，之后随 AI 输出节流编辑
+        live: Optional[LiveEmbed] = None
+        
+        async def on_start(preview: ChannelSummary):
+            nonlocal live
+            live = LiveEmbed(
+                self.rate_budget,
+                lambda text: self._summary_embed(replace(preview, text=text))
+            )
+            try:
+                await live.start(ctx.channel, STREAM_PLACEHOLDER)
+            except discord.HTTPException as e:
+                # 占位消息发送失败时照常生成，最后再发送完整结果
+                log.warning(f"发送流式总结占位消息失败: {e}")
+        
+        def on_text(text: str):
+            live.update(text + STREAM_CURSOR)
+        
+        try:
+            summary = await self.generate_channel_summary(target_channel, on_start=on_start, on_text=on_text)
+        finally:
+            if live is not None:
+                await live.close()
+        
+        if live is None or live.message is None:
+            await self.rate_budget.send(ctx.channel, embed=self._summary_embed(summary))
+        else:
+            await live.finish(self._summary_embed(summary))
     
     @summary.command(name="all", aliases=["全部", "全部频道"])
     @checks.admin_or_permissions(manage_guild=True)
@@ -1049,10 +1318,10 @@ The Discord content:
             generate_pdf: 是否生成PDF文件（默认为 True）
         """
         if not await self.config.guild(ctx.guild).enabled():
-            await ctx.send("❌ 聊天总结功能未启用。")
+            await self.rate_budget.send(ctx.channel, "❌ 聊天总结功能未启用。")
             return
         
-        await ctx.send("🔄 开始总结所有频道，这可能需要一些时间...")
+        await self.rate_budget.send(ctx.channel, "🔄 开始总结所有频道，这可能需要一些时间...")
         
         # 按分类分组频道
         categories_dict = defaultdict(list)
@@ -1066,70 +1335,31 @@ The Discord content:
             categories_dict[category_name].append(channel)
         
         if not categories_dict:
-            await ctx.send("❌ 没有可总结的频道。")
+            await self.rate_budget.send(ctx.channel, "❌ 没有可总结的频道。")
             return
         
         # 发送到指定频道或当前频道
         summary_channel_id = await self.config.guild(ctx.guild).summary_channel()
         target_channel = ctx.guild.get_channel(summary_channel_id) if summary_channel_id else ctx.channel
         
-        await target_channel.send(f"## 📊 服务器全频道总结报告\n生成时间: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
-        
-        total_channels = 0
-        summaries_data = []  # 收集PDF数据
+        await self.rate_budget.send(target_channel, f"## 📊 服务器全频道总结报告\n生成时间: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
         
-        # 按分类名称排序（"未分类"放在最后）
-        sorted_categories = sorted(categories_dict.keys(), key=lambda x: (x == "未分类", x))
-        
-        for category_name in sorted_categories:
-            channels = categories_dict[category_name]
-            
-            # 发送分类标题
-            await target_channel.send(f"\n## 📁 {category_name}\n")
-            
-            # 总结该分类下的所有频道
-            for channel in sorted(channels, key=lambda c: c.position):
-                try:
-                    summary_embed = await self.generate_channel_summary(channel)
-                    await target_channel.send(embed=summary_embed)
-                    total_channels += 1
-                    
-                    # 收集PDF数据
-                    if generate_pdf:
-                        # 从embed提取数据
-                        summary_text = summary_embed.description or "无总结内容"
-                        stats = {}
-                        for field in summary_embed.fields:
-                            if "消息数量" in field.name:
-                                stats['message_count'] = field.value
-                            elif "参与人数" in field.name:
-                                stats['user_count'] = field.value
-                            elif "时间范围" in field.name:
-                                stats['time_range'] = field.value
-                        
-                        summaries_data.append({
-                            'category': category_name,
-                            'channel_name': channel.name,
-                            'summary_text': summary_text,
-                            'stats': stats
-                        })
-                    
-                    log.info(f"成功总结频道 {channel.name} (分类: {category_name}, Guild: {ctx.guild.name})")
-                    await asyncio.sleep(1)  # 避免速率限制
-                except Exception as e:
-                    log.error(f"总结频道 {channel.name} 时出错 (分类: {category_name}, Guild: {ctx.guild.name}): {e}", exc_info=True)
+        # 并发生成各频道总结，按分类/频道位置顺序发送
+        summaries_data = await self._run_channel_summaries(ctx.guild, target_channel, categories_dict)
+        total_channels = len(summaries_data)
         
-        await ctx.send(f"✅ 总结完成！共总结了 {total_channels} 个频道，分布在 {len(categories_dict)} 个分类中。")
+        await self.rate_budget.send(ctx.channel, f"✅ 总结完成！共总结了 {total_channels} 个频道，分布在 {len(categories_dict)} 个分类中。")
         
         # 生成并发送PDF
         if generate_pdf and summaries_data:
-            await ctx.send("📄 正在生成PDF报告...")
+            await self.rate_budget.send(ctx.channel, "📄 正在生成PDF报告...")
             report_title = f"{ctx.guild.name} - Server Summary Report"
             pdf_path = await self.generate_pdf_report(ctx.guild, summaries_data, report_title)
             
             if pdf_path and os.path.exists(pdf_path):
                 try:
-                    await target_channel.send(
+                    await self.rate_budget.send(
+                        target_channel,
                         "📊 总结报告PDF文件：",
                         file=discord.File(pdf_path, filename=f"summary_{ctx.guild.name}_{datetime.utcnow().strftime('%Y%m%d')}.pdf")
                     )
@@ -1138,9 +1368,9 @@ The Discord content:
                     os.remove(pdf_path)
                 except Exception as e:
                     log.error(f"发送PDF文件时出错: {e}", exc_info=True)
-                    await ctx.send("❌ PDF文件生成成功但发送失败。")
+                    await self.rate_budget.send(ctx.channel, "❌ PDF文件生成成功但发送失败。")
             else:
-                await ctx.send("❌ PDF文件生成失败。请检查日志。")
+                await self.rate_budget.send(ctx.channel, "❌ PDF文件生成失败。请检查日志。")
     
     @summary.command(name="category", aliases=["分类"])
     @checks.admin_or_permissions(manage_guild=True)
@@ -1152,7 +1382,7 @@ The Discord content:
             generate_pdf: 是否生成PDF文件（默认为 True）
         """
         if not await self.config.guild(ctx.guild).enabled():
-            await ctx.send("❌ 聊天总结功能未启用。")
+            await self.rate_budget.send(ctx.channel, "❌ 聊天总结功能未启用。")
             return
         
         # 查找分类下的频道
@@ -1174,7 +1404,7 @@ The Discord content:
                     break
             
             if not target_category:
-                await ctx.send(f"❌ 找不到名为 `{category_name}` 的分类。")
+                await self.rate_budget.send(ctx.channel, f"❌ 找不到名为 `{category_name}` 的分类。")
                 return
             
             # 收集该分类下的所有文字频道
@@ -1184,61 +1414,35 @@ The Discord content:
                     channels_in_category.append(channel)
         
         if not channels_in_category:
-            await ctx.send(f"❌ 分类 `{category_name}` 中没有可总结的频道。")
+            await self.rate_budget.send(ctx.channel, f"❌ 分类 `{category_name}` 中没有可总结的频道。")
             return
         
-        await ctx.send(f"🔄 开始总结分类 `{category_name}`，共 {len(channels_in_category)} 个频道...")
+        await self.rate_budget.send(ctx.channel, f"🔄 开始总结分类 `{category_name}`，共 {len(channels_in_category)} 个频道...")
         
         # 发送到指定频道或当前频道
         summary_channel_id = await self.config.guild(ctx.guild).summary_channel()
         target_channel = ctx.guild.get_channel(summary_channel_id) if summary_channel_id else ctx.channel
         
         # 发送分类标题
-        await target_channel.send(f"## 📊 分类总结 - {category_name}\n生成时间: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
-        
-        summaries_data = []  # 收集PDF数据
+        await self.rate_budget.send(target_channel, f"## 📊 分类总结 - {category_name}\n生成时间: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
         
-        # 按频道位置排序并总结
-        for channel in sorted(channels_in_category, key=lambda c: c.position):
-            try:
-                summary_embed = await self.generate_channel_summary(channel)
-                await target_channel.send(embed=summary_embed)
-                
-                # 收集PDF数据
-                if generate_pdf:
-                    summary_text = summary_embed.description or "无总结内容"
-                    stats = {}
-                    for field in summary_embed.fields:
-                        if "消息数量" in field.name:
-                            stats['message_count'] = field.value
-                        elif "参与人数" in field.name:
-                            stats['user_count'] = field.value
-                        elif "时间范围" in field.name:
-                            stats['time_range'] = field.value
-                    
-                    summaries_data.append({
-                        'category': category_name,
-                        'channel_name': channel.name,
-                        'summary_text': summary_text,
-                        'stats': stats
-                    })
-                
-                log.info(f"成功总结频道 {channel.name} (分类: {category_name}, Guild: {ctx.guild.name})")
-                await asyncio.sleep(1)  # 避免速率限制
-            except Exception as e:
-                log.error(f"总结频道 {channel.name} 时出错 (分类: {category_name}, Guild: {ctx.guild.name}): {e}", exc_info=True)
+        # 并发生成各频道总结，按频道位置顺序发送
+        summaries_data = await self._run_channel_summaries(
+            ctx.guild, target_channel, {category_name: channels_in_category}, send_headers=False
+        )
         
-        await ctx.send(f"✅ 分类 `{category_name}` 总结完成！共总结了 {len(channels_in_category)} 个频道。")
+        await self.rate_budget.send(ctx.channel, f"✅ 分类 `{category_name}` 总结完成！共总结了 {len(channels_in_category)} 个频道。")
         
         # 生成并发送PDF
         if generate_pdf and summaries_data:
-            await ctx.send("📄 正在生成PDF报告...")
+            await self.rate_budget.send(ctx.channel, "📄 正在生成PDF报告...")
             report_title = f"{ctx.guild.name} - {category_name} Summary Report"
             pdf_path = await self.generate_pdf_report(ctx.guild, summaries_data, report_title)
             
             if pdf_path and os.path.exists(pdf_path):
                 try:
-                    await target_channel.send(
+                    await self.rate_budget.send(
+                        target_channel,
                         "📊 总结报告PDF文件：",
                         file=discord.File(pdf_path, filename=f"summary_{category_name}_{datetime.utcnow().strftime('%Y%m%d')}.pdf")
                     )
@@ -1247,9 +1451,9 @@ The Discord content:
                     os.remove(pdf_path)
                 except Exception as e:
                     log.error(f"发送PDF文件时出错: {e}", exc_info=True)
-                    await ctx.send("❌ PDF文件生成成功但发送失败。")
+                    await self.rate_budget.send(ctx.channel, "❌ PDF文件生成成功但发送失败。")
             else:
-                await ctx.send("❌ PDF文件生成失败。请检查日志。")
+                await self.rate_budget.send(ctx.channel, "❌ PDF文件生成失败。请检查日志。")
     
     @summary.group(name="schedule", aliases=["定时", "任务"])
     @checks.admin_or_permissions(manage_guild=True)
@@ -1268,7 +1472,7 @@ The Discord content:
             run_now: 是否立即执行一次总结（默认为 False）
         """
         if interval_hours < 1:
-            await ctx.send("❌ 间隔时间必须至少为 1 小时。")
+            await self.rate_budget.send(ctx.channel, "❌ 间隔时间必须至少为 1 小时。")
             return
         
         async with self.config.guild(ctx.guild).scheduled_tasks() as tasks:
@@ -1279,19 +1483,19 @@ The Discord content:
             }
         
         # 启动定时任务
-        self.start_scheduled_task(ctx.guild.id, channel.id, interval_hours)
+        await self.start_scheduled_task(ctx.guild.id, channel.id, interval_hours)
         
         message = f"✅ 已添加定时任务：每 {interval_hours} 小时总结 {channel.mention}"
         
         # 如果指定立即执行
         if run_now:
             message += "\n🔄 正在立即执行第一次总结..."
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
             async with ctx.typing():
                 await self._execute_summary(ctx.guild, channel)
-            await ctx.send(f"✅ 首次总结已完成！")
+            await self.rate_budget.send(ctx.channel, f"✅ 首次总结已完成！")
         else:
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
     
     @schedule.command(name="addall", aliases=["添加全部", "新增全部"])
     async def schedule_addall(self, ctx: commands.Context, interval_hours: int, run_now: bool = False):
@@ -1302,7 +1506,7 @@ The Discord content:
             run_now: 是否立即执行一次总结（默认为 False）
         """
         if interval_hours < 1:
-            await ctx.send("❌ 间隔时间必须至少为 1 小时。")
+            await self.rate_budget.send(ctx.channel, "❌ 间隔时间必须至少为 1 小时。")
             return
         
         async with self.config.guild(ctx.guild).scheduled_tasks() as tasks:
@@ -1314,23 +1518,23 @@ The Discord content:
             }
         
         # 启动定时任务（使用 channel_id = 0 表示全服务器）
-        self.start_scheduled_task(ctx.guild.id, 0, interval_hours)
+        await self.start_scheduled_task(ctx.guild.id, 0, interval_hours)
         
         message = f"✅ 已添加定时任务：每 {interval_hours} 小时总结全部频道"
         
         # 如果指定立即执行
         if run_now:
             message += "\n🔄 正在立即执行第一次全部频道总结..."
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
             try:
                 async with ctx.typing():
                     await self._execute_all_summary(ctx.guild)
             except Exception as e:
                 log.warning(f"无法发送 typing 状态: {e}")
                 await self._execute_all_summary(ctx.guild)
-            await ctx.send(f"✅ 首次全部频道总结已完成！")
+            await self.rate_budget.send(ctx.channel, f"✅ 首次全部频道总结已完成！")
         else:
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
     
     @schedule.command(name="remove", aliases=["删除", "移除"])
     async def schedule_remove(self, ctx: commands.Context, channel: discord.TextChannel):
@@ -1344,14 +1548,11 @@ The Discord content:
                 del tasks[str(channel.id)]
                 
                 # 取消任务
-                task_key = f"{ctx.guild.id}_{channel.id}"
-                if task_key in self.scheduled_jobs:
-                    self.scheduled_jobs[task_key].cancel()
-                    del self.scheduled_jobs[task_key]
+                self.scheduler.remove((SUMMARY_JOB, ctx.guild.id, str(channel.id)))
                 
-                await ctx.send(f"✅ 已移除 {channel.mention} 的定时任务。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已移除 {channel.mention} 的定时任务。")
             else:
-                await ctx.send(f"❌ 频道 {channel.mention} 没有配置定时任务。")
+                await self.rate_budget.send(ctx.channel, f"❌ 频道 {channel.mention} 没有配置定时任务。")
     
     @schedule.command(name="removeall", aliases=["删除全部", "移除全部"])
     async def schedule_removeall(self, ctx: commands.Context):
@@ -1361,14 +1562,11 @@ The Discord content:
                 del tasks["0"]
                 
                 # 取消任务
-                task_key = f"{ctx.guild.id}_0"
-                if task_key in self.scheduled_jobs:
-                    self.scheduled_jobs[task_key].cancel()
-                    del self.scheduled_jobs[task_key]
+                self.scheduler.remove((SUMMARY_JOB, ctx.guild.id, "0"))
                 
-                await ctx.send(f"✅ 已移除全部频道的定时任务。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已移除全部频道的定时任务。")
             else:
-                await ctx.send(f"❌ 没有配置全部频道的定时任务。")
+                await self.rate_budget.send(ctx.channel, f"❌ 没有配置全部频道的定时任务。")
     
     @schedule.command(name="list", aliases=["列表", "查看"])
     async def schedule_list(self, ctx: commands.Context):
@@ -1376,7 +1574,7 @@ The Discord content:
         tasks = await self.config.guild(ctx.guild).scheduled_tasks()
         
         if not tasks:
-            await ctx.send("📋 当前没有配置任何定时任务。")
+            await self.rate_budget.send(ctx.channel, "📋 当前没有配置任何定时任务。")
             return
         
         embed = discord.Embed(
@@ -1395,14 +1593,87 @@ The Discord content:
             
             interval = task_config.get("interval", "未知")
             enabled = "✅ 启用" if task_config.get("enabled", False) else "❌ 禁用"
+            mode = "增量" if task_config.get("incremental", False) else "完整"
+            next_run = self._next_run_text((SUMMARY_JOB, ctx.guild.id, channel_id_str))
             
             embed.add_field(
                 name=f"{channel_name}",
-                value=f"间隔: {interval} 小时\n状态: {enabled}",
+                value=f"间隔: {interval} 小时\n模式: {mode}\n状态: {enabled}\n下次运行: {next_run}",
                 inline=True
             )
         
-        await ctx.send(embed=embed)
+        await self.rate_budget.send(ctx.channel, embed=embed)
+    
+    @schedule.command(name="incremental", aliases=["增量"])
+    async def schedule_incremental(self, ctx: commands.Context, enabled: bool, channel: Optional[discord.TextChannel] = None):
+        """设置定时任务是否使用增量总结
+        
+        增量模式会保存上次的总结和最后处理的消息ID，之后每次只把新消息
+        连同上次的总结发送给 AI，生成更新后的总结。
+        
+        参数:
+            enabled: True 或 False
+            channel: 定时任务的频道（不指定则设置全部频道的定时任务）
+        """
+        task_id = str(channel.id) if channel else "0"
+        task_name = channel.mention if channel else "全部频道"
+        
+        async with self.config.guild(ctx.guild).scheduled_tasks() as tasks:
+            if task_id not in tasks:
+                await self.rate_budget.send(ctx.channel, f"❌ {task_name} 没有配置定时任务。")
+                return
+            tasks[task_id]["incremental"] = enabled
+            # 切换模式时清除已保存的增量状态
+            tasks[task_id].pop("rolling", None)
+        
+        status = "启用" if enabled else "禁用"
+        await self.rate_budget.send(ctx.channel, f"✅ 已为 {task_name} 的定时任务{status}增量总结。")
+    
+    @schedule.command(name="catchup", aliases=["补跑"])
+    async def schedule_catchup(self, ctx: commands.Context, enabled: bool):
+        """设置机器人离线期间错过的定时任务在启动后是否补跑一次
+        
+        适用于本服务器的定时总结和定时导出任务。无论错过多少次，最多只补跑一次，
+        之后回到原来的运行节奏；禁用时直接等到下一个运行时间。
+        
+        参数:
+            enabled: True 或 False
+        """
+        await self.config.guild(ctx.guild).schedule_catch_up.set(enabled)
+        status = "补跑一次" if enabled else "跳过"
+        await self.rate_budget.send(ctx.channel, f"✅ 离线期间错过的定时任务将在启动后{status}。")
+    
+    @schedule.command(name="jitter", aliases=["抖动"])
+    async def schedule_jitter(self, ctx: commands.Context, minutes: int):
+        """设置定时任务每次运行随机推迟的最大分钟数
+        
+        各任务本身已按任务ID错开运行时间；抖动会让每次运行再随机推迟一段时间，
+        进一步分散对 AI 接口和 Discord 的请求。只影响实际触发时间，不改变运行节奏。
+        
+        参数:
+            minutes: 最大推迟分钟数（0-60，0 表示不推迟）
+        """
+        if minutes < 0 or minutes > 60:
+            await self.rate_budget.send(ctx.channel, "❌ 抖动时间必须在 0-60 分钟之间。")
+            return
+        
+        await self.config.guild(ctx.guild).schedule_jitter.set(minutes)
+        
+        # 重新设置本服务器已有的定时任务，保留各自的下次运行时间
+        for kind, tasks in (
+            (SUMMARY_JOB, await self.config.guild(ctx.guild).scheduled_tasks()),
+            (EXPORT_JOB, await self.config.guild(ctx.guild).export_tasks()),
+        ):
+            for task_id, task_config in tasks.items():
+                key = (kind, ctx.guild.id, task_id)
+                next_run = self.scheduler.next_run(key)
+                if next_run is not None:
+                    self.scheduler.add(key, task_config.get("interval", 24) * 3600, next_run, jitter=minutes * 60)
+        
+        if minutes:
+            await self.rate_budget.send(ctx.channel, f"✅ 定时任务每次运行将随机推迟最多 {minutes} 分钟。")
+        else:
+            await self.rate_budget.send(ctx.channel, "✅ 已关闭定时任务的随机推迟。")
     
     @schedule.command(name="run", aliases=["运行", "执行"])
     async def schedule_run(self, ctx: commands.Context, channel: discord.TextChannel):
@@ -1414,17 +1685,18 @@ The Discord content:
         tasks = await self.config.guild(ctx.guild).scheduled_tasks()
         
         if str(channel.id) not in tasks:
-            await ctx.send(f"❌ 频道 {channel.mention} 没有配置定时任务。")
+            await self.rate_budget.send(ctx.channel, f"❌ 频道 {channel.mention} 没有配置定时任务。")
             return
         
-        await ctx.send(f"🔄 正在为 {channel.mention} 生成总结...")
+        rolling_task = await self._rolling_task_id(ctx.guild, str(channel.id))
+        await self.rate_budget.send(ctx.channel, f"🔄 正在为 {channel.mention} 生成总结...")
         try:
             async with ctx.typing():
-                await self._execute_summary(ctx.guild, channel)
+                await self._execute_summary(ctx.guild, channel, rolling_task)
         except Exception as e:
             log.warning(f"无法发送 typing 状态: {e}")
-            await self._execute_summary(ctx.guild, channel)
-        await ctx.send(f"✅ 总结已完成！")
+            await self._execute_summary(ctx.guild, channel, rolling_task)
+        await self.rate_budget.send(ctx.channel, f"✅ 总结已完成！")
     
     @schedule.command(name="runall", aliases=["运行全部", "执行全部"])
     async def schedule_runall(self, ctx: commands.Context):
@@ -1432,17 +1704,18 @@ The Discord content:
         tasks = await self.config.guild(ctx.guild).scheduled_tasks()
         
         if "0" not in tasks:
-            await ctx.send(f"❌ 没有配置全部频道的定时任务。")
+            await self.rate_budget.send(ctx.channel, f"❌ 没有配置全部频道的定时任务。")
             return
         
-        await ctx.send(f"🔄 正在生成全部频道总结，这可能需要一些时间...")
+        rolling_task = await self._rolling_task_id(ctx.guild, "0")
+        await self.rate_budget.send(ctx.channel, f"🔄 正在生成全部频道总结，这可能需要一些时间...")
         try:
             async with ctx.typing():
-                await self._execute_all_summary(ctx.guild)
+                await self._execute_all_summary(ctx.guild, rolling_task)
         except Exception as e:
             log.warning(f"无法发送 typing 状态: {e}")
-            await self._execute_all_summary(ctx.guild)
-        await ctx.send(f"✅ 全部频道总结已完成！")
+            await self._execute_all_summary(ctx.guild, rolling_task)
+        await self.rate_budget.send(ctx.channel, f"✅ 全部频道总结已完成！")
     
     @summary.group(name="config", aliases=["配置", "设置"])
     @checks.admin_or_permissions(manage_guild=True)
@@ -1455,13 +1728,13 @@ The Discord content:
     async def config_enable(self, ctx: commands.Context):
         """启用聊天总结功能"""
         await self.config.guild(ctx.guild).enabled.set(True)
-        await ctx.send("✅ 聊天总结功能已启用。")
+        await self.rate_budget.send(ctx.channel, "✅ 聊天总结功能已启用。")
     
     @config_group.command(name="disable", aliases=["禁用"])
     async def config_disable(self, ctx: commands.Context):
         """禁用聊天总结功能"""
         await self.config.guild(ctx.guild).enabled.set(False)
-        await ctx.send("✅ 聊天总结功能已禁用。")
+        await self.rate_budget.send(ctx.channel, "✅ 聊天总结功能已禁用。")
     
     @config_group.command(name="apikey", aliases=["api"])
     async def config_apikey(self, ctx: commands.Context, api_key: str):
@@ -1477,8 +1750,8 @@ The Discord content:
         except:
             pass
         
-        await ctx.author.send("✅ API Key 已设置成功！")
-        await ctx.send("✅ API Key 已配置（已删除你的消息以保护密钥）。")
+        await self.rate_budget.send(ctx.author, "✅ API Key 已设置成功！")
+        await self.rate_budget.send(ctx.channel, "✅ API Key 已配置（已删除你的消息以保护密钥）。")
     
     @config_group.command(name="apibase", aliases=["base"])
     async def config_apibase(self, ctx: commands.Context, api_base: str):
@@ -1488,7 +1761,42 @@ The Discord content:
             api_base: API 基础 URL（如：https://api.openai.com/v1）
         """
         await self.config.guild(ctx.guild).api_base.set(api_base)
-        await ctx.send(f"✅ API Base URL 已设置为: {api_base}")
+        await self.rate_budget.send(ctx.channel, f"✅ API Base URL 已设置为: {api_base}")
+    
+    @config_group.command(name="apiconnections", aliases=["API连接数"])
+    async def config_apiconnections(self, ctx: commands.Context, max_connections: int):
+        """设置与 API 服务器的最大并发连接数
+        
+        参数:
+            max_connections: 最大连接数（1-100）
+        """
+        if max_connections < 1 or max_connections > 100:
+            await self.rate_budget.send(ctx.channel, "❌ 连接数必须在 1-100 之间。")
+            return
+        
+        await self.config.guild(ctx.guild).api_max_connections.set(max_connections)
+        await self.rate_budget.send(ctx.channel, f"✅ API 最大并发连接数已设置为: {max_connections}")
+    
+    @config_group.command(name="ratelimit", aliases=["速率限制"])
+    async def config_ratelimit(self, ctx: commands.Context, rpm: int, tpm: int = 0):
+        """设置 AI 接口的速率限制（按服务商账户的限额设置）
+        
+        请求会排队，保证每分钟的请求数和 token 数不超过限制；
+        遇到 429 或 5xx 时自动等待后重试，而不是直接降级为简单统计。
+        
+        参数:
+            rpm: 每分钟最多请求数（0 表示不限制）
+            tpm: 每分钟最多 token 数（0 表示不限制）
+        """
+        if rpm < 0 or tpm < 0:
+            await self.rate_budget.send(ctx.channel, "❌ 速率限制不能为负数。")
+            return
+        
+        await self.config.guild(ctx.guild).api_rpm.set(rpm)
+        await self.config.guild(ctx.guild).api_tpm.set(tpm)
+        rpm_text = f"{rpm} 次/分钟" if rpm else "不限制"
+        tpm_text = f"{tpm} tokens/分钟" if tpm else "不限制"
+        await self.rate_budget.send(ctx.channel, f"✅ AI 接口速率限制已设置为: 请求 {rpm_text}，token {tpm_text}")
     
     @config_group.command(name="model", aliases=["模型"])
     async def config_model(self, ctx: commands.Context, model: str):
@@ -1498,21 +1806,131 @@ The Discord content:
             model: 模型名称（如：gpt-3.5-turbo, gpt-4）
         """
         await self.config.guild(ctx.guild).model.set(model)
-        await ctx.send(f"✅ AI 模型已设置为: {model}")
+        await self.rate_budget.send(ctx.channel, f"✅ AI 模型已设置为: {model}")
     
     @config_group.command(name="maxmessages", aliases=["消息数量"])
     async def config_maxmessages(self, ctx: commands.Context, max_messages: int):
         """设置每次总结的最大消息数量
         
         参数:
-            max_messages: 最大消息数量（10-1000）
+            max_messages: 最大消息数量（10-1000，启用分层总结后最多 10000）
         """
-        if max_messages < 10 or max_messages > 1000:
-            await ctx.send("❌ 消息数量必须在 10-1000 之间。")
+        hierarchical = await self.config.guild(ctx.guild).hierarchical_summary()
+        upper = 10000 if hierarchical else 1000
+        if max_messages < 10 or max_messages > upper:
+            hint = "" if hierarchical else "\n💡 启用分层总结（`[p]summary config hierarchical true`）后最多可设置为 10000。"
+            await self.rate_budget.send(ctx.channel, f"❌ 消息数量必须在 10-{upper} 之间。{hint}")
             return
         
         await self.config.guild(ctx.guild).max_messages.set(max_messages)
-        await ctx.send(f"✅ 最大消息数量已设置为: {max_messages}")
+        await self.rate_budget.send(ctx.channel, f"✅ 最大消息数量已设置为: {max_messages}")
+    
+    @config_group.command(name="streaming", aliases=["流式输出"])
+    async def config_streaming(self, ctx: commands.Context, enabled: bool):
+        """设置 `summary channel` 是否以流式方式显示总结
+        
+        启用后读取完消息就先发送带统计数据的嵌入消息，再随着 AI 的输出
+        逐步更新总结内容（需要 API 服务支持 `stream` 参数）。
+        
+        参数:
+            enabled: True 或 False
+        """
+        await self.config.guild(ctx.guild).stream_summaries.set(enabled)
+        status = "启用" if enabled else "禁用"
+        await self.rate_budget.send(ctx.channel, f"✅ 已{status}流式总结。")
+    
+    @config_group.command(name="hierarchical", aliases=["分层总结"])
+    async def config_hierarchical(self, ctx: commands.Context, enabled: bool):
+        """设置是否使用分层总结（分块并发总结后再合并）
+        
+        普通模式下超出 token 预算（`config prompttokens`）的较早聊天记录会被丢弃；
+        分层总结会把全部消息按 token 预算分块，并发总结每一块后再合并为最终总结。
+        
+        参数:
+            enabled: True 或 False
+        """
+        await self.config.guild(ctx.guild).hierarchical_summary.set(enabled)
+        status = "启用" if enabled else "禁用"
+        await self.rate_budget.send(ctx.channel, f"✅ 已{status}分层总结。")
+    
+    @config_group.command(name="chunktokens", aliases=["分块大小"])
+    async def config_chunktokens(self, ctx: commands.Context, chunk_tokens: int):
+        """设置分层总结时每个分块的 token 预算
+        
+        参数:
+            chunk_tokens: 每块的 token 数（500-16000）
+        """
+        if chunk_tokens < 500 or chunk_tokens > 16000:
+            await self.rate_budget.send(ctx.channel, "❌ 分块大小必须在 500-16000 之间。")
+            return
+        
+        await self.config.guild(ctx.guild).summary_chunk_tokens.set(chunk_tokens)
+        await self.rate_budget.send(ctx.channel, f"✅ 分层总结分块大小已设置为: {chunk_tokens} tokens")
+    
+    @config_group.command(name="prompttokens", aliases=["提示词预算"])
+    async def config_prompttokens(self, ctx: commands.Context, prompt_tokens: int):
+        """设置普通模式下发送给 AI 的聊天记录 token 预算
+        
+        聊天记录会清理链接和提及标记、合并同一用户的连续消息，再从最新的消息
+        开始在预算内尽量多地保留；实际预算不超过所用模型的上下文窗口。
+        
+        参数:
+            prompt_tokens: token 数（500-100000）
+        """
+        if prompt_tokens < 500 or prompt_tokens > 100000:
+            await self.rate_budget.send(ctx.channel, "❌ 提示词预算必须在 500-100000 之间。")
+            return
+        
+        await self.config.guild(ctx.guild).summary_prompt_tokens.set(prompt_tokens)
+        settings = await self.config.guild(ctx.guild).all()
+        effective = self._prompt_budget(settings, SUMMARY_PROMPT)
+        message = f"✅ 聊天记录 token 预算已设置为: {prompt_tokens} tokens"
+        if effective < prompt_tokens:
+            message += f"\n⚠️ 受模型 `{settings['model']}` 的上下文窗口限制，实际最多使用 {effective} tokens。"
+        await self.rate_budget.send(ctx.channel, message)
+    
+    @config_group.command(name="dedup", aliases=["去重"])
+    async def config_dedup(self, ctx: commands.Context, enabled: bool):
+        """设置总结前是否合并近似重复的消息
+        
+        刷屏、复制粘贴的公告和大量 "+1" 等内容近似相同的消息只保留第一条，
+        并注明共有多少条相似消息，节省发送给 AI 的 token。
+        
+        参数:
+            enabled: True 或 False
+        """
+        await self.config.guild(ctx.guild).summary_dedup.set(enabled)
+        status = "启用" if enabled else "禁用"
+        await self.rate_budget.send(ctx.channel, f"✅ 已{status}重复消息合并。")
+    
+    @config_group.command(name="batching", aliases=["批量总结"])
+    async def config_batching(self, ctx: commands.Context, enabled: bool):
+        """设置批量总结时是否把多个小频道合并到一个请求中
+        
+        `summary all`、`summary category` 和全服务器定时任务中，聊天记录较少的
+        频道会合并到同一个请求中（每个请求最多 8 个频道），再从回复中拆出各频道
+        的总结；某个频道的总结无法解析时改为单独总结。增量总结不参与合并。
+        
+        参数:
+            enabled: True 或 False
+        """
+        await self.config.guild(ctx.guild).summary_batching.set(enabled)
+        status = "启用" if enabled else "禁用"
+        await self.rate_budget.send(ctx.channel, f"✅ 已{status}小频道批量总结。")
+    
+    @config_group.command(name="concurrency", aliases=["并发数"])
+    async def config_concurrency(self, ctx: commands.Context, concurrency: int):
+        """设置批量总结时同时处理的频道数量
+        
+        参数:
+            concurrency: 并发频道数（1-10，1 表示逐个处理）
+        """
+        if concurrency < 1 or concurrency > 10:
+            await self.rate_budget.send(ctx.channel, "❌ 并发数必须在 1-10 之间。")
+            return
+        
+        await self.config.guild(ctx.guild).summary_concurrency.set(concurrency)
+        await self.rate_budget.send(ctx.channel, f"✅ 批量总结并发数已设置为: {concurrency}")
     
     @config_group.command(name="summarychannel", aliases=["总结频道"])
     async def config_summarychannel(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None):
@@ -1523,10 +1941,10 @@ The Discord content:
         """
         if channel:
             await self.config.guild(ctx.guild).summary_channel.set(channel.id)
-            await ctx.send(f"✅ 总结结果将发送到: {channel.mention}")
+            await self.rate_budget.send(ctx.channel, f"✅ 总结结果将发送到: {channel.mention}")
         else:
             await self.config.guild(ctx.guild).summary_channel.set(None)
-            await ctx.send("✅ 总结结果将发送到原频道。")
+            await self.rate_budget.send(ctx.channel, "✅ 总结结果将发送到原频道。")
     
     @config_group.command(name="exportchannel", aliases=["导出频道"])
     async def config_exportchannel(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None):
@@ -1537,10 +1955,10 @@ The Discord content:
         """
         if channel:
             await self.config.guild(ctx.guild).export_channel.set(channel.id)
-            await ctx.send(f"✅ Excel导出文件将发送到: {channel.mention}")
+            await self.rate_budget.send(ctx.channel, f"✅ Excel导出文件将发送到: {channel.mention}")
         else:
             await self.config.guild(ctx.guild).export_channel.set(None)
-            await ctx.send("✅ Excel导出文件将使用总结频道或当前频道。")
+            await self.rate_budget.send(ctx.channel, "✅ Excel导出文件将使用总结频道或当前频道。")
     
     @config_group.command(name="exclude", aliases=["排除"])
     async def config_exclude(self, ctx: commands.Context, channel: discord.TextChannel):
@@ -1552,9 +1970,9 @@ The Discord content:
         async with self.config.guild(ctx.guild).excluded_channels() as excluded:
             if channel.id not in excluded:
                 excluded.append(channel.id)
-                await ctx.send(f"✅ 已将 {channel.mention} 添加到排除列表。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将 {channel.mention} 添加到排除列表。")
             else:
-                await ctx.send(f"❌ {channel.mention} 已在排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ {channel.mention} 已在排除列表中。")
     
     @config_group.command(name="include", aliases=["包含"])
     async def config_include(self, ctx: commands.Context, channel: discord.TextChannel):
@@ -1566,9 +1984,9 @@ The Discord content:
         async with self.config.guild(ctx.guild).excluded_channels() as excluded:
             if channel.id in excluded:
                 excluded.remove(channel.id)
-                await ctx.send(f"✅ 已将 {channel.mention} 从排除列表移除。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将 {channel.mention} 从排除列表移除。")
             else:
-                await ctx.send(f"❌ {channel.mention} 不在排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ {channel.mention} 不在排除列表中。")
     
     @config_group.command(name="excludecategory", aliases=["排除分类"])
     async def config_exclude_category(self, ctx: commands.Context, *, category_name: str):
@@ -1585,15 +2003,15 @@ The Discord content:
             category_exists = any(cat.name == category_name for cat in ctx.guild.categories)
         
         if not category_exists:
-            await ctx.send(f"❌ 找不到名为 `{category_name}` 的分类。")
+            await self.rate_budget.send(ctx.channel, f"❌ 找不到名为 `{category_name}` 的分类。")
             return
         
         async with self.config.guild(ctx.guild).excluded_categories() as excluded:
             if category_name not in excluded:
                 excluded.append(category_name)
-                await ctx.send(f"✅ 已将分类 `{category_name}` 添加到排除列表。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将分类 `{category_name}` 添加到排除列表。")
             else:
-                await ctx.send(f"❌ 分类 `{category_name}` 已在排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ 分类 `{category_name}` 已在排除列表中。")
     
     @config_group.command(name="includecategory", aliases=["包含分类"])
     async def config_include_category(self, ctx: commands.Context, *, category_name: str):
@@ -1605,9 +2023,9 @@ The Discord content:
         async with self.config.guild(ctx.guild).excluded_categories() as excluded:
             if category_name in excluded:
                 excluded.remove(category_name)
-                await ctx.send(f"✅ 已将分类 `{category_name}` 从排除列表移除。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将分类 `{category_name}` 从排除列表移除。")
             else:
-                await ctx.send(f"❌ 分类 `{category_name}` 不在排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ 分类 `{category_name}` 不在排除列表中。")
     
     @config_group.command(name="includebots", aliases=["包含机器人"])
     async def config_includebots(self, ctx: commands.Context, include: bool):
@@ -1618,7 +2036,83 @@ The Discord content:
         """
         await self.config.guild(ctx.guild).include_bots.set(include)
         status = "包含" if include else "不包含"
-        await ctx.send(f"✅ 总结将 {status} 机器人消息。")
+        await self.rate_budget.send(ctx.channel, f"✅ 总结将 {status} 机器人消息。")
+    
+    @config_group.command(name="clearstore", aliases=["清空消息缓存"])
+    async def config_clearstore(self, ctx: commands.Context):
+        """清空本服务器的本地消息存储（下次总结或导出时重新同步）"""
+        await self.message_store.clear_guild(ctx.guild.id)
+        await self.rate_budget.send(ctx.channel, "✅ 已清空本服务器的本地消息存储。")
+    
+    @config_group.command(name="cache", aliases=["缓存"])
+    async def config_cache(self, ctx: commands.Context, enabled: bool):
+        """设置是否缓存总结结果（频道没有新消息时直接返回上次的总结）
+        
+        参数:
+            enabled: True 或 False
+        """
+        await self.config.guild(ctx.guild).summary_cache_enabled.set(enabled)
+        status = "启用" if enabled else "禁用"
+        await self.rate_budget.send(ctx.channel, f"✅ 已{status}总结缓存。")
+    
+    @config_group.command(name="cachestats", aliases=["缓存统计"])
+    async def config_cachestats(self, ctx: commands.Context):
+        """查看总结缓存的命中统计（自插件加载起）"""
+        stats = await self.summary_cache.stats(ctx.guild.id)
+        total = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / total * 100:.1f}%" if total else "N/A"
+        
+        embed = discord.Embed(
+            title="🗃️ 总结缓存统计",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(name="命中", value=str(stats["hits"]), inline=True)
+        embed.add_field(name="未命中", value=str(stats["misses"]), inline=True)
+        embed.add_field(name="命中率", value=hit_rate, inline=True)
+        embed.add_field(name="缓存条目", value=str(stats["entries"]), inline=True)
+        
+        await self.rate_budget.send(ctx.channel, embed=embed)
+    
+    @config_group.command(name="clearcache", aliases=["清空缓存"])
+    async def config_clearcache(self, ctx: commands.Context):
+        """清空本服务器的总结缓存"""
+        await self.summary_cache.clear_guild(ctx.guild.id)
+        await self.rate_budget.send(ctx.channel, "✅ 已清空本服务器的总结缓存。")
+    
+    @config_group.command(name="renderworkers", aliases=["渲染进程数"])
+    @commands.is_owner()
+    async def config_renderworkers(self, ctx: commands.Context, workers: int):
+        """设置PDF报告渲染进程数（所有服务器共用，仅机器人所有者）
+        
+        参数:
+            workers: 渲染进程数（1-8），即同时生成的报告数上限
+        """
+        if workers < 1 or workers > 8:
+            await self.rate_budget.send(ctx.channel, "❌ 渲染进程数必须在 1-8 之间。")
+            return
+        
+        await self.config.render_workers.set(workers)
+        await self.render_pool.resize(workers)
+        await self.rate_budget.send(ctx.channel, f"✅ 报告渲染进程数已设置为: {workers}")
+    
+    @config_group.command(name="rendertimeout", aliases=["渲染超时"])
+    @commands.is_owner()
+    async def config_rendertimeout(self, ctx: commands.Context, seconds: int):
+        """设置单个PDF报告的渲染超时（仅机器人所有者）
+        
+        超时的渲染进程会被直接结束并重新启动。
+        
+        参数:
+            seconds: 超时秒数（30-3600）
+        """
+        if seconds < 30 or seconds > 3600:
+            await self.rate_budget.send(ctx.channel, "❌ 渲染超时必须在 30-3600 秒之间。")
+            return
+        
+        await self.config.render_timeout.set(seconds)
+        self.render_pool.timeout = seconds
+        await self.rate_budget.send(ctx.channel, f"✅ 报告渲染超时已设置为: {seconds} 秒")
     
     @config_group.command(name="exportmaxmessages", aliases=["导出最大消息数"])
     async def config_export_maxmessages(self, ctx: commands.Context, max_messages: int):
@@ -1628,14 +2122,46 @@ The Discord content:
             max_messages: 最大消息数量
         """
         if max_messages < 0:
-            await ctx.send("❌ 消息数量不能为负数。")
+            await self.rate_budget.send(ctx.channel, "❌ 消息数量不能为负数。")
             return
         
         await self.config.guild(ctx.guild).export_max_messages.set(max_messages)
         if max_messages == 0:
-            await ctx.send(f"✅ 导出最大消息数量已设置为: 不限制")
+            await self.rate_budget.send(ctx.channel, f"✅ 导出最大消息数量已设置为: 不限制")
         else:
-            await ctx.send(f"✅ 导出最大消息数量已设置为: {max_messages}")
+            await self.rate_budget.send(ctx.channel, f"✅ 导出最大消息数量已设置为: {max_messages}")
+    
+    @config_group.command(name="exportformat", aliases=["导出格式"])
+    async def config_exportformat(self, ctx: commands.Context, export_format: str):
+        """设置默认导出格式
+        
+        参数:
+            export_format: xlsx（Excel）、csv（gzip压缩的CSV）、ndjson（每行一个JSON）或 parquet（列式存储，需要 pyarrow）
+        """
+        export_format = export_format.lower()
+        if export_format not in EXPORT_FORMATS:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
+            return
+        
+        await self.config.guild(ctx.guild).export_format.set(export_format)
+        await self.rate_budget.send(ctx.channel, f"✅ 默认导出格式已设置为: {export_format}（文件扩展名 {EXPORT_FORMATS[export_format]}）")
+    
+    @config_group.command(name="exportbundle", aliases=["导出打包格式"])
+    async def config_exportbundle(self, ctx: commands.Context, bundle_format: str):
+        """设置导出文件的打包格式
+        
+        多文件模式或文件超过上传限制时，导出文件会被打包压缩并按上传限制拆分。
+        
+        参数:
+            bundle_format: zip（默认）或 zstd（tar.zst，需要 zstandard 库）
+        """
+        bundle_format = bundle_format.lower()
+        if bundle_format not in BUNDLE_FORMATS:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的打包格式。可用格式: {', '.join(BUNDLE_FORMATS)}")
+            return
+        
+        await self.config.guild(ctx.guild).export_bundle_format.set(bundle_format)
+        await self.rate_budget.send(ctx.channel, f"✅ 导出打包格式已设置为: {bundle_format}（文件扩展名 {BUNDLE_FORMATS[bundle_format]}）")
     
     @config_group.command(name="exportexclude", aliases=["导出排除"])
     async def config_export_exclude(self, ctx: commands.Context, channel: discord.TextChannel):
@@ -1647,9 +2173,9 @@ The Discord content:
         async with self.config.guild(ctx.guild).export_excluded_channels() as excluded:
             if channel.id not in excluded:
                 excluded.append(channel.id)
-                await ctx.send(f"✅ 已将 {channel.mention} 添加到导出排除列表。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将 {channel.mention} 添加到导出排除列表。")
             else:
-                await ctx.send(f"❌ {channel.mention} 已在导出排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ {channel.mention} 已在导出排除列表中。")
     
     @config_group.command(name="exportinclude", aliases=["导出包含"])
     async def config_export_include(self, ctx: commands.Context, channel: discord.TextChannel):
@@ -1661,9 +2187,9 @@ The Discord content:
         async with self.config.guild(ctx.guild).export_excluded_channels() as excluded:
             if channel.id in excluded:
                 excluded.remove(channel.id)
-                await ctx.send(f"✅ 已将 {channel.mention} 从导出排除列表移除。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将 {channel.mention} 从导出排除列表移除。")
             else:
-                await ctx.send(f"❌ {channel.mention} 不在导出排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ {channel.mention} 不在导出排除列表中。")
     
     @config_group.command(name="exportexcludecategory", aliases=["导出排除分类"])
     async def config_export_exclude_category(self, ctx: commands.Context, *, category_name: str):
@@ -1675,9 +2201,9 @@ The Discord content:
         async with self.config.guild(ctx.guild).export_excluded_categories() as excluded:
             if category_name not in excluded:
                 excluded.append(category_name)
-                await ctx.send(f"✅ 已将分类 `{category_name}` 添加到导出排除列表。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将分类 `{category_name}` 添加到导出排除列表。")
             else:
-                await ctx.send(f"❌ 分类 `{category_name}` 已在导出排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ 分类 `{category_name}` 已在导出排除列表中。")
     
     @config_group.command(name="exportincludecategory", aliases=["导出包含分类"])
     async def config_export_include_category(self, ctx: commands.Context, *, category_name: str):
@@ -1689,90 +2215,35 @@ The Discord content:
         async with self.config.guild(ctx.guild).export_excluded_categories() as excluded:
             if category_name in excluded:
                 excluded.remove(category_name)
-                await ctx.send(f"✅ 已将分类 `{category_name}` 从导出排除列表移除。")
+                await self.rate_budget.send(ctx.channel, f"✅ 已将分类 `{category_name}` 从导出排除列表移除。")
             else:
-                await ctx.send(f"❌ 分类 `{category_name}` 不在导出排除列表中。")
+                await self.rate_budget.send(ctx.channel, f"❌ 分类 `{category_name}` 不在导出排除列表中。")
     
     @config_group.command(name="show", aliases=["显示", "查看"])
     async def config_show(self, ctx: commands.Context):
         """显示当前配置"""
         config = await self.config.guild(ctx.guild).all()
         
-        api_key_status = "✅ 已配置" if config["api_key"] else "❌ 未配置"
-        enabled_status = "✅ 已启用" if config["enabled"] else "❌ 已禁用"
-        
-        summary_channel = ctx.guild.get_channel(config["summary_channel"]) if config["summary_channel"] else None
-        summary_channel_text = summary_channel.mention if summary_channel else "原频道"
-        
-        export_channel = ctx.guild.get_channel(config["export_channel"]) if config["export_channel"] else None
-        export_channel_text = export_channel.mention if export_channel else "总结频道/当前频道"
-        
-        excluded_channels = [
-            ctx.guild.get_channel(ch_id).mention 
-            for ch_id in config["excluded_channels"] 
-            if ctx.guild.get_channel(ch_id)
-        ]
-        excluded_channels_text = ", ".join(excluded_channels) if excluded_channels else "无"
-        
-        excluded_categories = config.get("excluded_categories", [])
-        excluded_categories_text = ", ".join([f"`{cat}`" for cat in excluded_categories]) if excluded_categories else "无"
-        
-        export_excluded_channels = [
-            ctx.guild.get_channel(ch_id).mention 
-            for ch_id in config.get("export_excluded_channels", [])
-            if ctx.guild.get_channel(ch_id)
-        ]
-        export_excluded_channels_text = ", ".join(export_excluded_channels) if export_excluded_channels else "无"
-        
-        export_excluded_categories = config.get("export_excluded_categories", [])
-        export_excluded_categories_text = ", ".join([f"`{cat}`" for cat in export_excluded_categories]) if export_excluded_categories else "无"
-        
-        embed = discord.Embed(
-            title="⚙️ 聊天总结配置",
-            color=discord.Color.blue(),
-            timestamp=datetime.utcnow()
+        breaker = self.llm_scheduler.breaker(config["api_base"], config["api_key"] or "")
+        if breaker.state == breaker.CLOSED:
+            breaker_status = "✅ 正常"
+        elif breaker.state == breaker.OPEN:
+            breaker_status = f"⛔ 已熔断（{breaker.remaining:.0f} 秒后探测）"
+        else:
+            breaker_status = "🔄 正在探测"
+        
+        embed = build_config_embed(
+            ctx.guild,
+            config,
+            breaker_status,
+            self.render_pool.workers,
+            self.render_pool.timeout
         )
-        
-        embed.add_field(name="功能状态", value=enabled_status, inline=True)
-        embed.add_field(name="API Key", value=api_key_status, inline=True)
-        embed.add_field(name="AI 模型", value=config["model"], inline=True)
-        embed.add_field(name="API Base", value=config["api_base"], inline=False)
-        embed.add_field(name="总结最大消息数", value=str(config["max_messages"]), inline=True)
-        embed.add_field(name="导出最大消息数", value=str(config.get("export_max_messages", 1000)), inline=True)
-        embed.add_field(name="包含机器人", value="是" if config["include_bots"] else "否", inline=True)
-        embed.add_field(name="总结发送频道", value=summary_channel_text, inline=True)
-        embed.add_field(name="导出发送频道", value=export_channel_text, inline=True)
-        embed.add_field(name="总结排除频道", value=excluded_channels_text, inline=False)
-        embed.add_field(name="总结排除分类", value=excluded_categories_text, inline=False)
-        embed.add_field(name="导出排除频道", value=export_excluded_channels_text, inline=False)
-        embed.add_field(name="导出排除分类", value=export_excluded_categories_text, inline=False)
-        embed.add_field(name="总结定时任务数", value=str(len(config["scheduled_tasks"])), inline=True)
-        embed.add_field(name="导出定时任务数", value=str(len(config.get("export_tasks", {}))), inline=True)
-        
-        await ctx.send(embed=embed)
+        await self.rate_budget.send(ctx.channel, embed=embed)
     
     @config_group.command(name="testfont", aliases=["测试字体"])
     async def config_testfont(self, ctx: commands.Context):
         """测试系统中文字体可用性"""
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        
-        # 测试字体列表
-        chinese_fonts = [
-            # macOS
-            ('/System/Library/Fonts/PingFang.ttc', 0, 'macOS PingFang'),
-            ('/System/Library/Fonts/STHeiti Light.ttc', 0, 'macOS STHeiti'),
-            ('/System/Library/Fonts/Hiragino Sans GB.ttc', 0, 'macOS Hiragino'),
-            # Linux
-            ('/usr/share/fonts/truetype/arphic/uming.ttc', 0, 'Linux AR PL UMing'),
-            ('/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf', None, 'Linux Droid Sans'),
-            ('/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc', 0, 'Linux WenQuanYi'),
-            # Windows
-            ('C:\\Windows\\Fonts\\msyh.ttc', 0, 'Windows 微软雅黑'),
-            ('C:\\Windows\\Fonts\\simhei.ttf', None, 'Windows 黑体'),
-            ('C:\\Windows\\Fonts\\simsun.ttc', 0, 'Windows 宋体'),
-        ]
-        
         embed = discord.Embed(
             title="🔤 中文字体检测",
             description="检测系统中可用的PDF中文字体",
@@ -1783,20 +2254,15 @@ The Discord content:
         found_fonts = []
         available_fonts = []
         
-        for font_path, subfont_index, font_name in chinese_fonts:
-            if os.path.exists(font_path):
-                found_fonts.append(f"✅ {font_name}\n路径: `{font_path}`")
-                
-                # 尝试注册测试
-                try:
-                    test_name = f"Test_{len(available_fonts)}"
-                    if subfont_index is not None:
-                        pdfmetrics.registerFont(TTFont(test_name, font_path, subfontIndex=subfont_index))
-                    else:
-                        pdfmetrics.registerFont(TTFont(test_name, font_path))
-                    available_fonts.append(font_name)
-                except Exception as e:
-                    found_fonts[-1] += f"\n⚠️ 注册失败: {str(e)[:50]}"
+        # 检测结果在进程内缓存，字体文件只解析一次
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, font_registry.probe)
+        for font_name, font_path, error in results:
+            found_fonts.append(f"✅ {font_name}\n路径: `{font_path}`")
+            if error is None:
+                available_fonts.append(font_name)
+            else:
+                found_fonts[-1] += f"\n⚠️ 注册失败: {error[:50]}"
         
         if found_fonts:
             embed.add_field(
@@ -1835,23 +2301,114 @@ The Discord content:
             inline=False
         )
         
-        await ctx.send(embed=embed)
+        await self.rate_budget.send(ctx.channel, embed=embed)
+    
+    async def _export_channel_files(self, categories_dict: dict, max_messages: Optional[int], export_format: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """为每个频道生成一个导出文件（多文件模式）
+        
+        参数:
+            categories_dict: 频道字典 {category_name: [channels]}
+            max_messages: 每个频道的最大消息数量
+            export_format: 导出格式
+        
+        返回:
+            ([(文件路径, 上传文件名)], [失败的频道])
+        """
+        files = []
+        failed_channels = []
+        for category_name in sorted(categories_dict.keys(), key=lambda x: (x == "未分类", x)):
+            for channel in sorted(categories_dict[category_name], key=lambda c: c.position):
+                try:
+                    path = await self.generate_excel_report(channel, max_messages, export_format)
+                    if path and os.path.exists(path):
+                        files.append((path, f"{category_name}-{channel.name}{EXPORT_FORMATS[export_format]}"))
+                        log.info(f"成功导出频道 {channel.name}")
+                    else:
+                        failed_channels.append(f"{category_name}/{channel.name}")
+                        log.error(f"导出频道 {channel.name} 失败")
+                except Exception as e:
+                    failed_channels.append(f"{category_name}/{channel.name}")
+                    log.error(f"导出频道 {channel.name} 时出错: {e}", exc_info=True)
+        return files, failed_channels
+    
+    async def _upload_export_files(self, guild: discord.Guild, target_channel: discord.TextChannel, files: List[Tuple[str, str]], bundle_name: str, message: str) -> int:
+        """上传导出文件，超过服务器上传限制或有多个文件时打包压缩
+        
+        多个文件合并到尽量少的压缩包中，单个压缩包超过上传限制时拆分为编号的分卷。
+        上传后删除所有临时文件。
+        
+        参数:
+            guild: Discord服务器（用于获取上传大小限制）
+            target_channel: 发送文件的频道
+            files: [(文件路径, 上传文件名)]
+            bundle_name: 压缩包名称（不含扩展名）
+            message: 随第一个文件发送的消息
+        
+        返回:
+            上传的文件数量
+        """
+        if not files:
+            return 0
+        
+        max_size = int(guild.filesize_limit * UPLOAD_SIZE_MARGIN)
+        uploads = []
+        try:
+            if len(files) == 1 and os.path.getsize(files[0][0]) <= max_size:
+                uploads = list(files)
+            else:
+                bundle_format = await self.config.guild(guild).export_bundle_format()
+                safe_name = "".join(c for c in bundle_name if c.isalnum() or c in (' ', '-', '_', '.', '（', '）', '(', ')'))
+                base_path = os.path.join(
+                    tempfile.gettempdir(),
+                    f"{safe_name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+                )
+                parts = await self._run_export(bundle_files, files, base_path, max_size, bundle_format)
+                # 上传文件名去掉临时路径中的时间戳
+                uploads = [(part, safe_name + part[len(base_path):]) for part in parts]
+            
+            for index, (path, filename) in enumerate(uploads, 1):
+                if index == 1:
+                    content = message
+                    if len(uploads) > 1:
+                        content += f"\n📦 共 {len(uploads)} 个文件（文件名带 .001、.002 等编号的分卷需按顺序合并后解压）"
+                else:
+                    content = f"📦 第 {index}/{len(uploads)} 个文件"
+                await self.rate_budget.send(target_channel, content, file=discord.File(path, filename=filename))
+            return len(uploads)
+        finally:
+            for path, _ in list(files) + uploads:
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    async def _run_export(self, func, *args):
+        """在导出线程池中执行导出文件构建或打包（同步函数），不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.export_executor, func, *args)
+    
+    async def _run_export_pipeline(self, func, *args):
+        """在流水线线程池中执行多频道导出（同步函数）
+        
+        多频道导出的写入线程要等待事件循环同步完所有频道才结束，
+        单独使用一个线程池，避免占满导出线程池让其他导出排队等待。
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.export_pipeline_executor, func, *args)
     
-    async def generate_excel_report(self, channel: discord.TextChannel, max_messages: int = None) -> str:
-        """生成单个频道的Excel报告
+    async def generate_excel_report(self, channel: discord.TextChannel, max_messages: int = None, export_format: str = "xlsx") -> str:
+        """生成单个频道的导出文件（默认为Excel报告）
+        
+        事件循环只负责同步频道历史，文件构建和保存在导出线程池中完成，
+        消息按批次从本地存储流式写入，内存中只保留一批消息。
         
         参数:
             channel: Discord频道
             max_messages: 最大消息数量（None表示不限制）
+            export_format: 导出格式（xlsx / csv / ndjson / parquet）
         
         返回:
-            Excel文件路径
+            导出文件路径
         """
         try:
-            import openpyxl
-            from openpyxl.styles import Font, Alignment, PatternFill
-            from openpyxl.utils import get_column_letter
-            
             guild = channel.guild
             category_name = channel.category.name if channel.category else "未分类"
             
@@ -1861,484 +2418,146 @@ The Discord content:
             
             include_bots = await self.config.guild(guild).include_bots()
             
-            log.info(f"开始生成Excel报告 (频道: {channel.name}, 最大消息数: {max_messages})")
-            
-            # 获取消息
-            messages = []
-            async for message in channel.history(limit=max_messages if max_messages > 0 else None):
-                if not include_bots and message.author.bot:
-                    continue
-                messages.append(message)
-            
-            messages.reverse()  # 按时间顺序排列
-            
-            log.info(f"获取到 {len(messages)} 条消息")
+            log.info(f"开始生成{export_format}导出文件 (频道: {channel.name}, 最大消息数: {max_messages})")
             
-            # 创建工作簿
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "聊天记录"
+            # 增量同步频道历史到本地存储
+            limit = max_messages if max_messages > 0 else None
+            await self.message_store.sync_channel(channel, limit)
             
-            # 设置标题样式
-            header_font = Font(bold=True, size=12)
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            
-            # 定义列标题
-            headers = [
-                "消息ID", "时间", "用户名", "用户ID", "用户昵称", 
-                "消息内容", "Embed内容", "附件", "回复消息ID", "反应", 
-                "是否编辑", "编辑时间", "是否置顶", "提及用户"
-            ]
-            
-            # 写入标题行
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_num)
-                cell.value = header
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-            
-            # 写入数据
-            for row_num, message in enumerate(messages, 2):
-                # 消息ID
-                ws.cell(row=row_num, column=1, value=str(message.id))
-                
-                # 时间
-                ws.cell(row=row_num, column=2, value=message.created_at.strftime('%Y-%m-%d %H:%M:%S'))
-                
-                # 用户名
-                ws.cell(row=row_num, column=3, value=str(message.author))
-                
-                # 用户ID
-                ws.cell(row=row_num, column=4, value=str(message.author.id))
-                
-                # 用户昵称（服务器内昵称）
-                nickname = message.author.display_name if hasattr(message.author, 'display_name') else str(message.author)
-                ws.cell(row=row_num, column=5, value=nickname)
-                
-                # 消息内容
-                content = message.content[:32767] if message.content else ""  # Excel单元格最大长度
-                ws.cell(row=row_num, column=6, value=content)
-                
-                # Embed内容
-                embed_content = ""
-                if message.embeds:
-                    embed_parts = []
-                    for embed in message.embeds:
-                        embed_info = []
-                        if embed.title:
-                            embed_info.append(f"标题: {embed.title}")
-                        if embed.description:
-                            embed_info.append(f"描述: {embed.description[:500]}")  # 限制长度
-                        if embed.url:
-                            embed_info.append(f"链接: {embed.url}")
-                        if embed.author and embed.author.name:
-                            embed_info.append(f"作者: {embed.author.name}")
-                        if embed.fields:
-                            for field in embed.fields:
-                                embed_info.append(f"{field.name}: {field.value[:200]}")
-                        if embed.footer and embed.footer.text:
-                            embed_info.append(f"页脚: {embed.footer.text}")
-                        if embed.image:
-                            embed_info.append(f"图片: {embed.image.url}")
-                        if embed.thumbnail:
-                            embed_info.append(f"缩略图: {embed.thumbnail.url}")
-                        if embed.video:
-                            embed_info.append(f"视频: {embed.video.url}")
-                        
-                        if embed_info:
-                            embed_parts.append(" | ".join(embed_info))
-                    
-                    embed_content = "\n---\n".join(embed_parts)
-                    # 确保不超过Excel单元格限制
-                    if len(embed_content) > 32767:
-                        embed_content = embed_content[:32764] + "..."
-                
-                ws.cell(row=row_num, column=7, value=embed_content)
-                
-                # 附件
-                attachments = ", ".join([att.url for att in message.attachments]) if message.attachments else ""
-                ws.cell(row=row_num, column=8, value=attachments)
-                
-                # 回复消息ID
-                reply_id = str(message.reference.message_id) if message.reference else ""
-                ws.cell(row=row_num, column=9, value=reply_id)
-                
-                # 反应
-                reactions = ", ".join([f"{reaction.emoji}({reaction.count})" for reaction in message.reactions]) if message.reactions else ""
-                ws.cell(row=row_num, column=10, value=reactions)
-                
-                # 是否编辑
-                ws.cell(row=row_num, column=11, value="是" if message.edited_at else "否")
-                
-                # 编辑时间
-                edited_time = message.edited_at.strftime('%Y-%m-%d %H:%M:%S') if message.edited_at else ""
-                ws.cell(row=row_num, column=12, value=edited_time)
-                
-                # 是否置顶
-                ws.cell(row=row_num, column=13, value="是" if message.pinned else "否")
-                
-                # 提及用户
-                mentions = ", ".join([str(user) for user in message.mentions]) if message.mentions else ""
-                ws.cell(row=row_num, column=14, value=mentions)
-            
-            # 调整列宽
-            column_widths = {
-                1: 20,  # 消息ID
-                2: 20,  # 时间
-                3: 20,  # 用户名
-                4: 20,  # 用户ID
-                5: 20,  # 用户昵称
-                6: 50,  # 消息内容
-                7: 50,  # Embed内容
-                8: 40,  # 附件
-                9: 20,  # 回复消息ID
-                10: 30, # 反应
-                11: 12, # 是否编辑
-                12: 20, # 编辑时间
-                13: 12, # 是否置顶
-                14: 30, # 提及用户
-            }
-            
-            for col_num, width in column_widths.items():
-                ws.column_dimensions[get_column_letter(col_num)].width = width
-            
-            # 冻结首行
-            ws.freeze_panes = "A2"
-            
-            # 添加统计信息工作表
-            stats_ws = wb.create_sheet("统计信息")
-            stats_ws['A1'] = "统计项目"
-            stats_ws['B1'] = "数值"
-            stats_ws['A1'].font = header_font
-            stats_ws['B1'].font = header_font
-            
-            stats_data = [
-                ("频道名称", f"{category_name} / {channel.name}"),
-                ("消息总数", len(messages)),
-                ("参与用户数", len(set(m.author.id for m in messages))),
-                ("时间范围", f"{messages[0].created_at.strftime('%Y-%m-%d %H:%M:%S')} - {messages[-1].created_at.strftime('%Y-%m-%d %H:%M:%S')}" if messages else "无"),
-                ("包含附件的消息", sum(1 for m in messages if m.attachments)),
-                ("包含Embed的消息", sum(1 for m in messages if m.embeds)),
-                ("编辑过的消息", sum(1 for m in messages if m.edited_at)),
-                ("置顶消息", sum(1 for m in messages if m.pinned)),
-                ("回复消息", sum(1 for m in messages if m.reference)),
-                ("生成时间", datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S') + " UTC"),
-            ]
-            
-            for idx, (stat_name, stat_value) in enumerate(stats_data, 2):
-                stats_ws[f'A{idx}'] = stat_name
-                stats_ws[f'B{idx}'] = stat_value
-            
-            stats_ws.column_dimensions['A'].width = 20
-            stats_ws.column_dimensions['B'].width = 50
-            
-            # 保存文件
             temp_dir = tempfile.gettempdir()
-            filename = f"{category_name}-{channel.name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            filename = f"{category_name}-{channel.name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
             # 清理文件名中的非法字符
             filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.', '（', '）', '(', ')'))
-            filepath = os.path.join(temp_dir, filename)
+            filepath = os.path.join(temp_dir, filename + EXPORT_FORMATS[export_format])
             
-            wb.save(filepath)
-            log.info(f"Excel报告已生成: {filepath}")
+            count = await self._run_export(
+                build_channel_export,
+                self.message_store,
+                export_format,
+                filepath,
+                guild.id,
+                channel.id,
+                category_name,
+                channel.name,
+                limit,
+                include_bots
+            )
+            log.info(f"导出文件已生成: {filepath} ({count} 条消息)")
             
             return filepath
             
-        except ImportError:
-            log.error("openpyxl库未安装，无法生成Excel报告")
+        except ImportError as e:
+            log.error(f"{export_format} 导出所需的库未安装: {e}")
             return None
         except Exception as e:
-            log.error(f"生成Excel报告时出错: {e}", exc_info=True)
+            log.error(f"生成导出文件时出错: {e}", exc_info=True)
             return None
     
-    async def generate_multi_channel_excel_report(self, guild: discord.Guild, channels_dict: dict, report_title: str, max_messages: int = None) -> str:
-        """生成多频道合并的Excel报告
+    async def generate_multi_channel_excel_report(self, guild: discord.Guild, channels_dict: dict, report_title: str, max_messages: int = None, export_format: str = "xlsx") -> str:
+        """生成多频道合并的导出文件（默认为Excel报告）
+        
+        采用生产者/消费者流水线：事件循环按顺序同步各频道历史（生产者），
+        同步完成的频道放入有界队列；流水线线程池中的文件构建（消费者）依次取出
+        频道写入。写入当前频道的同时，后续频道的历史已经在预取。
         
         参数:
             guild: Discord服务器
             channels_dict: 频道字典 {category_name: [channels]}
             report_title: 报告标题
             max_messages: 每个频道的最大消息数量
+            export_format: 导出格式（xlsx / csv / ndjson / parquet）
         
         返回:
-            Excel文件路径
+            导出文件路径
         """
         try:
-            import openpyxl
-            from openpyxl.styles import Font, Alignment, PatternFill
-            from openpyxl.utils import get_column_letter
-            
-            log.info(f"开始生成多频道Excel报告 (服务器: {guild.name}, 分类数: {len(channels_dict)})")
-            
-            # 创建工作簿
-            wb = openpyxl.Workbook()
-            # 删除默认工作表
-            wb.remove(wb.active)
-            
-            # 设置样式
-            header_font = Font(bold=True, size=12)
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            
-            # 定义列标题
-            headers = [
-                "消息ID", "时间", "用户名", "用户ID", "用户昵称", 
-                "消息内容", "Embed内容", "附件", "回复消息ID", "反应", 
-                "是否编辑", "编辑时间", "是否置顶", "提及用户"
-            ]
+            log.info(f"开始生成多频道{export_format}导出文件 (服务器: {guild.name}, 分类数: {len(channels_dict)})")
             
             # 如果没有指定最大消息数，使用配置的值
             if max_messages is None:
                 max_messages = await self.config.guild(guild).max_messages()
             
             include_bots = await self.config.guild(guild).include_bots()
-            
-            # 统计信息
-            total_messages = 0
-            total_channels = 0
-            all_stats = []
+            limit = max_messages if max_messages > 0 else None
             
             # 按分类名称排序
             sorted_categories = sorted(channels_dict.keys(), key=lambda x: (x == "未分类", x))
+            ordered_channels = [
+                (category_name, channel)
+                for category_name in sorted_categories
+                for channel in sorted(channels_dict[category_name], key=lambda c: c.position)
+            ]
             
-            # 为每个频道创建工作表
-            for category_name in sorted_categories:
-                channels = channels_dict[category_name]
-                
-                for channel in sorted(channels, key=lambda c: c.position):
+            temp_dir = tempfile.gettempdir()
+            filename = f"{guild.name}_{report_title}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+            filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.', '（', '）', '(', ')'))
+            filepath = os.path.join(temp_dir, filename + EXPORT_FORMATS[export_format])
+            
+            # 已同步完成、等待写入的频道 (分类名, 频道名, 频道ID)，None 表示结束
+            ready = asyncio.Queue(maxsize=EXPORT_PREFETCH_CHANNELS)
+            loop = asyncio.get_running_loop()
+            
+            def ready_channels():
+                # 在流水线线程中执行：阻塞等待事件循环中的队列
+                while True:
+                    item = asyncio.run_coroutine_threadsafe(ready.get(), loop).result()
+                    if item is None:
+                        return
+                    yield item
+            
+            worker = asyncio.ensure_future(self._run_export_pipeline(
+                build_multi_channel_export,
+                self.message_store,
+                export_format,
+                filepath,
+                guild.id,
+                guild.name,
+                report_title,
+                ready_channels(),
+                limit,
+                include_bots
+            ))
+            
+            try:
+                for category_name, channel in ordered_channels:
+                    if worker.done():
+                        # 文件构建已出错，停止预取
+                        break
                     try:
                         log.info(f"正在处理频道: {category_name} / {channel.name}")
-                        
-                        # 获取消息
-                        messages = []
-                        async for message in channel.history(limit=max_messages if max_messages > 0 else None):
-                            if not include_bots and message.author.bot:
-                                continue
-                            messages.append(message)
-                        
-                        messages.reverse()  # 按时间顺序排列
-                        
-                        if not messages:
-                            log.info(f"频道 {channel.name} 没有消息，跳过")
-                            continue
-                        
-                        total_messages += len(messages)
-                        total_channels += 1
-                        
-                        # 创建工作表（限制工作表名称长度）
-                        sheet_name = f"{category_name}-{channel.name}"
-                        # Excel工作表名称限制为31个字符
-                        if len(sheet_name) > 31:
-                            sheet_name = sheet_name[:28] + "..."
-                        # 移除非法字符
-                        sheet_name = "".join(c for c in sheet_name if c not in [':', '\\', '/', '?', '*', '[', ']'])
-                        
-                        ws = wb.create_sheet(title=sheet_name)
-                        
-                        # 写入标题行
-                        for col_num, header in enumerate(headers, 1):
-                            cell = ws.cell(row=1, column=col_num)
-                            cell.value = header
-                            cell.font = header_font
-                            cell.fill = header_fill
-                            cell.alignment = header_alignment
-                        
-                        # 写入数据
-                        for row_num, message in enumerate(messages, 2):
-                            # 消息ID
-                            ws.cell(row=row_num, column=1, value=str(message.id))
-                            
-                            # 时间
-                            ws.cell(row=row_num, column=2, value=message.created_at.strftime('%Y-%m-%d %H:%M:%S'))
-                            
-                            # 用户名
-                            ws.cell(row=row_num, column=3, value=str(message.author))
-                            
-                            # 用户ID
-                            ws.cell(row=row_num, column=4, value=str(message.author.id))
-                            
-                            # 用户昵称
-                            nickname = message.author.display_name if hasattr(message.author, 'display_name') else str(message.author)
-                            ws.cell(row=row_num, column=5, value=nickname)
-                            
-                            # 消息内容
-                            content = message.content[:32767] if message.content else ""
-                            ws.cell(row=row_num, column=6, value=content)
-                            
-                            # Embed内容
-                            embed_content = ""
-                            if message.embeds:
-                                embed_parts = []
-                                for embed in message.embeds:
-                                    embed_info = []
-                                    if embed.title:
-                                        embed_info.append(f"标题: {embed.title}")
-                                    if embed.description:
-                                        embed_info.append(f"描述: {embed.description[:500]}")
-                                    if embed.url:
-                                        embed_info.append(f"链接: {embed.url}")
-                                    if embed.author and embed.author.name:
-                                        embed_info.append(f"作者: {embed.author.name}")
-                                    if embed.fields:
-                                        for field in embed.fields:
-                                            embed_info.append(f"{field.name}: {field.value[:200]}")
-                                    if embed.footer and embed.footer.text:
-                                        embed_info.append(f"页脚: {embed.footer.text}")
-                                    if embed.image:
-                                        embed_info.append(f"图片: {embed.image.url}")
-                                    if embed.thumbnail:
-                                        embed_info.append(f"缩略图: {embed.thumbnail.url}")
-                                    if embed.video:
-                                        embed_info.append(f"视频: {embed.video.url}")
-                                    
-                                    if embed_info:
-                                        embed_parts.append(" | ".join(embed_info))
-                                
-                                embed_content = "\n---\n".join(embed_parts)
-                                if len(embed_content) > 32767:
-                                    embed_content = embed_content[:32764] + "..."
-                            
-                            ws.cell(row=row_num, column=7, value=embed_content)
-                            
-                            # 附件
-                            attachments = ", ".join([att.url for att in message.attachments]) if message.attachments else ""
-                            ws.cell(row=row_num, column=8, value=attachments)
-                            
-                            # 回复消息ID
-                            reply_id = str(message.reference.message_id) if message.reference else ""
-                            ws.cell(row=row_num, column=9, value=reply_id)
-                            
-                            # 反应
-                            reactions = ", ".join([f"{reaction.emoji}({reaction.count})" for reaction in message.reactions]) if message.reactions else ""
-                            ws.cell(row=row_num, column=10, value=reactions)
-                            
-                            # 是否编辑
-                            ws.cell(row=row_num, column=11, value="是" if message.edited_at else "否")
-                            
-                            # 编辑时间
-                            edited_time = message.edited_at.strftime('%Y-%m-%d %H:%M:%S') if message.edited_at else ""
-                            ws.cell(row=row_num, column=12, value=edited_time)
-                            
-                            # 是否置顶
-                            ws.cell(row=row_num, column=13, value="是" if message.pinned else "否")
-                            
-                            # 提及用户
-                            mentions = ", ".join([str(user) for user in message.mentions]) if message.mentions else ""
-                            ws.cell(row=row_num, column=14, value=mentions)
-                        
-                        # 调整列宽
-                        column_widths = {
-                            1: 20, 2: 20, 3: 20, 4: 20, 5: 20,
-                            6: 50, 7: 50, 8: 40, 9: 20, 10: 30,
-                            11: 12, 12: 20, 13: 12, 14: 30,
-                        }
-                        
-                        for col_num, width in column_widths.items():
-                            ws.column_dimensions[get_column_letter(col_num)].width = width
-                        
-                        # 冻结首行
-                        ws.freeze_panes = "A2"
-                        
-                        # 收集统计信息
-                        all_stats.append({
-                            'category': category_name,
-                            'channel': channel.name,
-                            'messages': len(messages),
-                            'users': len(set(m.author.id for m in messages)),
-                            'time_range': f"{messages[0].created_at.strftime('%Y-%m-%d %H:%M:%S')} - {messages[-1].created_at.strftime('%Y-%m-%d %H:%M:%S')}",
-                            'attachments': sum(1 for m in messages if m.attachments),
-                            'embeds': sum(1 for m in messages if m.embeds),
-                            'edited': sum(1 for m in messages if m.edited_at),
-                            'pinned': sum(1 for m in messages if m.pinned),
-                            'replies': sum(1 for m in messages if m.reference),
-                        })
-                        
-                        log.info(f"已添加工作表: {sheet_name} ({len(messages)} 条消息)")
-                        
+                        await self.message_store.sync_channel(channel, limit)
                     except Exception as e:
                         log.error(f"处理频道 {channel.name} 时出错: {e}", exc_info=True)
                         continue
-            
-            # 创建汇总统计工作表（放在最前面）
-            summary_ws = wb.create_sheet(title="📊 汇总统计", index=0)
-            summary_ws['A1'] = "服务器名称"
-            summary_ws['B1'] = guild.name
-            summary_ws['A2'] = "报告标题"
-            summary_ws['B2'] = report_title
-            summary_ws['A3'] = "生成时间"
-            summary_ws['B3'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S') + " UTC"
-            summary_ws['A4'] = "总频道数"
-            summary_ws['B4'] = total_channels
-            summary_ws['A5'] = "总消息数"
-            summary_ws['B5'] = total_messages
-            
-            # 设置标题样式
-            for row in range(1, 6):
-                summary_ws[f'A{row}'].font = header_font
-            
-            # 添加详细统计表头
-            summary_ws['A7'] = "分类"
-            summary_ws['B7'] = "频道"
-            summary_ws['C7'] = "消息数"
-            summary_ws['D7'] = "用户数"
-            summary_ws['E7'] = "附件"
-            summary_ws['F7'] = "Embed"
-            summary_ws['G7'] = "编辑"
-            summary_ws['H7'] = "置顶"
-            summary_ws['I7'] = "回复"
-            summary_ws['J7'] = "时间范围"
-            
-            for col in range(1, 11):
-                cell = summary_ws.cell(row=7, column=col)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-            
-            # 写入各频道统计
-            for idx, stat in enumerate(all_stats, 8):
-                summary_ws[f'A{idx}'] = stat['category']
-                summary_ws[f'B{idx}'] = stat['channel']
-                summary_ws[f'C{idx}'] = stat['messages']
-                summary_ws[f'D{idx}'] = stat['users']
-                summary_ws[f'E{idx}'] = stat['attachments']
-                summary_ws[f'F{idx}'] = stat['embeds']
-                summary_ws[f'G{idx}'] = stat['edited']
-                summary_ws[f'H{idx}'] = stat['pinned']
-                summary_ws[f'I{idx}'] = stat['replies']
-                summary_ws[f'J{idx}'] = stat['time_range']
-            
-            # 调整列宽
-            summary_ws.column_dimensions['A'].width = 20
-            summary_ws.column_dimensions['B'].width = 20
-            summary_ws.column_dimensions['C'].width = 12
-            summary_ws.column_dimensions['D'].width = 12
-            summary_ws.column_dimensions['E'].width = 10
-            summary_ws.column_dimensions['F'].width = 10
-            summary_ws.column_dimensions['G'].width = 10
-            summary_ws.column_dimensions['H'].width = 10
-            summary_ws.column_dimensions['I'].width = 10
-            summary_ws.column_dimensions['J'].width = 40
-            
-            # 保存文件
-            temp_dir = tempfile.gettempdir()
-            filename = f"{guild.name}_{report_title}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_', '.', '（', '）', '(', ')'))
-            filepath = os.path.join(temp_dir, filename)
-            
-            wb.save(filepath)
-            log.info(f"多频道Excel报告已生成: {filepath} (包含 {total_channels} 个频道，{total_messages} 条消息)")
+                    await self._put_until_done(ready, (category_name, channel.name, channel.id), worker)
+                await self._put_until_done(ready, None, worker)
+                total_channels, total_messages = await worker
+            finally:
+                if not worker.done():
+                    # 被取消时让导出线程尽快结束，不再等待后续频道
+                    while not ready.empty():
+                        ready.get_nowait()
+                    ready.put_nowait(None)
+            
+            log.info(f"多频道导出文件已生成: {filepath} (包含 {total_channels} 个频道，{total_messages} 条消息)")
             
             return filepath
             
-        except ImportError:
-            log.error("openpyxl库未安装，无法生成Excel报告")
+        except ImportError as e:
+            log.error(f"{export_format} 导出所需的库未安装: {e}")
             return None
         except Exception as e:
-            log.error(f"生成多频道Excel报告时出错: {e}", exc_info=True)
+            log.error(f"生成多频道导出文件时出错: {e}", exc_info=True)
             return None
     
+    @staticmethod
+    async def _put_until_done(queue: asyncio.Queue, item, worker: asyncio.Future):
+        """向有界队列放入数据；如果消费者在等待期间结束，不再阻塞"""
+        put = asyncio.ensure_future(queue.put(item))
+        await asyncio.wait({put, worker}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+    
     @summary.group(name="export", aliases=["导出"])
     @commands.guild_only()
     async def export_group(self, ctx: commands.Context):
@@ -2347,20 +2566,26 @@ The Discord content:
             await ctx.send_help(ctx.command)
     
     @export_group.command(name="channel", aliases=["频道"])
-    async def export_channel(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None, max_messages: int = 0):
+    async def export_channel(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None, max_messages: int = 0, export_format: Optional[str] = None):
         """导出指定频道的聊天记录到Excel
         
         参数:
             channel: 要导出的频道（不指定则导出当前频道）
             max_messages: 最大消息数量（0表示使用配置的默认值）
+            export_format: 导出格式 xlsx/csv/ndjson/parquet（不指定则使用配置的默认格式）
         """
         if not await self.config.guild(ctx.guild).enabled():
-            await ctx.send("❌ 聊天总结功能未启用。请管理员使用 `[p]summary enable` 启用。")
+            await self.rate_budget.send(ctx.channel, "❌ 聊天总结功能未启用。请管理员使用 `[p]summary enable` 启用。")
+            return
+        
+        export_format = await self._export_format(ctx.guild, export_format)
+        if export_format is None:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
             return
         
         target_channel = channel or ctx.channel
         
-        await ctx.send(f"📊 正在导出频道 {target_channel.mention} 的聊天记录，请稍候...")
+        await self.rate_budget.send(ctx.channel, f"📊 正在导出频道 {target_channel.mention} 的聊天记录，请稍候...")
         
         try:
             async with ctx.typing():
@@ -2370,38 +2595,45 @@ The Discord content:
                     max_msgs = default_max if default_max > 0 else None
                 else:
                     max_msgs = max_messages
-                excel_path = await self.generate_excel_report(target_channel, max_msgs)
+                excel_path = await self.generate_excel_report(target_channel, max_msgs, export_format)
                 
                 if excel_path and os.path.exists(excel_path):
                     category_name = target_channel.category.name if target_channel.category else "未分类"
-                    await send_channel.send(
-                        f"✅ Excel报告已生成！",
-                        file=discord.File(excel_path, filename=f"{category_name}-{target_channel.name}.xlsx")
+                    await self._upload_export_files(
+                        ctx.guild,
+                        ctx.channel,
+                        [(excel_path, f"{category_name}-{target_channel.name}{EXPORT_FORMATS[export_format]}")],
+                        f"{category_name}-{target_channel.name}",
+                        f"✅ 导出文件已生成！"
                     )
-                    # 删除临时文件
-                    os.remove(excel_path)
                     log.info(f"成功发送Excel报告 (频道: {target_channel.name})")
                 else:
-                    await ctx.send("❌ Excel报告生成失败。请确保已安装 openpyxl 库。")
+                    await self.rate_budget.send(ctx.channel, f"❌ 导出文件生成失败。请确保已安装 {export_format} 格式所需的库（xlsx 需要 openpyxl，parquet 需要 pyarrow）。")
         except Exception as e:
             log.error(f"导出Excel时出错: {e}", exc_info=True)
-            await ctx.send(f"❌ 导出失败: {str(e)}")
+            await self.rate_budget.send(ctx.channel, f"❌ 导出失败: {str(e)}")
     
     @export_group.command(name="all", aliases=["全部"])
     @checks.admin_or_permissions(manage_guild=True)
-    async def export_all(self, ctx: commands.Context, max_messages: int = 0, single_file: bool = True):
+    async def export_all(self, ctx: commands.Context, max_messages: int = 0, single_file: bool = True, export_format: Optional[str] = None):
         """导出所有频道的聊天记录到Excel
         
         参数:
             max_messages: 每个频道的最大消息数量（0表示使用配置的默认值）
             single_file: 是否合并到单个文件（True=单文件，False=每个频道一个文件）
+            export_format: 导出格式 xlsx/csv/ndjson/parquet（不指定则使用配置的默认格式）
         """
         if not await self.config.guild(ctx.guild).enabled():
-            await ctx.send("❌ 聊天总结功能未启用。")
+            await self.rate_budget.send(ctx.channel, "❌ 聊天总结功能未启用。")
+            return
+        
+        export_format = await self._export_format(ctx.guild, export_format)
+        if export_format is None:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
             return
         
         file_mode = "单文件模式" if single_file else "多文件模式"
-        await ctx.send(f"🔄 开始导出所有频道的聊天记录（{file_mode}），这可能需要较长时间...")
+        await self.rate_budget.send(ctx.channel, f"🔄 开始导出所有频道的聊天记录（{file_mode}），这可能需要较长时间...")
         
         # 按分类分组频道
         categories_dict = defaultdict(list)
@@ -2414,7 +2646,7 @@ The Discord content:
             categories_dict[category_name].append(channel)
         
         if not categories_dict:
-            await ctx.send("❌ 没有可导出的频道。")
+            await self.rate_budget.send(ctx.channel, "❌ 没有可导出的频道。")
             return
         
         # 发送到指定频道或当前频道（优先使用导出频道）
@@ -2441,77 +2673,63 @@ The Discord content:
         if single_file:
             # 单文件模式：所有频道合并到一个Excel文件
             try:
-                await target_channel.send("📄 正在生成合并Excel报告...")
+                await self.rate_budget.send(target_channel, "📄 正在生成合并Excel报告...")
                 report_title = "全服务器聊天记录"
                 excel_path = await self.generate_multi_channel_excel_report(
-                    ctx.guild, categories_dict, report_title, max_msgs
+                    ctx.guild, categories_dict, report_title, max_msgs, export_format
                 )
                 
                 if excel_path and os.path.exists(excel_path):
                     file_size = os.path.getsize(excel_path) / (1024 * 1024)  # MB
-                    await target_channel.send(
-                        f"✅ Excel报告已生成（文件大小: {file_size:.2f} MB）",
-                        file=discord.File(excel_path, filename=f"{ctx.guild.name}_全服务器聊天记录.xlsx")
+                    await self._upload_export_files(
+                        ctx.guild,
+                        target_channel,
+                        [(excel_path, f"{ctx.guild.name}_全服务器聊天记录{EXPORT_FORMATS[export_format]}")],
+                        f"{ctx.guild.name}_全服务器聊天记录",
+                        f"✅ Excel报告已生成（文件大小: {file_size:.2f} MB）"
                     )
-                    os.remove(excel_path)
                     log.info(f"成功发送合并Excel报告")
                 else:
-                    await ctx.send("❌ Excel报告生成失败。请检查日志。")
+                    await self.rate_budget.send(ctx.channel, "❌ Excel报告生成失败。请检查日志。")
             except Exception as e:
                 log.error(f"生成合并Excel报告时出错: {e}", exc_info=True)
-                await ctx.send(f"❌ 导出失败: {str(e)}")
+                await self.rate_budget.send(ctx.channel, f"❌ 导出失败: {str(e)}")
         else:
-            # 多文件模式：每个频道一个文件
-            total_channels = 0
-            failed_channels = []
-            
-            # 按分类名称排序
-            sorted_categories = sorted(categories_dict.keys(), key=lambda x: (x == "未分类", x))
-            
-            for category_name in sorted_categories:
-                channels = categories_dict[category_name]
-                
-                await target_channel.send(f"\n## 📁 正在导出分类: {category_name}\n")
-                
-                for channel in sorted(channels, key=lambda c: c.position):
-                    try:
-                        excel_path = await self.generate_excel_report(channel, max_msgs)
-                        
-                        if excel_path and os.path.exists(excel_path):
-                            await target_channel.send(
-                                f"📊 {category_name} / {channel.name}",
-                                file=discord.File(excel_path, filename=f"{category_name}-{channel.name}.xlsx")
-                            )
-                            os.remove(excel_path)
-                            total_channels += 1
-                            log.info(f"成功导出频道 {channel.name}")
-                        else:
-                            failed_channels.append(f"{category_name}/{channel.name}")
-                            log.error(f"导出频道 {channel.name} 失败")
-                        
-                        await asyncio.sleep(2)  # 避免速率限制
-                    except Exception as e:
-                        failed_channels.append(f"{category_name}/{channel.name}")
-                        log.error(f"导出频道 {channel.name} 时出错: {e}", exc_info=True)
+            # 多文件模式：每个频道一个文件，打包后上传
+            files, failed_channels = await self._export_channel_files(categories_dict, max_msgs, export_format)
+            total_channels = len(files)
+            await self._upload_export_files(
+                ctx.guild,
+                target_channel,
+                files,
+                f"{ctx.guild.name}_全服务器聊天记录",
+                f"📦 共 {total_channels} 个频道的导出文件"
+            )
             
             # 发送完成消息
             if failed_channels:
-                await ctx.send(f"⚠️ 导出完成！成功导出 {total_channels} 个频道，{len(failed_channels)} 个频道失败。\n失败的频道: {', '.join(failed_channels)}")
+                await self.rate_budget.send(ctx.channel, f"⚠️ 导出完成！成功导出 {total_channels} 个频道，{len(failed_channels)} 个频道失败。\n失败的频道: {', '.join(failed_channels)}")
             else:
-                await ctx.send(f"✅ 导出完成！共成功导出 {total_channels} 个频道。")
+                await self.rate_budget.send(ctx.channel, f"✅ 导出完成！共成功导出 {total_channels} 个频道。")
     
     @export_group.command(name="category", aliases=["分类"])
     @checks.admin_or_permissions(manage_guild=True)
-    async def export_category(self, ctx: commands.Context, category_name: str, max_messages: int = 0, single_file: bool = True):
+    async def export_category(self, ctx: commands.Context, category_name: str, max_messages: int = 0, single_file: bool = True, export_format: Optional[str] = None):
         """导出指定分类下所有频道的聊天记录到Excel
         
         参数:
             category_name: 分类名称（使用"未分类"导出没有分类的频道）
             max_messages: 每个频道的最大消息数量（0表示使用配置的默认值）
             single_file: 是否合并到单个文件（True=单文件，False=每个频道一个文件）
+            export_format: 导出格式 xlsx/csv/ndjson/parquet（不指定则使用配置的默认格式）
         """
         if not await self.config.guild(ctx.guild).enabled():
-            await ctx.send("❌ 聊天总结功能未启用。")
+            await self.rate_budget.send(ctx.channel, "❌ 聊天总结功能未启用。")
+            return
+        
+        export_format = await self._export_format(ctx.guild, export_format)
+        if export_format is None:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
             return
         
         # 查找分类下的频道
@@ -2530,7 +2748,7 @@ The Discord content:
                     break
             
             if not target_category:
-                await ctx.send(f"❌ 找不到名为 `{category_name}` 的分类。")
+                await self.rate_budget.send(ctx.channel, f"❌ 找不到名为 `{category_name}` 的分类。")
                 return
             
             for channel in target_category.text_channels:
@@ -2538,11 +2756,11 @@ The Discord content:
                     channels_in_category.append(channel)
         
         if not channels_in_category:
-            await ctx.send(f"❌ 分类 `{category_name}` 中没有可导出的频道。")
+            await self.rate_budget.send(ctx.channel, f"❌ 分类 `{category_name}` 中没有可导出的频道。")
             return
         
         file_mode = "单文件模式" if single_file else "多文件模式"
-        await ctx.send(f"🔄 开始导出分类 `{category_name}`，共 {len(channels_in_category)} 个频道（{file_mode}）...")
+        await self.rate_budget.send(ctx.channel, f"🔄 开始导出分类 `{category_name}`，共 {len(channels_in_category)} 个频道（{file_mode}）...")
         
         # 发送到指定频道或当前频道（优先使用导出频道）
         export_channel_id = await self.config.guild(ctx.guild).export_channel()
@@ -2568,60 +2786,50 @@ The Discord content:
         if single_file:
             # 单文件模式：所有频道合并到一个Excel文件
             try:
-                await target_channel.send(f"📄 正在生成分类 `{category_name}` 的合并Excel报告...")
+                await self.rate_budget.send(target_channel, f"📄 正在生成分类 `{category_name}` 的合并Excel报告...")
                 
                 # 构建频道字典
                 categories_dict = {category_name: channels_in_category}
                 report_title = f"{category_name}_聊天记录"
                 
                 excel_path = await self.generate_multi_channel_excel_report(
-                    ctx.guild, categories_dict, report_title, max_msgs
+                    ctx.guild, categories_dict, report_title, max_msgs, export_format
                 )
                 
                 if excel_path and os.path.exists(excel_path):
                     file_size = os.path.getsize(excel_path) / (1024 * 1024)  # MB
-                    await target_channel.send(
-                        f"✅ 分类 `{category_name}` 的Excel报告已生成（文件大小: {file_size:.2f} MB）",
-                        file=discord.File(excel_path, filename=f"{category_name}_聊天记录.xlsx")
+                    await self._upload_export_files(
+                        ctx.guild,
+                        target_channel,
+                        [(excel_path, f"{category_name}_聊天记录{EXPORT_FORMATS[export_format]}")],
+                        f"{category_name}_聊天记录",
+                        f"✅ 分类 `{category_name}` 的Excel报告已生成（文件大小: {file_size:.2f} MB）"
                     )
-                    os.remove(excel_path)
                     log.info(f"成功发送分类 {category_name} 的合并Excel报告")
                 else:
-                    await ctx.send("❌ Excel报告生成失败。请检查日志。")
+                    await self.rate_budget.send(ctx.channel, "❌ Excel报告生成失败。请检查日志。")
             except Exception as e:
                 log.error(f"生成分类合并Excel报告时出错: {e}", exc_info=True)
-                await ctx.send(f"❌ 导出失败: {str(e)}")
+                await self.rate_budget.send(ctx.channel, f"❌ 导出失败: {str(e)}")
         else:
-            # 多文件模式：每个频道一个文件
-            total_channels = 0
-            failed_channels = []
-            
-            for channel in sorted(channels_in_category, key=lambda c: c.position):
-                try:
-                    excel_path = await self.generate_excel_report(channel, max_msgs)
-                    
-                    if excel_path and os.path.exists(excel_path):
-                        await target_channel.send(
-                            f"📊 {category_name} / {channel.name}",
-                            file=discord.File(excel_path, filename=f"{category_name}-{channel.name}.xlsx")
-                        )
-                        os.remove(excel_path)
-                        total_channels += 1
-                        log.info(f"成功导出频道 {channel.name}")
-                    else:
-                        failed_channels.append(channel.name)
-                        log.error(f"导出频道 {channel.name} 失败")
-                    
-                    await asyncio.sleep(2)  # 避免速率限制
-                except Exception as e:
-                    failed_channels.append(channel.name)
-                    log.error(f"导出频道 {channel.name} 时出错: {e}", exc_info=True)
+            # 多文件模式：每个频道一个文件，打包后上传
+            files, failed_channels = await self._export_channel_files(
+                {category_name: channels_in_category}, max_msgs, export_format
+            )
+            total_channels = len(files)
+            await self._upload_export_files(
+                ctx.guild,
+                target_channel,
+                files,
+                f"{category_name}_聊天记录",
+                f"📦 分类 `{category_name}` 共 {total_channels} 个频道的导出文件"
+            )
             
             # 发送完成消息
             if failed_channels:
-                await ctx.send(f"⚠️ 导出完成！成功导出 {total_channels} 个频道，{len(failed_channels)} 个频道失败。\n失败的频道: {', '.join(failed_channels)}")
+                await self.rate_budget.send(ctx.channel, f"⚠️ 导出完成！成功导出 {total_channels} 个频道，{len(failed_channels)} 个频道失败。\n失败的频道: {', '.join(failed_channels)}")
             else:
-                await ctx.send(f"✅ 分类 `{category_name}` 导出完成！共成功导出 {total_channels} 个频道。")
+                await self.rate_budget.send(ctx.channel, f"✅ 分类 `{category_name}` 导出完成！共成功导出 {total_channels} 个频道。")
     
     @export_group.group(name="schedule", aliases=["定时", "任务"])
     @checks.admin_or_permissions(manage_guild=True)
@@ -2631,7 +2839,7 @@ The Discord content:
             await ctx.send_help(ctx.command)
     
     @export_schedule.command(name="addall", aliases=["添加全部"])
-    async def export_schedule_addall(self, ctx: commands.Context, interval_hours: int, single_file: bool = True, max_messages: int = 0, run_now: bool = False):
+    async def export_schedule_addall(self, ctx: commands.Context, interval_hours: int, single_file: bool = True, max_messages: int = 0, run_now: bool = False, export_format: Optional[str] = None):
         """添加定时导出所有频道的任务
         
         参数:
@@ -2639,9 +2847,14 @@ The Discord content:
             single_file: 是否合并到单个文件（默认True）
             max_messages: 每个频道的最大消息数量（0=使用默认值）
             run_now: 是否立即执行一次（默认False）
+            export_format: 导出格式 xlsx/csv/ndjson/parquet（不指定则使用执行时的默认格式）
         """
         if interval_hours < 1:
-            await ctx.send("❌ 间隔时间必须至少为 1 小时。")
+            await self.rate_budget.send(ctx.channel, "❌ 间隔时间必须至少为 1 小时。")
+            return
+        
+        if export_format is not None and export_format.lower() not in EXPORT_FORMATS:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
             return
         
         task_id = "export_all"
@@ -2651,28 +2864,29 @@ The Discord content:
             "interval": interval_hours,
             "enabled": True,
             "single_file": single_file,
-            "max_messages": max_messages
+            "max_messages": max_messages,
+            "format": export_format.lower() if export_format else None
         }
         
         async with self.config.guild(ctx.guild).export_tasks() as tasks:
             tasks[task_id] = task_config
         
         # 启动定时任务
-        self.start_export_task(ctx.guild.id, task_id, task_config)
+        await self.start_export_task(ctx.guild.id, task_id, task_config)
         
         file_mode = "单文件" if single_file else "多文件"
         message = f"✅ 已添加定时导出任务：每 {interval_hours} 小时导出所有频道（{file_mode}模式）"
         
         if run_now:
             message += "\n🔄 正在立即执行第一次导出..."
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
             await self._execute_export_task(ctx.guild, task_config)
-            await ctx.send(f"✅ 首次导出已完成！")
+            await self.rate_budget.send(ctx.channel, f"✅ 首次导出已完成！")
         else:
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
     
     @export_schedule.command(name="addcategory", aliases=["添加分类"])
-    async def export_schedule_addcategory(self, ctx: commands.Context, category_name: str, interval_hours: int, single_file: bool = True, max_messages: int = 0, run_now: bool = False):
+    async def export_schedule_addcategory(self, ctx: commands.Context, category_name: str, interval_hours: int, single_file: bool = True, max_messages: int = 0, run_now: bool = False, export_format: Optional[str] = None):
         """添加定时导出指定分类的任务
         
         参数:
@@ -2681,9 +2895,14 @@ The Discord content:
             single_file: 是否合并到单个文件（默认True）
             max_messages: 每个频道的最大消息数量（0=使用默认值）
             run_now: 是否立即执行一次（默认False）
+            export_format: 导出格式 xlsx/csv/ndjson/parquet（不指定则使用执行时的默认格式）
         """
         if interval_hours < 1:
-            await ctx.send("❌ 间隔时间必须至少为 1 小时。")
+            await self.rate_budget.send(ctx.channel, "❌ 间隔时间必须至少为 1 小时。")
+            return
+        
+        if export_format is not None and export_format.lower() not in EXPORT_FORMATS:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
             return
         
         task_id = f"export_cat_{category_name}"
@@ -2693,28 +2912,29 @@ The Discord content:
             "interval": interval_hours,
             "enabled": True,
             "single_file": single_file,
-            "max_messages": max_messages
+            "max_messages": max_messages,
+            "format": export_format.lower() if export_format else None
         }
         
         async with self.config.guild(ctx.guild).export_tasks() as tasks:
             tasks[task_id] = task_config
         
         # 启动定时任务
-        self.start_export_task(ctx.guild.id, task_id, task_config)
+        await self.start_export_task(ctx.guild.id, task_id, task_config)
         
         file_mode = "单文件" if single_file else "多文件"
         message = f"✅ 已添加定时导出任务：每 {interval_hours} 小时导出分类 `{category_name}`（{file_mode}模式）"
         
         if run_now:
             message += "\n🔄 正在立即执行第一次导出..."
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
             await self._execute_export_task(ctx.guild, task_config)
-            await ctx.send(f"✅ 首次导出已完成！")
+            await self.rate_budget.send(ctx.channel, f"✅ 首次导出已完成！")
         else:
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
     
     @export_schedule.command(name="addchannel", aliases=["添加频道"])
-    async def export_schedule_addchannel(self, ctx: commands.Context, channel: discord.TextChannel, interval_hours: int, max_messages: int = 0, run_now: bool = False):
+    async def export_schedule_addchannel(self, ctx: commands.Context, channel: discord.TextChannel, interval_hours: int, max_messages: int = 0, run_now: bool = False, export_format: Optional[str] = None):
         """添加定时导出指定频道的任务
         
         参数:
@@ -2722,9 +2942,14 @@ The Discord content:
             interval_hours: 导出间隔（小时）
             max_messages: 最大消息数量（0=使用默认值）
             run_now: 是否立即执行一次（默认False）
+            export_format: 导出格式 xlsx/csv/ndjson/parquet（不指定则使用执行时的默认格式）
         """
         if interval_hours < 1:
-            await ctx.send("❌ 间隔时间必须至少为 1 小时。")
+            await self.rate_budget.send(ctx.channel, "❌ 间隔时间必须至少为 1 小时。")
+            return
+        
+        if export_format is not None and export_format.lower() not in EXPORT_FORMATS:
+            await self.rate_budget.send(ctx.channel, f"❌ 不支持的导出格式。可用格式: {', '.join(EXPORT_FORMATS)}")
             return
         
         task_id = f"export_ch_{channel.id}"
@@ -2734,24 +2959,25 @@ The Discord content:
             "interval": interval_hours,
             "enabled": True,
             "single_file": False,  # 单频道不需要合并
-            "max_messages": max_messages
+            "max_messages": max_messages,
+            "format": export_format.lower() if export_format else None
         }
         
         async with self.config.guild(ctx.guild).export_tasks() as tasks:
             tasks[task_id] = task_config
         
         # 启动定时任务
-        self.start_export_task(ctx.guild.id, task_id, task_config)
+        await self.start_export_task(ctx.guild.id, task_id, task_config)
         
         message = f"✅ 已添加定时导出任务：每 {interval_hours} 小时导出 {channel.mention}"
         
         if run_now:
             message += "\n🔄 正在立即执行第一次导出..."
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
             await self._execute_export_task(ctx.guild, task_config)
-            await ctx.send(f"✅ 首次导出已完成！")
+            await self.rate_budget.send(ctx.channel, f"✅ 首次导出已完成！")
         else:
-            await ctx.send(message)
+            await self.rate_budget.send(ctx.channel, message)
     
     @export_schedule.command(name="remove", aliases=["删除", "移除"])
     async def export_schedule_remove(self, ctx: commands.Context, task_id: str):
@@ -2765,14 +2991,11 @@ The Discord content:
                 del tasks[task_id]
                 
                 # 取消任务
-                task_key = f"{ctx.guild.id}_{task_id}"
-                if task_key in self.export_jobs:
-                    self.export_jobs[task_key].cancel()
-                    del self.export_jobs[task_key]
+                self.scheduler.remove((EXPORT_JOB, ctx.guild.id, task_id))
                 
-                await ctx.send(f"✅ 已移除导出定时任务: {task_id}")
+                await self.rate_budget.send(ctx.channel, f"✅ 已移除导出定时任务: {task_id}")
             else:
-                await ctx.send(f"❌ 找不到任务ID: {task_id}")
+                await self.rate_budget.send(ctx.channel, f"❌ 找不到任务ID: {task_id}")
     
     @export_schedule.command(name="list", aliases=["列表", "查看"])
     async def export_schedule_list(self, ctx: commands.Context):
@@ -2780,7 +3003,7 @@ The Discord content:
         tasks = await self.config.guild(ctx.guild).export_tasks()
         
         if not tasks:
-            await ctx.send("📋 当前没有配置任何导出定时任务。")
+            await self.rate_budget.send(ctx.channel, "📋 当前没有配置任何导出定时任务。")
             return
         
         embed = discord.Embed(
@@ -2796,6 +3019,7 @@ The Discord content:
             enabled = "✅ 启用" if task_config.get("enabled", False) else "❌ 禁用"
             single_file = task_config.get("single_file", True)
             max_messages = task_config.get("max_messages", 0)
+            export_format = task_config.get("format") or "默认"
             
             if task_type == "all":
                 task_name = "🌐 所有频道"
@@ -2810,13 +3034,15 @@ The Discord content:
             file_mode = "单文件" if single_file else "多文件"
             max_msg_text = f"{max_messages}条" if max_messages > 0 else "默认"
             
+            next_run = self._next_run_text((EXPORT_JOB, ctx.guild.id, task_id))
+            
             embed.add_field(
                 name=f"{task_name} (ID: {task_id})",
-                value=f"间隔: {interval} 小时\n模式: {file_mode}\n消息数: {max_msg_text}\n状态: {enabled}",
+                value=f"间隔: {interval} 小时\n模式: {file_mode}\n格式: {export_format}\n消息数: {max_msg_text}\n状态: {enabled}\n下次运行: {next_run}",
                 inline=True
             )
         
-        await ctx.send(embed=embed)
+        await self.rate_budget.send(ctx.channel, embed=embed)
     
     @export_schedule.command(name="run", aliases=["运行", "执行"])
     async def export_schedule_run(self, ctx: commands.Context, task_id: str):
@@ -2828,15 +3054,15 @@ The Discord content:
         tasks = await self.config.guild(ctx.guild).export_tasks()
         
         if task_id not in tasks:
-            await ctx.send(f"❌ 找不到任务ID: {task_id}")
+            await self.rate_budget.send(ctx.channel, f"❌ 找不到任务ID: {task_id}")
             return
         
         task_config = tasks[task_id]
-        await ctx.send(f"🔄 正在执行导出任务: {task_id}...")
+        await self.rate_budget.send(ctx.channel, f"🔄 正在执行导出任务: {task_id}...")
         
         try:
             await self._execute_export_task(ctx.guild, task_config)
         except Exception as e:
             log.error(f"手动执行导出任务失败: {e}", exc_info=True)
-            await ctx.send(f"❌ 执行失败: {str(e)}")
+            await self.rate_budget.send(ctx.channel, f"❌ 执行失败: {str(e)}")
 
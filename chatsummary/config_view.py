@@ -0,0 +1,108 @@
+"""配置显示
+
+生成 ``[p]summary config show`` 的嵌入消息。Discord 每个嵌入消息最多只能有
+``MAX_EMBED_FIELDS`` 个字段，超出时整条消息会被拒绝（HTTP 400），因此总结相关
+的调优设置合并在一个多行的"总结设置"字段中：新增这类设置时加到
+``summary_settings_text`` 里，而不是再增加字段。
+"""
+from datetime import datetime
+
+import discord
+
+# Discord 嵌入消息的字段数上限
+MAX_EMBED_FIELDS = 25
+
+
+def _switch(enabled: bool) -> str:
+    return "✅ 启用" if enabled else "❌ 禁用"
+
+
+def summary_settings_text(config: dict) -> str:
+    """总结调优设置（每项一行）"""
+    if config.get("hierarchical_summary"):
+        hierarchical = f"✅ 启用（{config.get('summary_chunk_tokens', 2000)} tokens/块）"
+    else:
+        hierarchical = "❌ 禁用"
+    lines = [
+        f"聊天记录预算: {config.get('summary_prompt_tokens', 3000)} tokens",
+        f"并发数: {config.get('summary_concurrency', 3)}",
+        f"总结缓存: {_switch(config.get('summary_cache_enabled', True))}",
+        f"分层总结: {hierarchical}",
+        f"重复消息合并: {_switch(config.get('summary_dedup', True))}",
+        f"小频道批量总结: {_switch(config.get('summary_batching'))}",
+        f"流式总结: {_switch(config.get('stream_summaries'))}",
+    ]
+    return "\n".join(lines)
+
+
+def _channel_mentions(guild: discord.Guild, channel_ids) -> str:
+    mentions = [
+        guild.get_channel(ch_id).mention
+        for ch_id in channel_ids
+        if guild.get_channel(ch_id)
+    ]
+    return ", ".join(mentions) if mentions else "无"
+
+
+def _category_names(categories) -> str:
+    return ", ".join([f"`{cat}`" for cat in categories]) if categories else "无"
+
+
+def build_config_embed(
+    guild: discord.Guild,
+    config: dict,
+    breaker_status: str,
+    render_workers: int,
+    render_timeout: float,
+) -> discord.Embed:
+    """生成配置显示的嵌入消息
+
+    参数:
+        guild: Discord服务器
+        config: 服务器配置（``Config.guild(...).all()``）
+        breaker_status: AI 接口熔断状态的显示文本
+        render_workers: 报告渲染进程数
+        render_timeout: 单个报告的渲染超时（秒）
+    """
+    api_key_status = "✅ 已配置" if config["api_key"] else "❌ 未配置"
+    enabled_status = "✅ 已启用" if config["enabled"] else "❌ 已禁用"
+
+    summary_channel = guild.get_channel(config["summary_channel"]) if config["summary_channel"] else None
+    summary_channel_text = summary_channel.mention if summary_channel else "原频道"
+
+    export_channel = guild.get_channel(config["export_channel"]) if config["export_channel"] else None
+    export_channel_text = export_channel.mention if export_channel else "总结频道/当前频道"
+
+    embed = discord.Embed(
+        title="⚙️ 聊天总结配置",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+
+    embed.add_field(name="功能状态", value=enabled_status, inline=True)
+    embed.add_field(name="API Key", value=api_key_status, inline=True)
+    embed.add_field(name="AI 模型", value=config["model"], inline=True)
+    embed.add_field(name="API Base", value=config["api_base"], inline=False)
+    embed.add_field(name="API 连接数", value=str(config.get("api_max_connections", 10)), inline=True)
+    embed.add_field(
+        name="API 速率限制",
+        value=f"RPM: {config.get('api_rpm', 0) or '不限'} / TPM: {config.get('api_tpm', 0) or '不限'}",
+        inline=True
+    )
+    embed.add_field(name="AI 接口状态", value=breaker_status, inline=True)
+    embed.add_field(name="总结最大消息数", value=str(config["max_messages"]), inline=True)
+    embed.add_field(name="导出最大消息数", value=str(config.get("export_max_messages", 1000)), inline=True)
+    embed.add_field(name="导出格式", value=config.get("export_format", "xlsx"), inline=True)
+    embed.add_field(name="导出打包格式", value=config.get("export_bundle_format", "zip"), inline=True)
+    embed.add_field(name="包含机器人", value="是" if config["include_bots"] else "否", inline=True)
+    embed.add_field(name="报告渲染", value=f"{render_workers} 个进程，超时 {render_timeout} 秒", inline=True)
+    embed.add_field(name="总结设置", value=summary_settings_text(config), inline=False)
+    embed.add_field(name="总结发送频道", value=summary_channel_text, inline=True)
+    embed.add_field(name="导出发送频道", value=export_channel_text, inline=True)
+    embed.add_field(name="总结排除频道", value=_channel_mentions(guild, config["excluded_channels"]), inline=False)
+    embed.add_field(name="总结排除分类", value=_category_names(config.get("excluded_categories", [])), inline=False)
+    embed.add_field(name="导出排除频道", value=_channel_mentions(guild, config.get("export_excluded_channels", [])), inline=False)
+    embed.add_field(name="导出排除分类", value=_category_names(config.get("export_excluded_categories", [])), inline=False)
+    embed.add_field(name="总结定时任务数", value=str(len(config["scheduled_tasks"])), inline=True)
+    embed.add_field(name="导出定时任务数", value=str(len(config.get("export_tasks", {}))), inline=True)
+    return embed
@@ -0,0 +1,133 @@
+"""近似重复消息合并
+
+机器人刷屏、复制粘贴的公告和大量的 "+1"、表情消息会占用聊天记录的
+很大一部分预算，却没有新的信息。这里在发送给 AI 之前找出内容近似相同的
+消息，只保留第一条并记下出现次数。
+
+- 规范化后较短的消息（"+1"、单个表情等）只合并完全相同的；
+- 较长的消息按字符 3-gram 计算 MinHash 签名（单次哈希的 one permutation
+  hashing：每个 n-gram 只哈希一次，按哈希值分到各个位置上取最小值），
+  通过 LSH 分桶找出候选，再用 3-gram 集合的 Jaccard 相似度确认。
+
+每条消息最多与 ``NUM_BANDS`` 个候选比较，耗时与消息数量成正比；每个桶
+只记录第一条代表消息，内存占用与保留下来的消息数量成正比。
+"""
+import re
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+# 字符 n-gram 的长度（按字符切分，对中文和英文都适用）
+SHINGLE_SIZE = 3
+
+# LSH 参数：NUM_BANDS 个段，每段 BAND_ROWS 个哈希值
+# 相似度 0.7 的消息约 89% 会成为候选，0.8 约 98%
+NUM_BANDS = 8
+BAND_ROWS = 4
+
+# 判定为近似重复的 Jaccard 相似度
+SIMILARITY_THRESHOLD = 0.7
+
+# 规范化后短于该长度的消息只合并完全相同的
+EXACT_MATCH_LENGTH = 8
+
+# 签名长度
+SIGNATURE_SIZE = NUM_BANDS * BAND_ROWS
+
+# n-gram 哈希值取 64 位（字符串哈希按进程随机化，同一进程内结果稳定即可）
+_HASH_MASK = (1 << 64) - 1
+# 签名中每个位置的取值范围，空位置借用其他位置的值时加上该值的倍数以示区分
+_BIN_RANGE = (_HASH_MASK + 1) // SIGNATURE_SIZE
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """比较前的规范化：忽略大小写和空白"""
+    return _SPACE_RE.sub("", text.lower())
+
+
+def shingles(text: str) -> FrozenSet[int]:
+    """规范化文本的字符 n-gram 哈希集合"""
+    grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return frozenset(map(_HASH_MASK.__and__, map(hash, grams)))
+
+
+def minhash(shingle_set: FrozenSet[int]) -> List[int]:
+    """MinHash 签名
+
+    每个哈希值按 ``h % SIGNATURE_SIZE`` 分到一个位置，各位置保留最小的
+    ``h // SIGNATURE_SIZE``。n-gram 较少时部分位置为空，依次借用后面第一个
+    非空位置的值（加上偏移区分），相同的集合仍得到相同的签名。
+    """
+    signature: List[int] = [-1] * SIGNATURE_SIZE
+    for h in shingle_set:
+        position = h % SIGNATURE_SIZE
+        value = h // SIGNATURE_SIZE
+        if signature[position] < 0 or value < signature[position]:
+            signature[position] = value
+    if -1 in signature and len(shingle_set):
+        filled = list(signature)
+        for position in range(SIGNATURE_SIZE):
+            if signature[position] >= 0:
+                continue
+            offset = 1
+            while signature[(position + offset) % SIGNATURE_SIZE] < 0:
+                offset += 1
+            filled[position] = signature[(position + offset) % SIGNATURE_SIZE] + offset * _BIN_RANGE
+        signature = filled
+    return signature
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    """两个集合的 Jaccard 相似度"""
+    if not a and not b:
+        return 1.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+def collapse_duplicates(texts: Sequence[str]) -> List[int]:
+    """找出近似重复的文本
+
+    参数:
+        texts: 按时间顺序排列的文本
+
+    返回:
+        与 texts 对应的计数：0 表示与前面某条重复（应丢弃），
+        否则为该条（保留的代表）连同其重复项的总数
+    """
+    counts = [0] * len(texts)
+    exact: Dict[str, int] = {}
+    buckets: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+    representatives: Dict[int, FrozenSet[int]] = {}
+
+    for index, text in enumerate(texts):
+        key = normalize(text)
+        if len(key) < EXACT_MATCH_LENGTH:
+            first = exact.setdefault(key, index)
+            counts[first] += 1
+            continue
+
+        shingle_set = shingles(key)
+        signature = minhash(shingle_set)
+        bands = [
+            (band, tuple(signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]))
+            for band in range(NUM_BANDS)
+        ]
+
+        match = None
+        for band_key in bands:
+            candidate = buckets.get(band_key)
+            if candidate is not None and jaccard(shingle_set, representatives[candidate]) >= SIMILARITY_THRESHOLD:
+                match = candidate
+                break
+
+        if match is not None:
+            counts[match] += 1
+            continue
+
+        counts[index] = 1
+        representatives[index] = shingle_set
+        for band_key in bands:
+            buckets.setdefault(band_key, index)
+
+    return counts
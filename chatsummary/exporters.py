@@ -0,0 +1,541 @@
+"""聊天记录导出
+
+使用 openpyxl 的只写（write-only）模式流式生成 Excel 报告：
+消息按批次从本地存储读出后立即追加到工作表，openpyxl 会把行写入临时文件，
+内存中只保留当前一批消息，导出多大的频道都不会占满内存。
+同样的流式方式也支持 gzip 压缩的 CSV、NDJSON 和 Parquet（需要 pyarrow）格式，
+这些格式写入更快、文件更小，适合导入数据分析系统。
+
+工作簿的构建和保存都是同步的 CPU 密集操作，由插件放到专用的导出线程池中执行，
+只接收频道ID等普通数据，直接从本地存储读取消息，不会阻塞事件循环。
+"""
+import csv
+import gzip
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from .message_store import CELL_MAX_LENGTH, MessageRecord
+
+log = logging.getLogger("red.chatsummary.export")
+
+# 聊天记录工作表的列标题
+HEADERS = [
+    "消息ID", "时间", "用户名", "用户ID", "用户昵称",
+    "消息内容", "Embed内容", "附件", "回复消息ID", "反应",
+    "是否编辑", "编辑时间", "是否置顶", "提及用户"
+]
+
+# 聊天记录工作表的列宽（与 HEADERS 顺序一致）
+COLUMN_WIDTHS = [20, 20, 20, 20, 20, 50, 50, 40, 20, 30, 12, 20, 12, 30]
+
+# 汇总统计工作表的列标题和列宽
+SUMMARY_HEADERS = ["分类", "频道", "消息数", "用户数", "附件", "Embed", "编辑", "置顶", "回复", "时间范围"]
+SUMMARY_COLUMN_WIDTHS = [20, 20, 12, 12, 10, 10, 10, 10, 10, 40]
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def message_row(message: MessageRecord) -> list:
+    """将一条消息转换为数据行（与表头列顺序一致）"""
+    return [
+        str(message.id),  # 消息ID
+        message.created_at.strftime(TIME_FORMAT),  # 时间
+        message.author_tag,  # 用户名
+        str(message.author_id),  # 用户ID
+        message.author_display,  # 用户昵称（服务器内昵称）
+        message.content[:CELL_MAX_LENGTH],  # 消息内容（Excel单元格最大长度）
+        message.embeds,  # Embed内容
+        message.attachments,  # 附件
+        str(message.reply_id) if message.reply_id else "",  # 回复消息ID
+        message.reactions,  # 反应
+        "是" if message.edited_at else "否",  # 是否编辑
+        message.edited_at.strftime(TIME_FORMAT) if message.edited_at else "",  # 编辑时间
+        "是" if message.pinned else "否",  # 是否置顶
+        message.mentions,  # 提及用户
+    ]
+
+
+class ChannelStats:
+    """边写入边累计的频道统计（不需要保留消息列表）"""
+
+    def __init__(self):
+        self.messages = 0
+        self.attachments = 0
+        self.embeds = 0
+        self.edited = 0
+        self.pinned = 0
+        self.replies = 0
+        self.first_time: Optional[datetime] = None
+        self.last_time: Optional[datetime] = None
+        self._users = set()
+
+    @property
+    def users(self) -> int:
+        return len(self._users)
+
+    def add(self, messages: Iterable[MessageRecord]):
+        """累计一批消息（按时间顺序）"""
+        for message in messages:
+            self.messages += 1
+            self._users.add(message.author_id)
+            if message.attachments:
+                self.attachments += 1
+            if message.embed_count:
+                self.embeds += 1
+            if message.edited_at:
+                self.edited += 1
+            if message.pinned:
+                self.pinned += 1
+            if message.reply_id:
+                self.replies += 1
+            if self.first_time is None:
+                self.first_time = message.created_at
+            self.last_time = message.created_at
+
+    def time_range(self) -> str:
+        """时间范围文本"""
+        if self.first_time is None:
+            return "无"
+        return f"{self.first_time.strftime(TIME_FORMAT)} - {self.last_time.strftime(TIME_FORMAT)}"
+
+
+def sheet_title(category_name: str, channel_name: str) -> str:
+    """生成合法的工作表名称（Excel限制为31个字符且不能包含特殊字符）"""
+    sheet_name = f"{category_name}-{channel_name}"
+    if len(sheet_name) > 31:
+        sheet_name = sheet_name[:28] + "..."
+    return "".join(c for c in sheet_name if c not in [':', '\\', '/', '?', '*', '[', ']'])
+
+
+class XlsxReportWriter:
+    """流式 Excel 报告写入器
+
+    基于 ``openpyxl.Workbook(write_only=True)``：工作表只能按行追加，
+    列宽和冻结窗格必须在写入第一行之前设置。未安装 openpyxl 时
+    构造函数抛出 ImportError。
+    """
+
+    def __init__(self):
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, PatternFill
+
+        self._cell_class = WriteOnlyCell
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.header_font = Font(bold=True, size=12)
+        self.header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        self.header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        self._used_titles = set()
+
+    def _unique_title(self, title: str) -> str:
+        """避免重复的工作表名称（只写模式不会自动重命名）"""
+        candidate = title
+        suffix = 1
+        while candidate.lower() in self._used_titles:
+            suffix += 1
+            tail = f"({suffix})"
+            candidate = title[:31 - len(tail)] + tail
+        self._used_titles.add(candidate.lower())
+        return candidate
+
+    def _styled_cells(self, ws, values: List, fill: bool = True) -> list:
+        cells = []
+        for value in values:
+            cell = self._cell_class(ws, value=value)
+            cell.font = self.header_font
+            if fill:
+                cell.fill = self.header_fill
+                cell.alignment = self.header_alignment
+            cells.append(cell)
+        return cells
+
+    @staticmethod
+    def _set_widths(ws, widths: List[int]):
+        from openpyxl.utils import get_column_letter
+
+        for col_num, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(col_num)].width = width
+
+    def add_message_sheet(self, title: str):
+        """创建聊天记录工作表并写入标题行"""
+        ws = self.workbook.create_sheet(title=self._unique_title(title))
+        self._set_widths(ws, COLUMN_WIDTHS)
+        # 冻结首行
+        ws.freeze_panes = "A2"
+        ws.append(self._styled_cells(ws, HEADERS))
+        return ws
+
+    @staticmethod
+    def append_messages(ws, messages: Iterable[MessageRecord]):
+        """追加一批消息到工作表"""
+        for message in messages:
+            ws.append(message_row(message))
+
+    def add_stats_sheet(self, channel_label: str, stats: ChannelStats):
+        """添加单频道报告的统计信息工作表"""
+        ws = self.workbook.create_sheet(title=self._unique_title("统计信息"))
+        self._set_widths(ws, [20, 50])
+        ws.append(self._styled_cells(ws, ["统计项目", "数值"], fill=False))
+        stats_data = [
+            ("频道名称", channel_label),
+            ("消息总数", stats.messages),
+            ("参与用户数", stats.users),
+            ("时间范围", stats.time_range()),
+            ("包含附件的消息", stats.attachments),
+            ("包含Embed的消息", stats.embeds),
+            ("编辑过的消息", stats.edited),
+            ("置顶消息", stats.pinned),
+            ("回复消息", stats.replies),
+            ("生成时间", datetime.utcnow().strftime(TIME_FORMAT) + " UTC"),
+        ]
+        for row in stats_data:
+            ws.append(list(row))
+
+    def add_summary_sheet(self):
+        """创建汇总统计工作表（放在最前面，内容在所有频道写完后填写）"""
+        ws = self.workbook.create_sheet(title=self._unique_title("📊 汇总统计"), index=0)
+        self._set_widths(ws, SUMMARY_COLUMN_WIDTHS)
+        return ws
+
+    def fill_summary_sheet(self, ws, guild_name: str, report_title: str, all_stats: List[tuple]):
+        """填写汇总统计工作表
+
+        参数:
+            ws: add_summary_sheet 返回的工作表
+            guild_name: 服务器名称
+            report_title: 报告标题
+            all_stats: [(分类名, 频道名, ChannelStats), ...]
+        """
+        total_messages = sum(stats.messages for _, _, stats in all_stats)
+        overview = [
+            ("服务器名称", guild_name),
+            ("报告标题", report_title),
+            ("生成时间", datetime.utcnow().strftime(TIME_FORMAT) + " UTC"),
+            ("总频道数", len(all_stats)),
+            ("总消息数", total_messages),
+        ]
+        for name, value in overview:
+            ws.append(self._styled_cells(ws, [name], fill=False) + [value])
+        ws.append([])
+
+        # 详细统计表头
+        ws.append(self._styled_cells(ws, SUMMARY_HEADERS))
+        for category_name, channel_name, stats in all_stats:
+            ws.append([
+                category_name,
+                channel_name,
+                stats.messages,
+                stats.users,
+                stats.attachments,
+                stats.embeds,
+                stats.edited,
+                stats.pinned,
+                stats.replies,
+                stats.time_range(),
+            ])
+
+    def save(self, filepath: str):
+        """写出工作簿（只写模式下只能保存一次）"""
+        self.workbook.save(filepath)
+
+
+# ---- 工作簿构建（在导出线程池中执行，不访问 Discord 对象） ----
+
+def build_channel_workbook(store, filepath: str, guild_id: int, channel_id: int, channel_label: str,
+                           limit: Optional[int], include_bots: bool) -> int:
+    """从本地存储构建单频道 Excel 报告并保存
+
+    参数:
+        store: MessageStore（只使用其只读批量读取接口）
+        filepath: 保存路径
+        guild_id: 服务器ID
+        channel_id: 频道ID
+        channel_label: 统计信息中显示的频道名称
+        limit: 最大消息数量（None表示全部）
+        include_bots: 是否包含机器人消息
+
+    返回:
+        写入的消息数量
+    """
+    writer = XlsxReportWriter()
+    ws = writer.add_message_sheet("聊天记录")
+    stats = ChannelStats()
+    for batch in store.read_batches(guild_id, channel_id, limit, include_bots):
+        writer.append_messages(ws, batch)
+        stats.add(batch)
+    writer.add_stats_sheet(channel_label, stats)
+    writer.save(filepath)
+    return stats.messages
+
+
+def build_multi_channel_workbook(store, filepath: str, guild_id: int, guild_name: str, report_title: str,
+                                 channels: Iterable[tuple], limit: Optional[int], include_bots: bool) -> tuple:
+    """从本地存储构建多频道 Excel 报告并保存
+
+    参数:
+        store: MessageStore（只使用其只读批量读取接口）
+        filepath: 保存路径
+        guild_id: 服务器ID
+        guild_name: 服务器名称
+        report_title: 报告标题
+        channels: [(分类名, 频道名, 频道ID), ...]，按工作表顺序排列
+        limit: 每个频道的最大消息数量（None表示全部）
+        include_bots: 是否包含机器人消息
+
+    返回:
+        (频道数, 消息总数)
+    """
+    writer = XlsxReportWriter()
+    # 汇总统计工作表放在最前面，所有频道写完后再填写
+    summary_ws = writer.add_summary_sheet()
+    all_stats = []
+
+    for category_name, channel_name, channel_id in channels:
+        batches = store.read_batches(guild_id, channel_id, limit, include_bots)
+        # 先取第一批，没有消息的频道不创建工作表
+        first_batch = next(batches, None)
+        if not first_batch:
+            log.info(f"频道 {channel_name} 没有消息，跳过")
+            continue
+
+        ws = writer.add_message_sheet(sheet_title(category_name, channel_name))
+        stats = ChannelStats()
+        writer.append_messages(ws, first_batch)
+        stats.add(first_batch)
+        del first_batch
+        for batch in batches:
+            writer.append_messages(ws, batch)
+            stats.add(batch)
+
+        all_stats.append((category_name, channel_name, stats))
+        log.info(f"已添加工作表: {ws.title} ({stats.messages} 条消息)")
+
+    writer.fill_summary_sheet(summary_ws, guild_name, report_title, all_stats)
+    writer.save(filepath)
+    return len(all_stats), sum(stats.messages for _, _, stats in all_stats)
+
+
+# ---- 其他导出格式（CSV / NDJSON / Parquet） ----
+
+# 导出格式及文件扩展名
+EXPORT_FORMATS = {
+    "xlsx": ".xlsx",
+    "csv": ".csv.gz",
+    "ndjson": ".ndjson",
+    "parquet": ".parquet",
+}
+
+# CSV / NDJSON / Parquet 的字段（面向数据分析，使用英文字段名）
+RECORD_FIELDS = [
+    "id", "category", "channel", "channel_id", "created_at", "author_id",
+    "author_name", "author_tag", "author_display", "is_bot", "content",
+    "embed_count", "embeds", "attachments", "reply_id", "reactions",
+    "edited_at", "pinned", "mentions",
+]
+
+# Parquet 每个行组（row group）的消息数
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+def record_values(message: MessageRecord, category_name: str, channel_name: str) -> list:
+    """将一条消息转换为字段值列表（与 RECORD_FIELDS 顺序一致）
+
+    Discord 的 ID 超出 JavaScript 安全整数范围，文本格式中按字符串输出。
+    """
+    return [
+        str(message.id),
+        category_name,
+        channel_name,
+        str(message.channel_id),
+        message.created_at.isoformat(),
+        str(message.author_id),
+        message.author_name,
+        message.author_tag,
+        message.author_display,
+        message.is_bot,
+        message.content,
+        message.embed_count,
+        message.embeds,
+        message.attachments,
+        str(message.reply_id) if message.reply_id else None,
+        message.reactions,
+        message.edited_at.isoformat() if message.edited_at else None,
+        message.pinned,
+        message.mentions,
+    ]
+
+
+class CsvGzipWriter:
+    """流式写入 gzip 压缩的 CSV 文件"""
+
+    def __init__(self, filepath: str):
+        self._file = gzip.open(filepath, "wt", encoding="utf-8", newline="", compresslevel=6)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(RECORD_FIELDS)
+
+    def write(self, category_name: str, channel_name: str, messages: Iterable[MessageRecord]):
+        self._writer.writerows(
+            ["" if value is None else value for value in record_values(message, category_name, channel_name)]
+            for message in messages
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class NdjsonWriter:
+    """流式写入 NDJSON 文件（每行一个 JSON 对象）"""
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, "w", encoding="utf-8")
+
+    def write(self, category_name: str, channel_name: str, messages: Iterable[MessageRecord]):
+        self._file.writelines(
+            json.dumps(dict(zip(RECORD_FIELDS, record_values(message, category_name, channel_name))), ensure_ascii=False) + "\n"
+            for message in messages
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """流式写入 Parquet 文件（按行组追加，需要 pyarrow）
+
+    未安装 pyarrow 时构造函数抛出 ImportError。
+    """
+
+    def __init__(self, filepath: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = pa.schema([
+            ("id", pa.int64()),
+            ("category", pa.string()),
+            ("channel", pa.string()),
+            ("channel_id", pa.int64()),
+            ("created_at", pa.timestamp("ms", tz="UTC")),
+            ("author_id", pa.int64()),
+            ("author_name", pa.string()),
+            ("author_tag", pa.string()),
+            ("author_display", pa.string()),
+            ("is_bot", pa.bool_()),
+            ("content", pa.string()),
+            ("embed_count", pa.int32()),
+            ("embeds", pa.string()),
+            ("attachments", pa.string()),
+            ("reply_id", pa.int64()),
+            ("reactions", pa.string()),
+            ("edited_at", pa.timestamp("ms", tz="UTC")),
+            ("pinned", pa.bool_()),
+            ("mentions", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(filepath, self.schema, compression="zstd")
+        self._columns = {name: [] for name in RECORD_FIELDS}
+        self._rows = 0
+
+    def write(self, category_name: str, channel_name: str, messages: Iterable[MessageRecord]):
+        columns = self._columns
+        for message in messages:
+            columns["id"].append(message.id)
+            columns["category"].append(category_name)
+            columns["channel"].append(channel_name)
+            columns["channel_id"].append(message.channel_id)
+            columns["created_at"].append(message.created_at)
+            columns["author_id"].append(message.author_id)
+            columns["author_name"].append(message.author_name)
+            columns["author_tag"].append(message.author_tag)
+            columns["author_display"].append(message.author_display)
+            columns["is_bot"].append(message.is_bot)
+            columns["content"].append(message.content)
+            columns["embed_count"].append(message.embed_count)
+            columns["embeds"].append(message.embeds)
+            columns["attachments"].append(message.attachments)
+            columns["reply_id"].append(message.reply_id)
+            columns["reactions"].append(message.reactions)
+            columns["edited_at"].append(message.edited_at)
+            columns["pinned"].append(message.pinned)
+            columns["mentions"].append(message.mentions)
+            self._rows += 1
+        if self._rows >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table)
+        self._columns = {name: [] for name in RECORD_FIELDS}
+        self._rows = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+_RECORD_WRITERS = {
+    "csv": CsvGzipWriter,
+    "ndjson": NdjsonWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def build_channel_export(store, export_format: str, filepath: str, guild_id: int, channel_id: int,
+                         category_name: str, channel_name: str, limit: Optional[int], include_bots: bool) -> int:
+    """按指定格式导出单个频道
+
+    返回:
+        写入的消息数量
+    """
+    if export_format == "xlsx":
+        return build_channel_workbook(
+            store, filepath, guild_id, channel_id, f"{category_name} / {channel_name}", limit, include_bots
+        )
+
+    writer = _RECORD_WRITERS[export_format](filepath)
+    count = 0
+    try:
+        for batch in store.read_batches(guild_id, channel_id, limit, include_bots):
+            writer.write(category_name, channel_name, batch)
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def build_multi_channel_export(store, export_format: str, filepath: str, guild_id: int, guild_name: str,
+                               report_title: str, channels: Iterable[tuple], limit: Optional[int],
+                               include_bots: bool) -> tuple:
+    """按指定格式导出多个频道到同一个文件
+
+    参数:
+        channels: [(分类名, 频道名, 频道ID), ...]，可以是逐个产出的迭代器
+
+    返回:
+        (频道数, 消息总数)
+    """
+    if export_format == "xlsx":
+        return build_multi_channel_workbook(
+            store, filepath, guild_id, guild_name, report_title, channels, limit, include_bots
+        )
+
+    # CSV / NDJSON / Parquet 每条记录都带有分类和频道字段，所有频道写入同一个文件
+    writer = _RECORD_WRITERS[export_format](filepath)
+    total_channels = 0
+    total_messages = 0
+    try:
+        for category_name, channel_name, channel_id in channels:
+            count = 0
+            for batch in store.read_batches(guild_id, channel_id, limit, include_bots):
+                writer.write(category_name, channel_name, batch)
+                count += len(batch)
+            if count:
+                total_channels += 1
+                total_messages += count
+                log.info(f"已导出频道: {category_name} / {channel_name} ({count} 条消息)")
+    finally:
+        writer.close()
+    return total_channels, total_messages
@@ -0,0 +1,179 @@
+"""PDF 中文字体注册表
+
+进程内只查找、解析并注册一次中文字体（TTC 文件通常有几十 MB，解析很慢），
+同时缓存基于该字体的 ParagraphStyle 样式表，所有 PDF 渲染共用。
+插件加载时在后台预热，第一次生成 PDF 时不必再等待字体解析。
+"""
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+log = logging.getLogger("red.chatsummary.fonts")
+
+# 注册到 reportlab 的中文字体名称
+CJK_FONT_NAME = "Chinese"
+
+# 常见的中文字体路径（路径, TTC子字体索引, 显示名称）
+CJK_FONT_CANDIDATES = [
+    # macOS
+    ('/System/Library/Fonts/PingFang.ttc', 0, 'macOS PingFang'),
+    ('/System/Library/Fonts/STHeiti Light.ttc', 0, 'macOS STHeiti'),
+    ('/System/Library/Fonts/Hiragino Sans GB.ttc', 0, 'macOS Hiragino'),
+    # Linux
+    ('/usr/share/fonts/truetype/arphic/uming.ttc', 0, 'Linux AR PL UMing'),
+    ('/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf', None, 'Linux Droid Sans'),
+    ('/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc', 0, 'Linux WenQuanYi'),
+    # Windows
+    ('C:\\Windows\\Fonts\\msyh.ttc', 0, 'Windows 微软雅黑'),
+    ('C:\\Windows\\Fonts\\simhei.ttf', None, 'Windows 黑体'),
+    ('C:\\Windows\\Fonts\\simsun.ttc', 0, 'Windows 宋体'),
+]
+
+
+def _load_ttfont(name: str, font_path: str, subfont_index: Optional[int]):
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    # TTC文件需要指定subfontIndex
+    if subfont_index is not None:
+        return TTFont(name, font_path, subfontIndex=subfont_index)
+    return TTFont(name, font_path)
+
+
+class FontRegistry:
+    """进程级的中文字体和样式缓存（线程安全，只加载一次）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._font_path: Optional[str] = None
+        self._stylesheet = None
+        self._probe_results: Optional[List[Tuple[str, str, Optional[str]]]] = None
+
+    @property
+    def font_path(self) -> Optional[str]:
+        """已注册的中文字体路径（未找到时为 None）"""
+        self.ensure_loaded()
+        return self._font_path
+
+    def ensure_loaded(self):
+        """查找并注册中文字体（只在第一次调用时执行）"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            from reportlab.pdfbase import pdfmetrics
+
+            for font_path, subfont_index, _ in CJK_FONT_CANDIDATES:
+                if not os.path.exists(font_path):
+                    continue
+                try:
+                    pdfmetrics.registerFont(_load_ttfont(CJK_FONT_NAME, font_path, subfont_index))
+                    self._font_path = font_path
+                    log.info(f"成功注册中文字体: {font_path}")
+                    break
+                except Exception as e:
+                    log.debug(f"尝试注册字体 {font_path} 失败: {e}")
+                    continue
+            else:
+                log.warning("未找到可用的中文字体，PDF将使用默认字体（中文可能显示为方块）")
+            self._loaded = True
+
+    def stylesheet(self):
+        """获取缓存的 PDF 样式表
+
+        返回:
+            (样式表, 是否使用中文字体)。样式表在所有渲染之间共享，调用方不能修改。
+        """
+        self.ensure_loaded()
+        if self._stylesheet is None:
+            with self._lock:
+                if self._stylesheet is None:
+                    self._stylesheet = self._build_stylesheet()
+        return self._stylesheet, self._font_path is not None
+
+    def _build_stylesheet(self):
+        from reportlab.lib.enums import TA_CENTER
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+        styles = getSampleStyleSheet()
+        if self._font_path is None:
+            return styles
+
+        # 创建中文样式
+        styles.add(ParagraphStyle(name='ChineseTitle',
+                                  parent=styles['Heading1'],
+                                  fontName=CJK_FONT_NAME,
+                                  fontSize=18,
+                                  alignment=TA_CENTER,
+                                  wordWrap='CJK'))
+        styles.add(ParagraphStyle(name='ChineseHeading',
+                                  parent=styles['Heading2'],
+                                  fontName=CJK_FONT_NAME,
+                                  fontSize=14,
+                                  wordWrap='CJK'))
+        styles.add(ParagraphStyle(name='ChineseH1',
+                                  parent=styles['Heading1'],
+                                  fontName=CJK_FONT_NAME,
+                                  fontSize=16,
+                                  wordWrap='CJK',
+                                  spaceAfter=12))
+        styles.add(ParagraphStyle(name='ChineseH2',
+                                  parent=styles['Heading2'],
+                                  fontName=CJK_FONT_NAME,
+                                  fontSize=13,
+                                  wordWrap='CJK',
+                                  spaceAfter=10))
+        styles.add(ParagraphStyle(name='ChineseH3',
+                                  parent=styles['Heading3'],
+                                  fontName=CJK_FONT_NAME,
+                                  fontSize=11,
+                                  wordWrap='CJK',
+                                  spaceAfter=8))
+        styles.add(ParagraphStyle(name='ChineseBody',
+                                  parent=styles['BodyText'],
+                                  fontName=CJK_FONT_NAME,
+                                  fontSize=10,
+                                  wordWrap='CJK',
+                                  leading=14))
+        return styles
+
+    def probe(self) -> List[Tuple[str, str, Optional[str]]]:
+        """检测所有候选字体能否被 reportlab 解析（结果缓存，只检测一次）
+
+        已注册的字体直接视为可用，不再重复解析。
+
+        返回:
+            [(显示名称, 路径, 错误信息或 None)]，只包含存在的字体文件
+        """
+        self.ensure_loaded()
+        if self._probe_results is None:
+            with self._lock:
+                if self._probe_results is None:
+                    results = []
+                    for font_path, subfont_index, font_name in CJK_FONT_CANDIDATES:
+                        if not os.path.exists(font_path):
+                            continue
+                        error = None
+                        if font_path != self._font_path:
+                            try:
+                                _load_ttfont(f"Probe_{len(results)}", font_path, subfont_index)
+                            except Exception as e:
+                                error = str(e)
+                        results.append((font_name, font_path, error))
+                    self._probe_results = results
+        return self._probe_results
+
+    def warm_up(self):
+        """预先加载字体和样式（在后台线程中调用）"""
+        try:
+            self.stylesheet()
+        except ImportError:
+            log.debug("reportlab库未安装，跳过字体预热")
+        except Exception as e:
+            log.error(f"预热中文字体时出错: {e}", exc_info=True)
+
+
+# 进程内共享的字体注册表
+font_registry = FontRegistry()
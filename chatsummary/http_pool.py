@@ -0,0 +1,64 @@
+"""共享 HTTP 连接池
+
+为每个 API 地址维护一个在插件生命周期内复用的 aiohttp 会话，
+开启 DNS 缓存和 keep-alive，避免每次总结都重新建立 TCP/TLS 连接。
+"""
+import logging
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+log = logging.getLogger("red.chatsummary.http")
+
+# DNS 解析结果缓存时间（秒）
+DNS_CACHE_TTL = 300
+
+# 空闲连接保持时间（秒）
+KEEPALIVE_TIMEOUT = 60
+
+
+class HTTPSessionPool:
+    """按 API 地址共享的 aiohttp 会话池
+
+    会话在第一次使用时创建（必须在事件循环中），在插件卸载时统一关闭。
+    同一个 API 地址（协议 + 主机 + 端口）和连接数上限共用一个连接池。
+    """
+
+    def __init__(self):
+        self._sessions: Dict[Tuple[str, int], aiohttp.ClientSession] = {}
+
+    @staticmethod
+    def _origin(api_base: str) -> str:
+        parts = urlsplit(api_base)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def get(self, api_base: str, max_connections: int) -> aiohttp.ClientSession:
+        """获取 API 地址对应的共享会话
+
+        参数:
+            api_base: API 基础 URL
+            max_connections: 该 API 地址的最大并发连接数
+        """
+        key = (self._origin(api_base), max_connections)
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=max_connections,
+                limit_per_host=max_connections,
+                use_dns_cache=True,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[key] = session
+            log.debug(f"创建共享HTTP会话: {key[0]} (最大连接数: {max_connections})")
+        return session
+
+    async def close(self):
+        """关闭所有会话"""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
@@ -0,0 +1,93 @@
+"""边生成边更新的嵌入消息
+
+流式总结时先发送一条占位嵌入消息，之后随着 AI 输出不断编辑它。
+生成的内容可能每秒变化几十次，而 Discord 对同一频道的编辑有速率限制，
+这里只记录最新的文本，由后台任务按固定间隔把最新内容编辑到消息上，
+中间的变化直接合并，不会积压编辑请求。
+"""
+import asyncio
+import logging
+from typing import Callable, Optional
+
+import discord
+
+from .ratelimit import DiscordRateBudget
+
+log = logging.getLogger("red.chatsummary.live")
+
+# 两次编辑之间的最短间隔（秒）
+EDIT_INTERVAL = 1.5
+
+
+class LiveEmbed:
+    """按节流间隔编辑的嵌入消息
+
+    参数:
+        rate_budget: Discord 请求速率预算
+        render: 根据当前文本生成嵌入消息的函数
+        interval: 两次编辑之间的最短间隔（秒）
+    """
+
+    def __init__(
+        self,
+        rate_budget: DiscordRateBudget,
+        render: Callable[[str], discord.Embed],
+        interval: float = EDIT_INTERVAL,
+    ):
+        self.rate_budget = rate_budget
+        self.render = render
+        self.interval = interval
+        self.message: Optional[discord.Message] = None
+        self._text = ""
+        self._shown = ""
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, channel: discord.abc.Messageable, text: str):
+        """发送占位消息"""
+        self._text = self._shown = text
+        self.message = await self.rate_budget.send(channel, embed=self.render(text))
+
+    def update(self, text: str):
+        """记录最新文本（不等待编辑完成，可以在流式回调中直接调用）"""
+        self._text = text
+        if self.message is not None and self._task is None:
+            self._task = asyncio.ensure_future(self._flush())
+
+    async def _edit(self, embed: discord.Embed):
+        async with self.rate_budget.request("edit", self.message.channel.id):
+            await self.message.edit(embed=embed)
+
+    async def _flush(self):
+        try:
+            while self._text != self._shown:
+                text = self._text
+                try:
+                    await self._edit(self.render(text))
+                except discord.HTTPException as e:
+                    log.debug(f"更新流式总结消息失败: {e}")
+                self._shown = text
+                await asyncio.sleep(self.interval)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def close(self):
+        """停止后台编辑"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def finish(self, embed: discord.Embed):
+        """停止后台编辑，并把消息更新为最终内容（编辑失败时重新发送）"""
+        await self.close()
+        if self.message is None:
+            return
+        try:
+            await self._edit(embed)
+        except discord.HTTPException as e:
+            log.warning(f"更新流式总结消息失败，改为重新发送: {e}")
+            await self.rate_budget.send(self.message.channel, embed=embed)
@@ -0,0 +1,187 @@
+"""OpenAI 兼容接口调用"""
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import aiohttp
+
+# 单次请求超时时间（秒）
+REQUEST_TIMEOUT = 30
+
+# 建立连接的超时时间（秒）：接口无法访问时尽快失败
+CONNECT_TIMEOUT = 10
+
+# 流式输出中两次数据之间的最长等待（秒），整个请求不限时
+STREAM_READ_TIMEOUT = 30
+
+
+@dataclass(frozen=True)
+class TokenUsage:
+    """接口返回的 token 用量（接口未返回 usage 时为 0）"""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            self.prompt_tokens + other.prompt_tokens,
+            self.completion_tokens + other.completion_tokens,
+        )
+
+
+class Completion(NamedTuple):
+    """一次调用生成的文本及 token 用量"""
+
+    text: str
+    usage: TokenUsage
+
+
+class LLMError(Exception):
+    """AI 接口调用失败"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """解析响应头中建议的重试等待秒数（``retry-after-ms`` 或 ``Retry-After``）"""
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    # HTTP 日期格式
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+async def chat_completion(
+    session: aiohttp.ClientSession,
+    api_base: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int = 500,
+    temperature: float = 0.7,
+) -> Completion:
+    """调用 ``/chat/completions`` 并返回生成的文本和 token 用量
+
+    非 200 状态码会抛出 ``LLMError``（带 status 和响应头建议的 retry_after），
+    网络错误和超时按 aiohttp / asyncio 原样抛出。
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    async with session.post(
+        f"{api_base}/chat/completions",
+        headers=headers,
+        json=data,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, sock_connect=CONNECT_TIMEOUT)
+    ) as resp:
+        if resp.status != 200:
+            raise LLMError(
+                f"API 调用失败（状态码: {resp.status}）",
+                status=resp.status,
+                retry_after=parse_retry_after(resp.headers)
+            )
+        result = await resp.json()
+        usage = result.get("usage") or {}
+        return Completion(
+            result["choices"][0]["message"]["content"],
+            TokenUsage(usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0),
+        )
+
+
+async def stream_chat_completion(
+    session: aiohttp.ClientSession,
+    api_base: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    on_text: Callable[[str], None],
+    max_tokens: int = 500,
+    temperature: float = 0.7,
+) -> Completion:
+    """以流式（SSE）方式调用 ``/chat/completions``
+
+    每收到一段新内容就以目前为止生成的全部文本调用 ``on_text``（同步调用，
+    不应在其中等待网络请求），结束后返回完整文本和 token 用量
+    （接口在流中返回 usage 时才有用量）。错误处理与 ``chat_completion`` 相同。
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream"
+    }
+    data = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True
+    }
+    text = ""
+    usage = TokenUsage()
+    async with session.post(
+        f"{api_base}/chat/completions",
+        headers=headers,
+        json=data,
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=STREAM_READ_TIMEOUT)
+    ) as resp:
+        if resp.status != 200:
+            raise LLMError(
+                f"API 调用失败（状态码: {resp.status}）",
+                status=resp.status,
+                retry_after=parse_retry_after(resp.headers)
+            )
+        # 每个事件是一行 "data: {...}"，以 "data: [DONE]" 结束
+        async for raw_line in resp.content:
+            line = raw_line.decode("utf-8", errors="replace").strip()
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            try:
+                event = json.loads(payload)
+            except ValueError:
+                continue
+            if event.get("usage"):
+                usage = TokenUsage(
+                    event["usage"].get("prompt_tokens") or 0,
+                    event["usage"].get("completion_tokens") or 0,
+                )
+            for choice in event.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    text += delta
+                    on_text(text)
+    return Completion(text, usage)
@@ -0,0 +1,296 @@
+"""AI 接口请求调度
+
+按 (API 地址, API Key) 分别统计最近 60 秒内的请求数和 token 数，
+请求发出前先排队，保证不超过配置的 RPM / TPM（0 表示不限制）。
+token 数在发出前按提示词估算（加上 max_tokens），返回后按接口报告的
+实际用量修正。
+
+遇到 429 和 5xx 时按指数退避重试：优先使用响应头中的 ``Retry-After``，
+429 还会让同一接口的所有请求一起暂停，避免大批请求同时撞上限制后
+全部降级为简单统计。
+
+每个接口还有一个熔断器：连续多次超时、连接失败或 5xx 后熔断，冷却期内的
+请求不再发出，直接抛出 ``CircuitOpenError`` 由调用方降级为简单统计；
+冷却结束后只放行一个探测请求，成功则恢复，失败则加倍冷却时间后再次熔断。
+接口故障时只有最先的几个请求需要等待超时，而不是每个频道都等满超时时间。
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .llm import Completion, LLMError, chat_completion, stream_chat_completion
+from .transcript import estimate_tokens, model_profile
+
+log = logging.getLogger("red.chatsummary.llm")
+
+# 统计窗口（秒）
+WINDOW_SECONDS = 60
+
+# 429 / 5xx 最多重试的次数
+MAX_RETRIES = 4
+
+# 指数退避的初始等待和最长等待（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# 连续失败多少次后熔断
+CIRCUIT_FAILURE_THRESHOLD = 3
+
+# 熔断的初始冷却时间和最长冷却时间（秒），探测失败时冷却时间加倍
+CIRCUIT_COOLDOWN = 30.0
+CIRCUIT_MAX_COOLDOWN = 300.0
+
+# 每条消息的格式开销（role 等）按固定 token 数估算
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class CircuitOpenError(LLMError):
+    """接口已熔断，请求没有发出"""
+
+
+def is_retryable(error: LLMError) -> bool:
+    """429 和 5xx 可以重试，其他状态码（认证失败、请求错误等）直接失败"""
+    return error.status is not None and (error.status == 429 or error.status >= 500)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第 attempt 次重试前的等待秒数（接口给出 Retry-After 时优先使用）"""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+    # 加上随机抖动，避免多个请求同时重试
+    return delay * random.uniform(0.5, 1.0)
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int, model: str = "") -> int:
+    """估算一次请求会消耗的 token 数（提示词 + 最多生成的 token）"""
+    cjk_ratio = model_profile(model).cjk_ratio
+    prompt = sum(estimate_tokens(m["content"], cjk_ratio) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    return prompt + max_tokens
+
+
+class _Reservation:
+    __slots__ = ("time", "tokens")
+
+    def __init__(self, time_: float, tokens: int):
+        self.time = time_
+        self.tokens = tokens
+
+
+class EndpointLimiter:
+    """一个接口（API 地址 + Key）最近 60 秒的请求数和 token 数限制"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._entries: Deque[_Reservation] = deque()
+        self._tokens = 0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._entries and self._entries[0].time + WINDOW_SECONDS <= now:
+            self._tokens -= self._entries.popleft().tokens
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """还需要等待多久才能发出一个消耗 tokens 的请求"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rpm and len(self._entries) >= self.rpm:
+            return self._entries[len(self._entries) - self.rpm].time + WINDOW_SECONDS - now
+        if self.tpm and self._entries and self._tokens + tokens > self.tpm:
+            # 等到足够多的旧请求移出窗口（单个请求超过 TPM 时等窗口清空）
+            excess = self._tokens + tokens - self.tpm
+            for entry in self._entries:
+                excess -= entry.tokens
+                if excess <= 0:
+                    break
+            return entry.time + WINDOW_SECONDS - now
+        return 0.0
+
+    async def reserve(self, tokens: int) -> _Reservation:
+        """排队直到可以发出请求，并把请求计入窗口"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    reservation = _Reservation(now, tokens)
+                    self._entries.append(reservation)
+                    self._tokens += tokens
+                    return reservation
+                await asyncio.sleep(wait)
+
+    def settle(self, reservation: _Reservation, actual_tokens: int):
+        """用接口返回的实际用量替换估算值"""
+        if any(entry is reservation for entry in self._entries):
+            self._tokens += actual_tokens - reservation.tokens
+            reservation.tokens = actual_tokens
+
+    def pause(self, seconds: float):
+        """接口返回 429 后，在 seconds 秒内暂停所有请求"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """一个接口的熔断器（关闭 → 熔断 → 半开探测 → 关闭）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = CIRCUIT_COOLDOWN
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def remaining(self) -> float:
+        """距离冷却结束的秒数（未熔断时为 0）"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self._opened_at + self.cooldown - time.monotonic(), 0.0)
+
+    def before_call(self):
+        """请求发出前检查：熔断期间或已有探测请求时抛出 CircuitOpenError"""
+        if self.state == self.OPEN:
+            if self.remaining > 0:
+                raise CircuitOpenError(f"AI 接口已熔断，{self.remaining:.0f} 秒后重试")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError("AI 接口已熔断，正在等待探测请求的结果")
+            self._probing = True
+
+    def record_success(self):
+        """接口有正常响应（包括 4xx / 429，说明接口可以访问）"""
+        if self.state != self.CLOSED:
+            log.info(f"AI 接口已恢复，结束熔断 ({self.name})")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = CIRCUIT_COOLDOWN
+        self._probing = False
+
+    def record_failure(self):
+        """超时、连接失败或 5xx"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, CIRCUIT_MAX_COOLDOWN)
+            self._open()
+        elif self.state == self.CLOSED and self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self._open()
+
+    def release(self):
+        """请求被取消，结果未知：放弃本次探测"""
+        self._probing = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        log.warning(f"AI 接口连续 {self.failures} 次失败，熔断 {self.cooldown:.0f} 秒 ({self.name})")
+
+
+class LLMRequestScheduler:
+    """所有服务器共享的 AI 请求调度器（按 API 地址和 Key 分别限流）"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], EndpointLimiter] = {}
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    @staticmethod
+    def _key(api_base: str, api_key: str) -> Tuple[str, str]:
+        parts = urlsplit(api_base)
+        # 不在内存中以明文作为键保存 API Key
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return f"{parts.scheme}://{parts.netloc}{parts.path}".lower().rstrip("/"), key_hash
+
+    def limiter(self, api_base: str, api_key: str, rpm: int, tpm: int) -> EndpointLimiter:
+        """获取接口的限流器（使用最新配置的 RPM / TPM）"""
+        key = self._key(api_base, api_key)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = EndpointLimiter(rpm, tpm)
+        else:
+            limiter.rpm, limiter.tpm = rpm, tpm
+        return limiter
+
+    def breaker(self, api_base: str, api_key: str) -> CircuitBreaker:
+        """获取接口的熔断器"""
+        key = self._key(api_base, api_key)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key[0])
+        return breaker
+
+    async def complete(
+        self,
+        session,
+        api_base: str,
+        api_key: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 500,
+        rpm: int = 0,
+        tpm: int = 0,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Completion:
+        """在限流范围内调用接口，429 / 5xx 时退避重试
+
+        指定 ``on_text`` 时以流式方式调用，每收到新内容就以目前为止的全部文本
+        调用它（重试时从头开始）。
+
+        重试次数用完或遇到其他错误时抛出最后一次的 ``LLMError``；
+        接口已熔断时不发出请求，直接抛出 ``CircuitOpenError``。
+        """
+        limiter = self.limiter(api_base, api_key, rpm, tpm)
+        breaker = self.breaker(api_base, api_key)
+        estimated = estimate_request_tokens(messages, max_tokens, model)
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                reservation = await limiter.reserve(estimated)
+                if on_text is None:
+                    completion = await chat_completion(session, api_base, api_key, model, messages, max_tokens=max_tokens)
+                else:
+                    completion = await stream_chat_completion(
+                        session, api_base, api_key, model, messages, on_text, max_tokens=max_tokens
+                    )
+            except LLMError as e:
+                if e.status is not None and e.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                # 熔断后不再重试，由调用方立即降级
+                if not is_retryable(e) or attempt >= MAX_RETRIES or breaker.state == breaker.OPEN:
+                    raise
+                delay = backoff_delay(attempt, e.retry_after)
+                attempt += 1
+                log.info(f"AI 接口返回 {e.status}，{delay:.1f} 秒后第 {attempt} 次重试")
+                if e.status == 429:
+                    # 同一接口的其他请求也一起暂停（在 reserve 中等待）
+                    limiter.pause(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            except (asyncio.TimeoutError, aiohttp.ClientError):
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            limiter.settle(reservation, completion.usage.total_tokens or estimated)
+            return completion
@@ -0,0 +1,180 @@
+"""Markdown 转 PDF 元素
+
+把 AI 生成的 Markdown 总结转换为 reportlab 的 Paragraph/Spacer 列表。
+只支持总结中实际出现的子集：``#``～``###`` 标题、``-``/``*``/数字列表、
+``**粗体**``、``---`` 分隔线和普通段落。
+
+解析分两步，均为单次线性扫描：
+
+1. ``tokenize`` 逐行分类（每行只看行首），连续的普通行合并为段落；
+2. ``inline_markup`` 转义 XML 特殊字符后用 ``str.split("**")`` 成对替换粗体。
+
+每个字符只被常数次访问，没有回溯正则，也没有循环计数器，
+处理时间与输入长度成正比，不需要超时保护。本模块不依赖插件的其他部分，
+可以单独导入做基准测试（见 ``benchmarks/bench_markdown.py``）。
+"""
+import re
+from html import escape
+from typing import List, Tuple
+
+# 有序列表项（"1. " 或 "1) "）；锚定在行首，只匹配有限长度的数字，不会回溯
+_ORDERED_ITEM_RE = re.compile(r"\d{1,4}[.)] ")
+
+# 标题级别最多三级，更深的标题按三级处理
+_MAX_HEADING_LEVEL = 3
+
+# 标记类型
+HEADING = "heading"
+ITEM = "item"
+LIST_END = "list_end"
+PARAGRAPH = "paragraph"
+RULE = "rule"
+
+
+def inline_markup(text: str) -> str:
+    """转义 XML 特殊字符并把成对的 ``**`` 转换为 ``<b>``
+
+    没有配对（或内容为空）的 ``**`` 原样保留。
+    """
+    text = escape(text, quote=False)
+    parts = text.split("**")
+    if len(parts) < 3:
+        return text
+    out = [parts[0]]
+    i = 1
+    last = len(parts) - 1
+    while i <= last:
+        if i < last and parts[i]:
+            out.append(f"<b>{parts[i]}</b>")
+            out.append(parts[i + 1])
+            i += 2
+        else:
+            out.append("**")
+            out.append(parts[i])
+            i += 1
+    return "".join(out)
+
+
+def _parse_heading(line: str):
+    """解析标题行，返回 (级别, 文本)；不是标题时返回 None"""
+    hashes = len(line) - len(line.lstrip("#"))
+    if hashes == 0 or hashes >= len(line) or line[hashes] != " ":
+        return None
+    return min(hashes, _MAX_HEADING_LEVEL), line[hashes + 1:].strip()
+
+
+def tokenize(markdown_text: str) -> List[Tuple[str, object]]:
+    """把 Markdown 文本切分为标记列表
+
+    返回:
+        [(类型, 值)]：
+        - (HEADING, (级别, 文本))
+        - (ITEM, 文本)：列表项，有序列表保留序号
+        - (LIST_END, None)：一组连续列表项结束
+        - (PARAGRAPH, 文本)：普通段落（连续的普通行用空格连接）
+        - (RULE, None)：分隔线
+    """
+    tokens: List[Tuple[str, object]] = []
+    paragraph: List[str] = []
+    in_list = False
+
+    def flush_paragraph():
+        if paragraph:
+            tokens.append((PARAGRAPH, " ".join(paragraph)))
+            paragraph.clear()
+
+    def end_list():
+        nonlocal in_list
+        if in_list:
+            tokens.append((LIST_END, None))
+            in_list = False
+
+    for raw_line in markdown_text.split("\n"):
+        line = raw_line.strip()
+
+        if not line:
+            flush_paragraph()
+            end_list()
+            continue
+
+        heading = _parse_heading(line) if line[0] == "#" else None
+        if heading:
+            flush_paragraph()
+            end_list()
+            tokens.append((HEADING, heading))
+            continue
+
+        if line[:2] in ("- ", "* ", "+ "):
+            flush_paragraph()
+            in_list = True
+            tokens.append((ITEM, line[2:].strip()))
+            continue
+
+        if line[0].isdigit() and _ORDERED_ITEM_RE.match(line):
+            flush_paragraph()
+            in_list = True
+            tokens.append((ITEM, line))
+            continue
+
+        if len(line) >= 3 and line.count("-") == len(line):
+            flush_paragraph()
+            end_list()
+            tokens.append((RULE, None))
+            continue
+
+        end_list()
+        if "**" in line:
+            # 含粗体的行（通常是"**要点**：说明"）单独成段
+            flush_paragraph()
+            tokens.append((PARAGRAPH, line))
+        else:
+            paragraph.append(line)
+
+    flush_paragraph()
+    end_list()
+    return tokens
+
+
+def markdown_to_flowables(markdown_text: str, styles, use_chinese: bool) -> list:
+    """将Markdown文本转换为PDF元素列表
+
+    参数:
+        markdown_text: Markdown格式的文本
+        styles: PDF样式表
+        use_chinese: 是否使用中文字体样式
+
+    返回:
+        PDF元素列表（Paragraph和Spacer对象）
+    """
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Spacer
+
+    # 选择样式
+    if use_chinese:
+        heading_styles = {
+            1: styles.get('ChineseH1', styles['Heading1']),
+            2: styles.get('ChineseH2', styles['Heading2']),
+            3: styles.get('ChineseH3', styles['Heading3']),
+        }
+        body_style = styles.get('ChineseBody', styles['BodyText'])
+    else:
+        heading_styles = {1: styles['Heading1'], 2: styles['Heading2'], 3: styles['Heading3']}
+        body_style = styles['BodyText']
+    heading_spacing = {1: 0.3 * cm, 2: 0.2 * cm, 3: 0.2 * cm}
+
+    elements = []
+    for kind, value in tokenize(markdown_text):
+        if kind == HEADING:
+            level, text = value
+            elements.append(Paragraph(f"<b>{inline_markup(text)}</b>", heading_styles[level]))
+            elements.append(Spacer(1, heading_spacing[level]))
+        elif kind == ITEM:
+            elements.append(Paragraph(f"• {inline_markup(value)}", body_style))
+        elif kind == LIST_END:
+            elements.append(Spacer(1, 0.2 * cm))
+        elif kind == PARAGRAPH:
+            elements.append(Paragraph(inline_markup(value), body_style))
+            elements.append(Spacer(1, 0.2 * cm))
+        elif kind == RULE:
+            elements.append(Spacer(1, 0.3 * cm))
+    return elements
@@ -0,0 +1,568 @@
+"""本地消息存储
+
+使用 SQLite 在本地持久化频道消息（每个服务器一张表），并为每个频道记录
+已同步的最新消息ID（高水位）。之后的总结和导出只需要通过
+``history(after=...)`` 拉取增量消息，而不必每次重新爬取整个频道。
+
+已保存的消息通过网关事件保持更新：删除的消息立即从本地删除；编辑、置顶
+和表情变化先记下消息ID，下次同步该频道时按窗口重新读取这些消息。
+机器人离线或插件未加载期间发生的变化收不到事件，本地仍是旧内容，
+需要时可以用 ``clearstore`` 清空后重新同步。
+"""
+import asyncio
+import logging
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import discord
+
+log = logging.getLogger("red.chatsummary.store")
+
+# 每批写入数据库的消息数量
+SYNC_BATCH_SIZE = 500
+
+# 每次同步频道时最多用于刷新已变更消息的历史请求数（其余留到下次同步）
+REFRESH_MAX_REQUESTS = 10
+
+# 刷新已变更消息时每次读取的窗口大小（目标消息前后各约一半）
+REFRESH_WINDOW = 100
+
+# SQLite 单条语句的参数上限较低，按批拼接 IN (...)
+_SQL_BATCH = 500
+
+# Excel 单元格最大长度
+CELL_MAX_LENGTH = 32767
+
+
+_COLUMNS = (
+    "id", "channel_id", "created_at", "author_id", "author_name", "author_tag",
+    "author_display", "is_bot", "content", "embed_count", "embeds", "attachments",
+    "reply_id", "reactions", "edited_at", "pinned", "mentions",
+)
+
+
+def _format_embeds(embeds: List[discord.Embed]) -> str:
+    """将消息中的 Embed 转换为文本"""
+    embed_parts = []
+    for embed in embeds:
+        embed_info = []
+        if embed.title:
+            embed_info.append(f"标题: {embed.title}")
+        if embed.description:
+            embed_info.append(f"描述: {embed.description[:500]}")  # 限制长度
+        if embed.url:
+            embed_info.append(f"链接: {embed.url}")
+        if embed.author and embed.author.name:
+            embed_info.append(f"作者: {embed.author.name}")
+        if embed.fields:
+            for field in embed.fields:
+                embed_info.append(f"{field.name}: {field.value[:200]}")
+        if embed.footer and embed.footer.text:
+            embed_info.append(f"页脚: {embed.footer.text}")
+        if embed.image:
+            embed_info.append(f"图片: {embed.image.url}")
+        if embed.thumbnail:
+            embed_info.append(f"缩略图: {embed.thumbnail.url}")
+        if embed.video:
+            embed_info.append(f"视频: {embed.video.url}")
+
+        if embed_info:
+            embed_parts.append(" | ".join(embed_info))
+
+    embed_content = "\n---\n".join(embed_parts)
+    # 确保不超过Excel单元格限制
+    if len(embed_content) > CELL_MAX_LENGTH:
+        embed_content = embed_content[:CELL_MAX_LENGTH - 3] + "..."
+    return embed_content
+
+
+class MessageRecord(NamedTuple):
+    """一条消息的紧凑记录
+
+    在拉取历史时从 ``discord.Message`` 中提取，只保留总结、统计和导出
+    需要的字段（均为普通的 int/str/datetime），不引用 Embed、Member、
+    连接状态等对象。基于元组，没有实例字典，大量消息也只占很少的内存。
+    """
+    id: int
+    channel_id: int
+    created_at: datetime
+    author_id: int
+    author_name: str
+    author_tag: str
+    author_display: str
+    is_bot: bool
+    content: str
+    embed_count: int
+    embeds: str
+    attachments: str
+    reply_id: Optional[int]
+    reactions: str
+    edited_at: Optional[datetime]
+    pinned: bool
+    mentions: str
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> "MessageRecord":
+        """从 discord.Message 提取记录"""
+        author = message.author
+        return cls(
+            message.id,
+            message.channel.id,
+            message.created_at,
+            author.id,
+            author.name,
+            str(author),
+            author.display_name if hasattr(author, 'display_name') else str(author),
+            bool(author.bot),
+            message.content or "",
+            len(message.embeds),
+            _format_embeds(message.embeds) if message.embeds else "",
+            ", ".join([att.url for att in message.attachments]) if message.attachments else "",
+            message.reference.message_id if message.reference else None,
+            ", ".join([f"{reaction.emoji}({reaction.count})" for reaction in message.reactions]) if message.reactions else "",
+            message.edited_at,
+            bool(message.pinned),
+            ", ".join([str(user) for user in message.mentions]) if message.mentions else "",
+        )
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "MessageRecord":
+        """从数据库行还原记录
+
+        同一用户的名称在大量消息中重复出现，使用 ``sys.intern`` 共享字符串。
+        """
+        (msg_id, channel_id, created_at, author_id, author_name, author_tag, author_display,
+         is_bot, content, embed_count, embeds, attachments, reply_id, reactions,
+         edited_at, pinned, mentions) = row
+        return cls(
+            msg_id,
+            channel_id,
+            datetime.fromtimestamp(created_at, tz=timezone.utc),
+            author_id,
+            sys.intern(author_name),
+            sys.intern(author_tag),
+            sys.intern(author_display),
+            bool(is_bot),
+            content,
+            embed_count,
+            embeds,
+            attachments,
+            reply_id,
+            reactions,
+            datetime.fromtimestamp(edited_at, tz=timezone.utc) if edited_at is not None else None,
+            bool(pinned),
+            mentions,
+        )
+
+    def to_row(self) -> tuple:
+        """转换为数据库行（时间保存为时间戳）"""
+        return (
+            self.id,
+            self.channel_id,
+            self.created_at.timestamp(),
+            self.author_id,
+            self.author_name,
+            self.author_tag,
+            self.author_display,
+            1 if self.is_bot else 0,
+            self.content,
+            self.embed_count,
+            self.embeds,
+            self.attachments,
+            self.reply_id,
+            self.reactions,
+            self.edited_at.timestamp() if self.edited_at else None,
+            1 if self.pinned else 0,
+            self.mentions,
+        )
+
+
+class MessageStore:
+    """基于 SQLite 的频道消息存储
+
+    每个服务器使用一张 ``messages_<guild_id>`` 表保存消息，
+    ``sync_state`` 表记录每个频道已同步的消息范围：
+
+    - ``newest_id``: 已同步的最新消息ID（高水位），之后只拉取比它更新的消息
+    - ``oldest_id``: 已同步的最早消息ID，需要更多历史时从这里向前回填
+    - ``complete``: 是否已经同步到频道的第一条消息
+
+    已保存的消息被删除时，``delete_messages`` 立即删除对应的行；被编辑、置顶或
+    表情变化时，``mark_changed`` 记下消息ID（只保存在内存中），下次
+    ``sync_channel`` 时重新读取并覆盖这些行。
+
+    所有数据库操作都在线程池中执行，避免阻塞事件循环。
+    指定 rate_budget（DiscordRateBudget）时，历史记录按页在速率预算内读取。
+    """
+
+    def __init__(self, path, rate_budget=None):
+        self.path = str(path)
+        self.rate_budget = rate_budget
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            "guild_id INTEGER NOT NULL, "
+            "channel_id INTEGER NOT NULL, "
+            "newest_id INTEGER, "
+            "oldest_id INTEGER, "
+            "complete INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (guild_id, channel_id))"
+        )
+        # 已有本地消息的频道 {频道ID: 服务器ID}，其他频道的事件直接忽略
+        self._stored_channels: Dict[int, int] = dict(
+            self._conn.execute("SELECT channel_id, guild_id FROM sync_state")
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._known_tables = set()
+        self._channel_locks: Dict[int, asyncio.Lock] = {}
+        # 等待重新读取的已变更消息 {频道ID: {消息ID}}
+        self._changed: Dict[int, Set[int]] = {}
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._db_lock:
+            self._conn.close()
+
+    async def _run(self, func, *args):
+        """在线程池中执行数据库操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._locked_call, func, args)
+
+    def _locked_call(self, func, args):
+        with self._db_lock:
+            return func(*args)
+
+    def _table(self, guild_id: int) -> str:
+        """获取（必要时创建）服务器的消息表"""
+        table = f"messages_{int(guild_id)}"
+        if table not in self._known_tables:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id INTEGER PRIMARY KEY, "
+                "channel_id INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "author_id INTEGER NOT NULL, "
+                "author_name TEXT NOT NULL, "
+                "author_tag TEXT NOT NULL, "
+                "author_display TEXT NOT NULL, "
+                "is_bot INTEGER NOT NULL, "
+                "content TEXT NOT NULL, "
+                "embed_count INTEGER NOT NULL, "
+                "embeds TEXT NOT NULL, "
+                "attachments TEXT NOT NULL, "
+                "reply_id INTEGER, "
+                "reactions TEXT NOT NULL, "
+                "edited_at REAL, "
+                "pinned INTEGER NOT NULL, "
+                "mentions TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_channel ON {table} (channel_id, id)"
+            )
+            self._conn.commit()
+            self._known_tables.add(table)
+        return table
+
+    # ---- 同步方法（在线程池中执行） ----
+
+    def _get_state(self, guild_id: int, channel_id: int):
+        row = self._conn.execute(
+            "SELECT newest_id, oldest_id, complete FROM sync_state WHERE guild_id = ? AND channel_id = ?",
+            (guild_id, channel_id)
+        ).fetchone()
+        if row is None:
+            return None, None, False
+        return row[0], row[1], bool(row[2])
+
+    def _save_state(self, guild_id: int, channel_id: int, newest_id, oldest_id, complete: bool):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sync_state (guild_id, channel_id, newest_id, oldest_id, complete) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (guild_id, channel_id, newest_id, oldest_id, 1 if complete else 0)
+        )
+        self._conn.commit()
+
+    def _insert_rows(self, guild_id: int, rows: List[tuple]):
+        table = self._table(guild_id)
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+            rows
+        )
+        self._conn.commit()
+
+    def _update_rows(self, guild_id: int, rows: List[tuple]):
+        """覆盖已存在的行（本地没有的消息不插入，避免在已同步范围外产生空洞）"""
+        table = self._table(guild_id)
+        assignments = ", ".join(f"{column} = ?" for column in _COLUMNS[1:])
+        self._conn.executemany(
+            f"UPDATE {table} SET {assignments} WHERE id = ?",
+            [row[1:] + row[:1] for row in rows]
+        )
+        self._conn.commit()
+
+    def _delete_rows(self, guild_id: int, message_ids: List[int]):
+        table = self._table(guild_id)
+        for start in range(0, len(message_ids), _SQL_BATCH):
+            batch = message_ids[start:start + _SQL_BATCH]
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE id IN ({', '.join('?' for _ in batch)})",
+                batch
+            )
+        self._conn.commit()
+
+    def _stored_ids(self, guild_id: int, channel_id: int, message_ids: List[int]) -> Set[int]:
+        table = self._table(guild_id)
+        stored = set()
+        for start in range(0, len(message_ids), _SQL_BATCH):
+            batch = message_ids[start:start + _SQL_BATCH]
+            stored.update(row[0] for row in self._conn.execute(
+                f"SELECT id FROM {table} WHERE channel_id = ? AND id IN ({', '.join('?' for _ in batch)})",
+                [channel_id] + batch
+            ))
+        return stored
+
+    def _delete_channel_range(self, guild_id: int, channel_id: int, max_id: int):
+        table = self._table(guild_id)
+        self._conn.execute(
+            f"DELETE FROM {table} WHERE channel_id = ? AND id <= ?",
+            (channel_id, max_id)
+        )
+        self._conn.commit()
+
+    def _count(self, guild_id: int, channel_id: int) -> int:
+        table = self._table(guild_id)
+        return self._conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE channel_id = ?",
+            (channel_id,)
+        ).fetchone()[0]
+
+    def _fetch_recent(self, guild_id: int, channel_id: int, limit: Optional[int], include_bots: bool, after_id: Optional[int] = None) -> List[MessageRecord]:
+        table = self._table(guild_id)
+        # 与 history(limit=...) 一致：先取最新的 limit 条，再过滤机器人消息
+        query = f"SELECT {', '.join(_COLUMNS)} FROM {table} WHERE channel_id = ?"
+        params = [channel_id]
+        if after_id is not None:
+            query += " AND id > ?"
+            params.append(after_id)
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        query = f"SELECT * FROM ({query})"
+        if not include_bots:
+            query += " WHERE is_bot = 0"
+        query += " ORDER BY id ASC"
+        return [MessageRecord.from_row(row) for row in self._conn.execute(query, params)]
+
+    def _clear_guild(self, guild_id: int):
+        table = f"messages_{int(guild_id)}"
+        self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute("DELETE FROM sync_state WHERE guild_id = ?", (guild_id,))
+        self._conn.commit()
+        self._known_tables.discard(table)
+
+    # ---- 异步接口 ----
+
+    async def sync_channel(self, channel: discord.TextChannel, limit: Optional[int]):
+        """把频道的新消息同步到本地存储
+
+        参数:
+            channel: Discord频道
+            limit: 需要保证本地至少有的最新消息数量（None表示全部历史）
+        """
+        lock = self._channel_locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            guild_id = channel.guild.id
+            self._stored_channels[channel.id] = guild_id
+            await self._refresh_changed(channel)
+            newest_id, oldest_id, complete = await self._run(self._get_state, guild_id, channel.id)
+            if newest_id is None:
+                # 从未同步过任何消息，从头开始
+                oldest_id = None
+                complete = False
+
+            if newest_id is not None:
+                # 增量：拉取高水位之后的新消息（从新到旧，最多 limit 条）
+                fetched, batch_newest, batch_oldest = await self._fetch_into_store(
+                    channel,
+                    self._history(channel, limit=limit, after=discord.Object(id=newest_id), oldest_first=False)
+                )
+                if fetched:
+                    if limit is not None and fetched >= limit:
+                        # 新消息多于 limit，与旧数据之间可能存在空洞，丢弃旧数据
+                        await self._run(self._delete_channel_range, guild_id, channel.id, newest_id)
+                        oldest_id = batch_oldest
+                        complete = False
+                    newest_id = batch_newest
+                    await self._run(self._save_state, guild_id, channel.id, newest_id, oldest_id, complete)
+
+            if complete:
+                return
+
+            stored = await self._run(self._count, guild_id, channel.id)
+            if limit is not None and stored >= limit:
+                return
+
+            # 回填：从已同步的最早消息继续向前拉取
+            need = None if limit is None else limit - stored
+            before = discord.Object(id=oldest_id) if oldest_id is not None else None
+            fetched, batch_newest, batch_oldest = await self._fetch_into_store(
+                channel,
+                self._history(channel, limit=need, before=before)
+            )
+            if fetched:
+                if newest_id is None:
+                    newest_id = batch_newest
+                oldest_id = batch_oldest
+            if need is None or fetched < need:
+                complete = True
+            await self._run(self._save_state, guild_id, channel.id, newest_id, oldest_id, complete)
+            log.debug(f"频道 {channel.name} 同步完成：新增 {fetched} 条回填消息")
+
+    def mark_changed(self, channel_id: int, message_id: int):
+        """记录消息被编辑、置顶或表情变化，下次同步该频道时重新读取"""
+        if channel_id in self._stored_channels:
+            self._changed.setdefault(channel_id, set()).add(message_id)
+
+    async def delete_messages(self, channel_id: int, message_ids: Iterable[int]):
+        """从本地存储删除已被删除的消息"""
+        guild_id = self._stored_channels.get(channel_id)
+        if guild_id is None:
+            return
+        message_ids = list(message_ids)
+        changed = self._changed.get(channel_id)
+        if changed:
+            changed.difference_update(message_ids)
+        await self._run(self._delete_rows, guild_id, message_ids)
+
+    async def _refresh_changed(self, channel: discord.TextChannel):
+        """重新读取已变更的消息并覆盖本地记录
+
+        变更的消息通常集中在最近一段时间，每次用 ``history(around=...)``
+        读取目标消息前后的一个窗口，窗口内的其他已变更消息一并更新；窗口
+        范围内却没有读到的已变更消息视为已删除。
+        """
+        changed = self._changed.pop(channel.id, None)
+        if not changed:
+            return
+        guild_id = channel.guild.id
+        pending = sorted(await self._run(self._stored_ids, guild_id, channel.id, list(changed)))
+        requests = 0
+        try:
+            while pending and requests < REFRESH_MAX_REQUESTS:
+                requests += 1
+                rows = []
+                low = high = pending[0]
+                async for message in self._history(channel, limit=REFRESH_WINDOW, around=discord.Object(id=pending[0])):
+                    rows.append(MessageRecord.from_message(message).to_row())
+                    low = min(low, message.id)
+                    high = max(high, message.id)
+                seen = {row[0] for row in rows}
+                deleted = [message_id for message_id in pending if low <= message_id <= high and message_id not in seen]
+                if rows:
+                    await self._run(self._update_rows, guild_id, rows)
+                if deleted:
+                    await self._run(self._delete_rows, guild_id, deleted)
+                pending = [message_id for message_id in pending if message_id > high]
+        except discord.HTTPException as e:
+            log.warning(f"刷新频道 {channel.name} 的已变更消息失败: {e}")
+        if pending:
+            # 本次没有处理完的留到下次同步
+            self._changed.setdefault(channel.id, set()).update(pending)
+
+    def _history(self, channel: discord.TextChannel, **kwargs):
+        if self.rate_budget is None:
+            return channel.history(**kwargs)
+        return self.rate_budget.history(channel, **kwargs)
+
+    async def _fetch_into_store(self, channel: discord.TextChannel, history):
+        """遍历 history 迭代器并分批写入数据库
+
+        返回:
+            (消息数量, 最大消息ID, 最小消息ID)
+        """
+        guild_id = channel.guild.id
+        fetched = 0
+        max_id = None
+        min_id = None
+        batch = []
+        async for message in history:
+            batch.append(MessageRecord.from_message(message).to_row())
+            fetched += 1
+            if max_id is None or message.id > max_id:
+                max_id = message.id
+            if min_id is None or message.id < min_id:
+                min_id = message.id
+            if len(batch) >= SYNC_BATCH_SIZE:
+                await self._run(self._insert_rows, guild_id, batch)
+                batch = []
+        if batch:
+            await self._run(self._insert_rows, guild_id, batch)
+        return fetched, max_id, min_id
+
+    async def fetch_recent(self, guild_id: int, channel_id: int, limit: Optional[int], include_bots: bool) -> List[MessageRecord]:
+        """读取频道最新的 limit 条消息（按时间顺序排列）"""
+        return await self._run(self._fetch_recent, guild_id, channel_id, limit, include_bots)
+
+    async def fetch_after(self, guild_id: int, channel_id: int, after_id: int, limit: Optional[int], include_bots: bool) -> List[MessageRecord]:
+        """读取 after_id 之后最新的 limit 条消息（按时间顺序排列）"""
+        return await self._run(self._fetch_recent, guild_id, channel_id, limit, include_bots, after_id)
+
+    def read_batches(self, guild_id: int, channel_id: int, limit: Optional[int], include_bots: bool, batch_size: int = SYNC_BATCH_SIZE):
+        """按时间顺序分批读取频道最新的 limit 条消息（同步生成器）
+
+        与 ``fetch_recent`` 返回相同的消息，但每次只在内存中保留一批。
+        使用独立的只读连接，供导出工作线程调用，不占用主连接的锁，
+        也不会阻塞事件循环。
+
+        参数:
+            guild_id: 服务器ID
+            channel_id: 频道ID
+            limit: 最大消息数量（None表示全部）
+            include_bots: 是否包含机器人消息
+            batch_size: 每批消息数量
+        """
+        table = f"messages_{int(guild_id)}"
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            try:
+                min_id = 0
+                if limit is not None:
+                    # 最新 limit 条消息中最早一条的ID（沿索引定位，不需要排序）
+                    row = conn.execute(
+                        f"SELECT id FROM {table} WHERE channel_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                        (channel_id, limit - 1)
+                    ).fetchone()
+                    if row is not None:
+                        min_id = row[0]
+            except sqlite3.OperationalError:
+                # 服务器还没有同步过任何消息
+                return
+            query = f"SELECT {', '.join(_COLUMNS)} FROM {table} WHERE channel_id = ? AND id >= ?"
+            if not include_bots:
+                query += " AND is_bot = 0"
+            query += " ORDER BY id ASC LIMIT ?"
+            while True:
+                batch = [MessageRecord.from_row(row) for row in conn.execute(query, (channel_id, min_id, batch_size))]
+                if not batch:
+                    return
+                yield batch
+                if len(batch) < batch_size:
+                    return
+                min_id = batch[-1].id + 1
+        finally:
+            conn.close()
+
+    async def clear_guild(self, guild_id: int):
+        """删除服务器的全部本地消息"""
+        for channel_id in [cid for cid, gid in self._stored_channels.items() if gid == guild_id]:
+            del self._stored_channels[channel_id]
+            self._changed.pop(channel_id, None)
+        await self._run(self._clear_guild, guild_id)
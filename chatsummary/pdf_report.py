@@ -0,0 +1,155 @@
+"""PDF 总结报告渲染
+
+``render_pdf_report`` 是模块级函数，由渲染进程池（见 ``render_pool.py``）
+在独立的工作进程中调用，参数和返回值都必须可以序列化。
+"""
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import List
+
+from .fonts import font_registry
+from .markdown_pdf import markdown_to_flowables
+from .summary_result import ChannelSummary
+
+log = logging.getLogger("red.chatsummary.pdf")
+
+
+def warm_up():
+    """渲染进程启动时预加载中文字体和样式"""
+    font_registry.warm_up()
+
+
+def render_pdf_report(guild_name: str, guild_id: int, summaries_data: List[ChannelSummary], report_title: str) -> str:
+    """生成PDF报告（同步执行，在渲染进程中运行）
+    
+    参数:
+        guild_name: Discord服务器名称
+        guild_id: Discord服务器ID
+        summaries_data: 各频道的总结结果（ChannelSummary）
+        report_title: 报告标题
+    
+    返回:
+        PDF文件路径
+    """
+    try:
+        log.info(f"[PDF渲染] 开始同步生成PDF (频道数: {len(summaries_data)})")
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import cm
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Flowable
+        
+        # 创建书签Flowable
+        class BookmarkFlowable(Flowable):
+            """在PDF中添加书签的Flowable"""
+            def __init__(self, title, key):
+                Flowable.__init__(self)
+                self.title = title
+                self.key = key
+                self.width = 0
+                self.height = 0
+            
+            def draw(self):
+                """在当前位置添加书签"""
+                self.canv.bookmarkPage(self.key)
+                self.canv.addOutlineEntry(self.title, self.key, level=0)
+        
+        # 创建临时文件
+        temp_dir = tempfile.gettempdir()
+        pdf_filename = f"summary_{guild_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
+        pdf_path = os.path.join(temp_dir, pdf_filename)
+        
+        # 创建PDF文档
+        doc = SimpleDocTemplate(pdf_path, pagesize=A4,
+                               rightMargin=2*cm, leftMargin=2*cm,
+                               topMargin=2*cm, bottomMargin=2*cm)
+        
+        story = []
+        # 字体和样式在进程内只加载一次，所有报告共用
+        styles, use_chinese = font_registry.stylesheet()
+        
+        # 选择样式
+        title_style = styles['ChineseTitle'] if use_chinese else styles['Title']
+        heading_style = styles['ChineseHeading'] if use_chinese else styles['Heading2']
+        body_style = styles['ChineseBody'] if use_chinese else styles['BodyText']
+        
+        # 添加标题
+        story.append(Paragraph(report_title, title_style))
+        story.append(Spacer(1, 0.5*cm))
+        
+        # 添加生成时间
+        gen_time = f"Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
+        story.append(Paragraph(gen_time, body_style))
+        story.append(Spacer(1, 0.3*cm))
+        
+        # 添加服务器信息
+        server_info = f"Server: {guild_name}"
+        story.append(Paragraph(server_info, body_style))
+        story.append(Spacer(1, 1*cm))
+        
+        # 添加每个频道的总结
+        log.info(f"[PDF渲染] 开始处理 {len(summaries_data)} 个频道的内容")
+        for i, summary in enumerate(summaries_data):
+            try:
+                # 分类和频道标题
+                log.info(f"[PDF渲染] 正在处理频道 {i+1}/{len(summaries_data)}")
+                title = summary.title
+                
+                log.info(f"[PDF渲染] 频道标题: {title}")
+                
+                # 添加书签（使用BookmarkFlowable）
+                log.info(f"[PDF渲染] 添加书签")
+                bookmark_key = f"channel_{i}"
+                story.append(BookmarkFlowable(title, bookmark_key))
+                
+                # 添加频道标题
+                log.info(f"[PDF渲染] 添加标题段落")
+                story.append(Paragraph(title, heading_style))
+                story.append(Spacer(1, 0.3*cm))
+                
+                # 总结内容 - 使用Markdown解析器
+                summary_text = summary.text or '无总结内容'
+                log.info(f"[PDF渲染] 开始解析Markdown，文本长度: {len(summary_text)}")
+                
+                # 解析Markdown并添加到story（线性时间，不需要超时保护）
+                try:
+                    markdown_elements = markdown_to_flowables(summary_text, styles, use_chinese)
+                    log.info(f"[PDF渲染] Markdown解析完成，生成 {len(markdown_elements)} 个元素")
+                    story.extend(markdown_elements)
+                except Exception as e:
+                    log.error(f"[PDF渲染] 解析Markdown时出错 ({title}): {e}", exc_info=True)
+                    # 使用简单文本作为备选
+                    clean_text = summary_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                    story.append(Paragraph(clean_text[:500] + "...", body_style))
+                
+            except Exception as e:
+                log.error(f"[PDF渲染] 处理频道 {i+1} 时出错: {e}", exc_info=True)
+                continue
+            
+            # 统计信息
+            stats = summary.stats
+            stats_text = (
+                f"Messages: {stats.messages} | Users: {stats.users} | "
+                f"Attachments: {stats.attachments} | Replies: {stats.replies} | Time: {stats.time_range()}"
+            )
+            if summary.usage.total_tokens:
+                stats_text += f" | Tokens: {summary.usage.total_tokens}"
+            story.append(Paragraph(stats_text, body_style))
+            story.append(Spacer(1, 0.3*cm))
+            
+            # 如果不是最后一个，添加分页
+            if i < len(summaries_data) - 1:
+                story.append(PageBreak())
+        
+        # 生成PDF
+        log.info(f"[PDF渲染] 开始构建PDF文档，总元素数: {len(story)}")
+        doc.build(story)
+        log.info(f"[PDF渲染] 成功生成PDF报告（包含 {len(summaries_data)} 个书签）: {pdf_path}")
+        return pdf_path
+        
+    except ImportError as e:
+        log.error(f"[PDF渲染] reportlab库未安装，无法生成PDF: {e}")
+        return None
+    except Exception as e:
+        log.error(f"[PDF渲染] 生成PDF时出错: {e}", exc_info=True)
+        return None
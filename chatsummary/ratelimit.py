@@ -0,0 +1,209 @@
+"""Discord 请求速率预算
+
+插件发出的所有历史记录读取、消息发送、编辑和文件上传都经过这里，所有服务器共享：
+
+- 一个全局令牌桶（对应 Discord 每个机器人的全局限制）；
+- 每个频道、每类请求一个路由令牌桶（发送消息和读取历史的限制是按频道计算的）。
+
+令牌桶的速率按 AIMD 调整：请求成功时线性提高，遇到 429 时减半，并在
+``Retry-After`` / ``X-RateLimit-Reset-After`` 指定的时间内暂停该桶。
+discord.py 会自行重试大部分 429 而不抛出异常，这里同时监听它的
+``discord.http`` 日志，把这些被重试的 429 也计入对应的令牌桶。
+"""
+import asyncio
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import discord
+
+log = logging.getLogger("red.chatsummary.ratelimit")
+
+# discord.py 每次请求读取的历史消息条数
+HISTORY_PAGE_SIZE = 100
+
+# 遇到 429 后最多重新发送的次数
+MAX_SEND_RETRIES = 3
+
+# 各类令牌桶的参数：(初始速率, 容量, 最低速率, 最高速率)，速率单位为 请求/秒
+GLOBAL_LIMITS = (40.0, 40, 5.0, 50.0)
+ROUTE_LIMITS = {
+    "send": (1.0, 5, 0.2, 5.0),  # 每个频道约 5 条 / 5 秒
+    "history": (5.0, 10, 0.5, 20.0),
+    "edit": (1.0, 5, 0.2, 5.0),
+}
+
+# 从 discord.py 的请求地址中提取频道ID
+_CHANNEL_URL_RE = re.compile(r"/channels/(\d+)/messages")
+
+
+class AdaptiveTokenBucket:
+    """按 AIMD 调整速率的令牌桶"""
+
+    def __init__(self, rate: float, capacity: int, min_rate: float, max_rate: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        # 每次成功提高的速率（约 50 次成功从最低恢复到最高）
+        self._step = (max_rate - min_rate) / 50
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """取得一个令牌，不足时等待（按先来后到排队）"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        """加性增：请求成功后稍微提高速率"""
+        self.rate = min(self.max_rate, self.rate + self._step)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """乘性减：遇到 429 后速率减半，并在 retry_after 秒内暂停"""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0.0
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def observe(self, remaining: Optional[int], reset_after: Optional[float]):
+        """根据响应头中的剩余次数调整：已用完时暂停到重置"""
+        if remaining == 0 and reset_after:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + reset_after)
+
+
+def _header_float(headers, name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class _RateLimitLogHandler(logging.Handler):
+    """捕获 discord.py 自行重试的 429 警告"""
+
+    def __init__(self, budget: "DiscordRateBudget"):
+        super().__init__(logging.WARNING)
+        self.budget = budget
+
+    def emit(self, record: logging.LogRecord):
+        # 格式: 'We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.'
+        if not isinstance(record.msg, str) or not record.msg.startswith("We are being rate limited"):
+            return
+        try:
+            method, url, retry_after = record.args[:3]
+            match = _CHANNEL_URL_RE.search(str(url))
+            route = {"POST": "send", "PATCH": "edit"}.get(method, "history")
+            self.budget.penalize(route, int(match.group(1)) if match else None, float(retry_after))
+        except Exception:
+            pass
+
+
+class DiscordRateBudget:
+    """所有服务器共享的 Discord 请求速率预算"""
+
+    def __init__(self):
+        self.global_bucket = AdaptiveTokenBucket(*GLOBAL_LIMITS)
+        self._routes: Dict[Tuple[str, int], AdaptiveTokenBucket] = {}
+        self._log_handler = _RateLimitLogHandler(self)
+        logging.getLogger("discord.http").addHandler(self._log_handler)
+
+    def close(self):
+        """移除日志监听"""
+        logging.getLogger("discord.http").removeHandler(self._log_handler)
+
+    def bucket(self, route: str, channel_id: int) -> AdaptiveTokenBucket:
+        key = (route, channel_id)
+        bucket = self._routes.get(key)
+        if bucket is None:
+            bucket = self._routes[key] = AdaptiveTokenBucket(*ROUTE_LIMITS[route])
+        return bucket
+
+    def penalize(self, route: str, channel_id: Optional[int], retry_after: Optional[float]):
+        """记录一次 429（channel_id 为 None 时视为全局限制）"""
+        if channel_id is None:
+            self.global_bucket.on_rate_limited(retry_after)
+        else:
+            self.bucket(route, channel_id).on_rate_limited(retry_after)
+        log.debug(f"Discord 速率限制 ({route}, 频道 {channel_id})，{retry_after} 秒后重试")
+
+    @asynccontextmanager
+    async def request(self, route: str, channel_id: int):
+        """在速率预算内发出一次请求，并根据结果调整速率"""
+        bucket = self.bucket(route, channel_id)
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+        try:
+            yield
+        except discord.HTTPException as e:
+            headers = getattr(e.response, "headers", None) or {}
+            if e.status == 429:
+                retry_after = _header_float(headers, "Retry-After") or _header_float(headers, "X-RateLimit-Reset-After")
+                if headers.get("X-RateLimit-Global"):
+                    self.global_bucket.on_rate_limited(retry_after)
+                else:
+                    bucket.on_rate_limited(retry_after)
+            else:
+                remaining = _header_float(headers, "X-RateLimit-Remaining")
+                bucket.observe(
+                    None if remaining is None else int(remaining),
+                    _header_float(headers, "X-RateLimit-Reset-After")
+                )
+            raise
+        except discord.RateLimited as e:
+            bucket.on_rate_limited(e.retry_after)
+            raise
+        bucket.on_success()
+        self.global_bucket.on_success()
+
+    async def send(self, channel: discord.abc.Messageable, *args, **kwargs) -> discord.Message:
+        """发送消息或上传文件（遇到 429 时等待后重试）"""
+        channel_id = getattr(channel, "id", 0)
+        for attempt in range(MAX_SEND_RETRIES + 1):
+            try:
+                async with self.request("send", channel_id):
+                    return await channel.send(*args, **kwargs)
+            except (discord.HTTPException, discord.RateLimited) as e:
+                if getattr(e, "status", 429) != 429 or attempt == MAX_SEND_RETRIES:
+                    raise
+                # 上传的文件需要从头重新读取
+                for file in [kwargs.get("file")] + list(kwargs.get("files") or []):
+                    if file is not None:
+                        file.reset()
+
+    async def history(self, channel: discord.TextChannel, **kwargs):
+        """按页取得令牌的 ``channel.history``（discord.py 每页请求 100 条）"""
+        count = 0
+        iterator = channel.history(**kwargs).__aiter__()
+        while True:
+            if count % HISTORY_PAGE_SIZE == 0:
+                # 即将请求新的一页
+                async with self.request("history", channel.id):
+                    try:
+                        message = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+            else:
+                try:
+                    message = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            count += 1
+            yield message
@@ -0,0 +1,264 @@
+"""报告渲染进程池
+
+PDF 等报告的渲染是纯 CPU 工作，放在线程中会与事件循环争抢 GIL，
+多个服务器同时生成报告时也没有上限。这里维护少量专用的渲染进程：
+
+- 工作进程数量可配置，所有服务器共用，同时进行的渲染不超过该数量；
+- 等待中的任务数量有上限（准入控制），超出时立即拒绝而不是无限排队；
+- 每个任务都有超时，超时或被取消时直接结束对应的工作进程，之后按需重新启动。
+
+工作进程使用 spawn 方式启动（不复制机器人进程的状态），通过管道接收
+``(函数, 参数)`` 并返回结果，因此提交的函数必须是可导入的模块级函数。
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+log = logging.getLogger("red.chatsummary.render")
+
+# 关闭进程池时等待工作进程自行退出的秒数
+_SHUTDOWN_GRACE = 2
+
+
+class RenderError(Exception):
+    """渲染任务失败"""
+
+
+class RenderPoolBusy(RenderError):
+    """等待中的渲染任务过多，任务被拒绝"""
+
+
+class RenderTimeout(RenderError):
+    """渲染任务超时，工作进程已被结束"""
+
+
+def _ensure_importable():
+    """确保插件包所在目录在 sys.path 中
+
+    spawn 启动的工作进程继承父进程的 sys.path，并按模块名导入提交的函数；
+    Red 从 cog 目录加载插件时不一定把该目录加入 sys.path。
+    """
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if package_parent not in sys.path:
+        sys.path.append(package_parent)
+
+
+def _worker_main(conn, initializer: Optional[Callable]):
+    """工作进程主循环：接收任务、执行并返回 (是否成功, 结果或错误信息)"""
+    if initializer is not None:
+        try:
+            initializer()
+        except Exception:
+            traceback.print_exc()
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        func, args = job
+        try:
+            reply = (True, func(*args))
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # 结果无法序列化时也要回复，避免父进程一直等待
+            conn.send((False, f"无法返回渲染结果: {e}"))
+
+
+class _Worker:
+    """一个渲染工作进程及其管道"""
+
+    def __init__(self, context, initializer: Optional[Callable]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, initializer),
+            name="chatsummary-render",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def call(self, func: Callable, args: tuple, timeout: Optional[float]):
+        """提交任务并等待结果（阻塞，在线程中调用）
+
+        超时或进程异常退出时结束进程，工作进程不再可用。
+        """
+        try:
+            self.conn.send((func, args))
+            if not self.conn.poll(timeout):
+                raise RenderTimeout(f"渲染超过 {timeout} 秒未完成")
+            return self.conn.recv()
+        except RenderTimeout:
+            self.kill()
+            raise
+        except (EOFError, OSError) as e:
+            self.kill()
+            raise RenderError(f"渲染进程意外退出: {e}")
+
+    def kill(self):
+        """立即结束工作进程"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        """通知工作进程退出，超时后强制结束"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(_SHUTDOWN_GRACE)
+        self.kill()
+
+
+class RenderPool:
+    """跨服务器共享的渲染进程池
+
+    参数:
+        workers: 工作进程数量（同时进行的渲染数）
+        max_queue: 最多等待的任务数，超出时提交会抛出 RenderPoolBusy
+        timeout: 单个任务的默认超时秒数
+        initializer: 工作进程启动时执行的函数（例如预加载字体）
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float, initializer: Optional[Callable] = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._initializer = initializer
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._running = 0
+        self._waiting = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._closed = False
+        # 启动进程和等待结果都是阻塞操作，使用独立线程，不占用默认线程池
+        self._threads = ThreadPoolExecutor(thread_name_prefix="chatsummary-render")
+        _ensure_importable()
+
+    @property
+    def pending(self) -> int:
+        """正在渲染和等待中的任务数"""
+        return self._running + self._waiting
+
+    def _get_condition(self) -> asyncio.Condition:
+        # 在事件循环中第一次使用时再创建
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self._initializer)
+
+    async def resize(self, workers: int):
+        """调整工作进程数量（多余的空闲进程立即退出）"""
+        self.workers = workers
+        excess = self._idle[workers:]
+        del self._idle[workers:]
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+        if excess:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self._threads, w.stop) for w in excess))
+
+    async def start(self):
+        """预先启动全部工作进程（可选，否则在第一次提交任务时启动）"""
+        loop = asyncio.get_running_loop()
+        missing = self.workers - len(self._idle) - self._running
+        if missing <= 0 or self._closed:
+            return
+        started = await asyncio.gather(
+            *(loop.run_in_executor(self._threads, self._spawn) for _ in range(missing)),
+            return_exceptions=True
+        )
+        for worker in started:
+            if isinstance(worker, _Worker):
+                self._idle.append(worker)
+            else:
+                log.error(f"启动渲染进程失败: {worker}")
+        log.info(f"渲染进程池已启动 {len(self._idle)} 个工作进程")
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None):
+        """在工作进程中执行 func(*args) 并返回结果
+
+        异常:
+            RenderPoolBusy: 等待中的任务已达上限
+            RenderTimeout: 任务超时（工作进程已被结束）
+            RenderError: 任务抛出异常或工作进程意外退出
+        """
+        if self._closed:
+            raise RenderError("渲染进程池已关闭")
+        if self._waiting >= self.max_queue:
+            raise RenderPoolBusy(f"渲染队列已满（{self._running} 个正在渲染，{self._waiting} 个等待中）")
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        condition = self._get_condition()
+
+        self._waiting += 1
+        try:
+            async with condition:
+                await condition.wait_for(lambda: self._running < self.workers)
+                self._running += 1
+        finally:
+            self._waiting -= 1
+
+        worker = None
+        try:
+            worker = self._idle.pop() if self._idle else None
+            if worker is not None and not worker.is_alive():
+                # 空闲期间意外退出的进程：回收进程并关闭管道后再启动新进程
+                dead, worker = worker, None
+                await self._retire(dead)
+            if worker is None:
+                worker = await loop.run_in_executor(self._threads, self._spawn)
+            ok, result = await loop.run_in_executor(self._threads, worker.call, func, args, timeout)
+            # 任务正常返回（包括函数自身抛出异常），进程仍然可用
+            if len(self._idle) < self.workers and not self._closed:
+                self._idle.append(worker)
+                worker = None
+            else:
+                retired, worker = worker, None
+                await self._retire(retired)
+            if not ok:
+                raise RenderError(result)
+            return result
+        except asyncio.CancelledError:
+            # 任务被取消：结束进程，等待结果的线程会随之返回
+            if worker is not None:
+                worker.process.kill()
+            raise
+        finally:
+            async with condition:
+                self._running -= 1
+                condition.notify()
+
+    async def _retire(self, worker: _Worker):
+        """在线程中结束工作进程（``kill`` 会等待进程退出，不能在事件循环上执行）"""
+        loop = asyncio.get_running_loop()
+        # 进程池关闭后线程池不再接受任务，改用默认线程池
+        executor = None if self._closed else self._threads
+        await loop.run_in_executor(executor, worker.kill)
+
+    def close(self):
+        """停止所有空闲的工作进程（正在渲染的进程会在任务结束后退出）"""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+        self._threads.shutdown(wait=False)
@@ -0,0 +1,205 @@
+"""定时任务调度器
+
+所有服务器的定时总结和定时导出共用一个后台任务：按下次运行时间维护一个
+最小堆，只睡眠到最早的那个任务到期。下次运行时间是绝对时间戳，每次更新后
+通过回调持久化，机器人重启或插件重载后从保存的时间继续，而不是重新计时。
+
+错过的运行（机器人离线期间到期）按补偿策略处理：
+- 补偿：启动后立即补跑一次，之后回到原来的节奏；
+- 跳过：不补跑，直接等到原节奏中的下一个时间点。
+无论错过多少次，最多只补跑一次。
+
+新任务的运行时间按任务键的哈希值错开：每个任务在自己的固定相位上运行
+（以 Unix 纪元为起点，每隔一个间隔一次），同一时间添加或加载的大量任务
+不会在同一时刻触发。还可以为每次运行加上随机抖动，进一步分散负载。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+import zlib
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+log = logging.getLogger("red.chatsummary.scheduler")
+
+
+class _Job:
+    __slots__ = ("interval", "next_run", "jitter", "fire_at")
+
+    def __init__(self, interval: float, next_run: float, jitter: float):
+        self.interval = interval
+        self.next_run = next_run
+        self.jitter = jitter
+        self.fire_at = next_run
+
+    def schedule(self, next_run: float):
+        """设置下次运行时间，实际触发时间再加上随机抖动"""
+        self.next_run = next_run
+        self.fire_at = next_run + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+
+def job_phase(key: Hashable, interval: float) -> float:
+    """根据任务键计算固定的相位偏移（0 到 interval 之间，跨进程稳定）"""
+    if isinstance(key, tuple):
+        raw = "/".join(str(part) for part in key)
+    else:
+        raw = str(key)
+    return zlib.crc32(raw.encode("utf-8")) % max(int(interval), 1)
+
+
+def first_run(key: Hashable, interval: float, now: float) -> float:
+    """新任务的第一次运行时间：now 之后该任务相位上的第一个时间点"""
+    phase = job_phase(key, interval)
+    return phase + (math.floor((now - phase) / interval) + 1) * interval
+
+
+def next_aligned_run(next_run: float, interval: float, now: float) -> float:
+    """保持原来的节奏，返回 next_run + k * interval 中第一个晚于 now 的时间"""
+    if next_run > now:
+        return next_run
+    missed = math.floor((now - next_run) / interval) + 1
+    return next_run + missed * interval
+
+
+class JobScheduler:
+    """基于最小堆的定时任务调度器
+
+    参数:
+        run_job: 任务到期时调用的协程函数，参数为任务键
+        save_next_run: 下次运行时间变化时调用的协程函数，参数为 (任务键, 时间戳)
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[Hashable], Awaitable[None]],
+        save_next_run: Callable[[Hashable, float], Awaitable[None]],
+    ):
+        self._run_job = run_job
+        self._save_next_run = save_next_run
+        self._jobs: Dict[Hashable, _Job] = {}
+        # (触发时间, 序号, 任务键)；任务被修改或删除后旧条目留在堆中，弹出时跳过
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._counter = itertools.count()
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def start(self):
+        """启动调度循环（重复调用无效）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop())
+
+    def stop(self):
+        """停止调度循环并取消正在执行的任务"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._running.values():
+            task.cancel()
+        self._running.clear()
+
+    def add(
+        self,
+        key: Hashable,
+        interval: float,
+        next_run: Optional[float] = None,
+        catch_up: bool = True,
+        jitter: float = 0.0,
+    ) -> float:
+        """添加或替换一个定时任务
+
+        参数:
+            key: 任务键（在调度器内唯一）
+            interval: 运行间隔（秒）
+            next_run: 保存的下次运行时间戳；None 表示一个间隔内该任务相位上的时间点
+            catch_up: next_run 已经过去时是否立即补跑一次
+            jitter: 每次运行随机推迟的最大秒数（不超过间隔的一半，不影响保存的时间）
+
+        返回:
+            下次运行时间戳
+        """
+        now = time.time()
+        if next_run is None:
+            next_run = first_run(key, interval, now)
+        elif next_run <= now and not catch_up:
+            next_run = next_aligned_run(next_run, interval, now)
+        job = _Job(interval, next_run, min(max(jitter, 0.0), interval / 2))
+        job.schedule(next_run)
+        self._jobs[key] = job
+        self._push(key, job.fire_at)
+        return next_run
+
+    def remove(self, key: Hashable):
+        """移除定时任务（正在执行的那次会被取消）"""
+        self._jobs.pop(key, None)
+        running = self._running.pop(key, None)
+        if running is not None:
+            running.cancel()
+        self._wakeup.set()
+
+    def next_run(self, key: Hashable) -> Optional[float]:
+        """任务的下次运行时间戳（任务不存在时为 None）"""
+        job = self._jobs.get(key)
+        return job.next_run if job else None
+
+    def _push(self, key: Hashable, fire_at: float):
+        heapq.heappush(self._heap, (fire_at, next(self._counter), key))
+        self._wakeup.set()
+
+    def _pop_stale(self):
+        """丢弃堆顶已失效的条目"""
+        while self._heap:
+            when, _, key = self._heap[0]
+            job = self._jobs.get(key)
+            if job is not None and job.fire_at == when:
+                return
+            heapq.heappop(self._heap)
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            self._pop_stale()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                # 新任务加入或任务被修改时提前醒来，重新检查堆顶
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key = heapq.heappop(self._heap)
+            job = self._jobs[key]
+            # 落后超过一个间隔时不逐次补跑，直接回到原节奏（抖动不累积到节奏中）
+            job.schedule(next_aligned_run(job.next_run + job.interval, job.interval, time.time()))
+            self._push(key, job.fire_at)
+            try:
+                await self._save_next_run(key, job.next_run)
+            except Exception as e:
+                log.error(f"保存定时任务的下次运行时间失败 ({key}): {e}", exc_info=True)
+
+            if key in self._running:
+                log.warning(f"定时任务上一次运行尚未结束，跳过本次运行 ({key})")
+                continue
+            self._running[key] = asyncio.ensure_future(self._run(key))
+
+    async def _run(self, key: Hashable):
+        try:
+            await self._run_job(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"定时任务执行错误 ({key}): {e}", exc_info=True)
+        finally:
+            if self._running.get(key) is asyncio.current_task():
+                del self._running[key]
@@ -0,0 +1,130 @@
+"""总结结果缓存
+
+以频道状态（频道ID、最新消息ID、消息数量、模型、提示词版本等）为键，
+在 SQLite 中持久化 AI 总结结果。频道没有新消息时直接返回上次的结果，
+不再重复调用 AI。缓存按最近使用时间（LRU）和存活时间（TTL）淘汰。
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+# 最多缓存的总结数量
+DEFAULT_MAX_ENTRIES = 5000
+
+# 缓存存活时间（秒）
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def make_cache_key(*parts) -> str:
+    """根据频道状态生成缓存键（各部分拼接后取 SHA-256）"""
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """持久化的总结缓存（LRU + TTL）"""
+
+    def __init__(self, path, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, "
+            "guild_id INTEGER NOT NULL, "
+            "summary TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access)"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        # 每个服务器的命中/未命中次数（自插件加载起）
+        self._stats: Dict[int, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._db_lock:
+            self._conn.close()
+
+    async def _run(self, func, *args):
+        """在线程池中执行数据库操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._locked_call, func, args)
+
+    def _locked_call(self, func, args):
+        with self._db_lock:
+            return func(*args)
+
+    # ---- 同步方法（在线程池中执行） ----
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT summary, created_at FROM summaries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.ttl:
+            self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return row[0]
+
+    def _put(self, key: str, guild_id: int, summary: str):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO summaries (key, guild_id, summary, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, guild_id, summary, now, now)
+        )
+        # 淘汰过期条目和最久未使用的条目
+        self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM summaries WHERE key IN ("
+            "SELECT key FROM summaries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self._conn.commit()
+
+    def _count(self, guild_id: int) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM summaries WHERE guild_id = ?", (guild_id,)
+        ).fetchone()[0]
+
+    def _clear_guild(self, guild_id: int):
+        self._conn.execute("DELETE FROM summaries WHERE guild_id = ?", (guild_id,))
+        self._conn.commit()
+
+    # ---- 异步接口 ----
+
+    async def get(self, guild_id: int, key: str) -> Optional[str]:
+        """读取缓存的总结，同时记录命中/未命中次数"""
+        summary = await self._run(self._get, key)
+        self._stats[guild_id]["hits" if summary is not None else "misses"] += 1
+        return summary
+
+    async def put(self, guild_id: int, key: str, summary: str):
+        """写入总结结果"""
+        await self._run(self._put, key, guild_id, summary)
+
+    async def stats(self, guild_id: int) -> Dict[str, int]:
+        """获取服务器的缓存统计（命中、未命中、条目数）"""
+        entries = await self._run(self._count, guild_id)
+        stats = self._stats[guild_id]
+        return {"hits": stats["hits"], "misses": stats["misses"], "entries": entries}
+
+    async def clear_guild(self, guild_id: int):
+        """清除服务器的全部缓存条目"""
+        await self._run(self._clear_guild, guild_id)
+        self._stats.pop(guild_id, None)
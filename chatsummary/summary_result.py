@@ -0,0 +1,74 @@
+"""频道总结结果
+
+``generate_channel_summary`` 返回不可变的 ``ChannelSummary``，
+Discord 嵌入消息和 PDF 报告都直接读取其中的字段，不再从嵌入消息的
+显示文本中解析统计数据。结果只包含基本类型，可以直接传给渲染进程。
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from .llm import TokenUsage
+
+# 总结状态
+STATUS_SUMMARIZED = "summarized"  # 正常生成（含增量总结）
+STATUS_UNCHANGED = "unchanged"  # 增量总结：上次之后没有新消息，沿用上次的总结
+STATUS_EMPTY = "empty"  # 没有消息记录
+
+# 时间范围的显示格式
+TIME_RANGE_FORMAT = '%Y-%m-%d %H:%M'
+
+
+@dataclass(frozen=True)
+class SummaryStats:
+    """参与总结的消息统计"""
+
+    messages: int = 0
+    users: int = 0
+    attachments: int = 0
+    embeds: int = 0
+    replies: int = 0
+    first_time: Optional[datetime] = None
+    last_time: Optional[datetime] = None
+
+    @classmethod
+    def from_channel_stats(cls, stats) -> "SummaryStats":
+        """从累计完成的 ChannelStats 生成"""
+        return cls(
+            messages=stats.messages,
+            users=stats.users,
+            attachments=stats.attachments,
+            embeds=stats.embeds,
+            replies=stats.replies,
+            first_time=stats.first_time,
+            last_time=stats.last_time,
+        )
+
+    def time_range(self) -> str:
+        """时间范围文本"""
+        if self.first_time is None:
+            return "N/A"
+        return f"{self.first_time.strftime(TIME_RANGE_FORMAT)} - {self.last_time.strftime(TIME_RANGE_FORMAT)}"
+
+
+@dataclass(frozen=True)
+class ChannelSummary:
+    """一个频道的总结结果"""
+
+    guild_id: int
+    channel_id: int
+    category: str
+    channel_name: str
+    text: str
+    status: str = STATUS_SUMMARIZED
+    stats: SummaryStats = field(default_factory=SummaryStats)
+    incremental: bool = False  # 是否只总结了上次之后的新消息
+    ai_generated: bool = False  # 是否由 AI 成功生成（否则为简单统计或错误说明）
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    fetch_seconds: float = 0.0  # 同步和读取消息的耗时
+    summarize_seconds: float = 0.0  # 生成总结的耗时
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def title(self) -> str:
+        return f"{self.category} / {self.channel_name}"
@@ -0,0 +1,266 @@
+"""聊天记录文本处理：token 估算、清理、打包与分块
+
+发送给 AI 的聊天记录按 token 而不是字符计算预算：同样的字符数，中文和
+英文的 token 数可能相差数倍，按字符截断会让上下文窗口要么浪费、要么溢出。
+
+token 数用本地规则估算（不依赖分词库），大致模拟 BPE 分词的结果：
+- 英文单词每 6 个字母约 1 个 token（常见单词通常是 1 个）；
+- 数字每 3 位 1 个 token，ASCII 标点每个 1 个 token；
+- 中日韩字符按模型的词表计算（新词表每字不到 1 个 token，旧词表略多于 1 个）；
+- 表情等其他非 ASCII 字符每个约 2 个 token；
+- 空格并入后面的单词，不单独计算。
+"""
+import re
+from datetime import timedelta
+from typing import List, NamedTuple, Sequence
+
+from .dedup import collapse_duplicates
+
+# 中日韩文字及全角符号
+_CJK_RE = re.compile(
+    "[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]"
+)
+_WORD_RE = re.compile(r"[A-Za-z]+")
+_DIGITS_RE = re.compile(r"\d+")
+_ASCII_PUNCT_RE = re.compile(r"[!-/:-@\[-`{-~]")
+_NEWLINES_RE = re.compile(r"\n+")
+# 除空白、字母、数字外的所有字符（包括中日韩字符、标点和表情）
+_SYMBOL_RE = re.compile(r"[^\sA-Za-z\d]")
+
+# 清理聊天内容时替换的链接和 Discord 标记
+_URL_RE = re.compile(r"https?://([^/\s>]+)\S*")
+_USER_MENTION_RE = re.compile(r"<@!?\d+>")
+_ROLE_MENTION_RE = re.compile(r"<@&\d+>")
+_CHANNEL_MENTION_RE = re.compile(r"<#\d+>")
+_CUSTOM_EMOJI_RE = re.compile(r"<a?:(\w+):\d+>")
+_DISCORD_TIMESTAMP_RE = re.compile(r"<t:-?\d+(?::[tTdDfFR])?>")
+_SPACE_RE = re.compile(r"\s+")
+
+# 消息行开头的时间戳，连续相同时只保留第一个
+_LINE_TIME_RE = re.compile(r"\[\d{2}:\d{2}\] ")
+
+# 同一用户的连续消息间隔不超过该时间时合并为一行
+MERGE_WINDOW = timedelta(minutes=5)
+
+# 合并的消息之间的分隔符
+MERGE_SEPARATOR = " / "
+
+# 截断消息时的省略标记
+TRUNCATION_MARK = "…"
+
+# 合并近似重复消息后附加在代表消息后的说明
+DUPLICATE_MARK = "（共 {count} 条相似消息）"
+
+
+class ModelProfile(NamedTuple):
+    """模型的上下文窗口和中日韩字符的 token 比例"""
+
+    context_window: int
+    cjk_ratio: float
+
+
+# 按模型名称前缀匹配（靠前的优先），未知模型使用 DEFAULT_PROFILE
+MODEL_PROFILES = (
+    ("gpt-4o", ModelProfile(128000, 0.8)),
+    ("gpt-4.1", ModelProfile(128000, 0.8)),
+    ("gpt-5", ModelProfile(128000, 0.8)),
+    ("o1", ModelProfile(128000, 0.8)),
+    ("o3", ModelProfile(128000, 0.8)),
+    ("o4", ModelProfile(128000, 0.8)),
+    ("gpt-4-turbo", ModelProfile(128000, 1.2)),
+    ("gpt-4-32k", ModelProfile(32768, 1.2)),
+    ("gpt-4", ModelProfile(8192, 1.2)),
+    ("gpt-3.5-turbo", ModelProfile(16385, 1.2)),
+    ("deepseek", ModelProfile(64000, 0.7)),
+    ("qwen", ModelProfile(32768, 0.7)),
+    ("glm", ModelProfile(128000, 0.7)),
+)
+DEFAULT_PROFILE = ModelProfile(8192, 1.0)
+
+
+def model_profile(model: str) -> ModelProfile:
+    """根据模型名称查找上下文窗口和 token 比例（忽略大小写和服务商前缀）"""
+    name = model.lower().rsplit("/", 1)[-1]
+    for prefix, profile in MODEL_PROFILES:
+        if name.startswith(prefix):
+            return profile
+    return DEFAULT_PROFILE
+
+
+def prompt_token_budget(model: str, configured: int, reserved: int) -> int:
+    """聊天记录可用的 token 预算
+
+    参数:
+        model: 模型名称
+        configured: 服务器配置的预算
+        reserved: 需要留给提示词模板和输出的 token 数
+
+    返回:
+        不超过模型上下文窗口的预算（至少 100）
+    """
+    available = model_profile(model).context_window - reserved
+    return max(min(configured, available), 100)
+
+
+def estimate_tokens(text: str, cjk_ratio: float = 1.0) -> int:
+    """估算文本的 token 数量
+
+    参数:
+        text: 文本
+        cjk_ratio: 每个中日韩字符的 token 数（见 ``model_profile``）
+    """
+    if not text:
+        return 0
+    words = sum((len(word) + 5) // 6 for word in _WORD_RE.findall(text))
+    digits = sum((len(number) + 2) // 3 for number in _DIGITS_RE.findall(text))
+    symbols = len(_SYMBOL_RE.findall(text))
+    cjk = len(_CJK_RE.findall(text))
+    punct = len(_ASCII_PUNCT_RE.findall(text))
+    others = symbols - cjk - punct
+    newlines = len(_NEWLINES_RE.findall(text))
+    return words + digits + punct + newlines + 2 * others + int(cjk * cjk_ratio + 0.5)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, cjk_ratio: float = 1.0) -> str:
+    """把文本截断到不超过 max_tokens（超出时末尾加省略标记，预算连省略标记都
+    放不下时只返回省略标记）"""
+    tokens = estimate_tokens(text, cjk_ratio)
+    if tokens <= max_tokens:
+        return text
+    mark_tokens = estimate_tokens(TRUNCATION_MARK, cjk_ratio)
+    # 按比例估计截断位置，再逐步缩短到预算以内
+    end = len(text) * max_tokens // tokens
+    while end > 0 and estimate_tokens(text[:end], cjk_ratio) + mark_tokens > max_tokens:
+        end = end * 9 // 10
+    return text[:end].rstrip() + TRUNCATION_MARK
+
+
+def clean_content(text: str) -> str:
+    """去掉聊天内容中对总结没有帮助的部分
+
+    链接只保留域名，用户/身份组/频道提及和 Discord 时间戳标记替换为简短的
+    占位文字，自定义表情只保留名称，换行和连续空白合并为一个空格。
+    """
+    if not text:
+        return ""
+    text = _URL_RE.sub(r"[链接:\1]", text)
+    text = _USER_MENTION_RE.sub("@用户", text)
+    text = _ROLE_MENTION_RE.sub("@身份组", text)
+    text = _CHANNEL_MENTION_RE.sub("#频道", text)
+    text = _CUSTOM_EMOJI_RE.sub(r":\1:", text)
+    text = _DISCORD_TIMESTAMP_RE.sub("[时间]", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def transcript_lines(
+    messages: Sequence,
+    message_tokens: int,
+    cjk_ratio: float = 1.0,
+    dedup: bool = False,
+) -> List[str]:
+    """把消息转换为发送给 AI 的聊天记录行
+
+    每条消息先清理并截断到 message_tokens；同一用户在 ``MERGE_WINDOW``
+    内的连续消息合并为一行。每行的格式为 ``[时:分] 用户名: 内容``。
+
+    参数:
+        messages: 按时间顺序排列的 MessageRecord
+        message_tokens: 单条消息的 token 上限
+        cjk_ratio: 每个中日韩字符的 token 数
+        dedup: 是否合并近似重复的消息（只保留第一条并注明条数）
+
+    返回:
+        聊天记录行（没有文本内容的消息被跳过）
+    """
+    entries = []
+    for msg in messages:
+        text = clean_content(msg.content)
+        if text:
+            entries.append((msg, truncate_to_tokens(text, message_tokens, cjk_ratio)))
+    counts = collapse_duplicates([text for _, text in entries]) if dedup else None
+
+    lines = []
+    parts: List[str] = []
+    head = ""
+    last_author = None
+    last_time = None
+    for index, (msg, text) in enumerate(entries):
+        if counts is not None:
+            if counts[index] == 0:
+                continue
+            if counts[index] > 1:
+                text += DUPLICATE_MARK.format(count=counts[index])
+        if parts and msg.author_id == last_author and msg.created_at - last_time <= MERGE_WINDOW:
+            parts.append(text)
+        else:
+            if parts:
+                lines.append(head + MERGE_SEPARATOR.join(parts))
+            head = f"[{msg.created_at.strftime('%H:%M')}] {msg.author_name}: "
+            parts = [text]
+            last_author = msg.author_id
+        last_time = msg.created_at
+    if parts:
+        lines.append(head + MERGE_SEPARATOR.join(parts))
+    return lines
+
+
+def join_lines(lines: Sequence[str]) -> str:
+    """用换行连接聊天记录行，与上一行相同的时间戳只保留第一个"""
+    out = []
+    previous = None
+    for line in lines:
+        match = _LINE_TIME_RE.match(line)
+        if match is None:
+            previous = None
+        elif match.group() == previous:
+            line = line[match.end():]
+        else:
+            previous = match.group()
+        out.append(line)
+    return "\n".join(out)
+
+
+def pack_lines(lines: Sequence[str], max_tokens: int, cjk_ratio: float = 1.0) -> str:
+    """在 token 预算内保留尽量多的最新聊天记录行
+
+    返回:
+        按时间顺序连接的文本（最早的行在预算不足时被丢弃，
+        最新的一行单独超过预算时被截断）
+    """
+    if not lines:
+        return ""
+    if estimate_tokens(lines[-1], cjk_ratio) + 1 > max_tokens:
+        return truncate_to_tokens(lines[-1], max_tokens - 1, cjk_ratio)
+    total = 0
+    start = len(lines)
+    while start > 0:
+        line_tokens = estimate_tokens(lines[start - 1], cjk_ratio) + 1
+        if total + line_tokens > max_tokens:
+            break
+        total += line_tokens
+        start -= 1
+    return join_lines(lines[start:])
+
+
+def chunk_lines(lines: List[str], max_tokens: int, cjk_ratio: float = 1.0) -> List[str]:
+    """按 token 预算把多行文本切分为若干块
+
+    行不会被拆开；单独一行超过预算时自成一块。
+
+    返回:
+        每块用换行连接后的文本列表
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line, cjk_ratio) + 1
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append(join_lines(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        chunks.append(join_lines(current))
+    return chunks
@@ -0,0 +1,16 @@
+"""测试配置
+
+插件包的 ``__init__`` 会导入 Red 和整个 cog。这里的测试只覆盖不依赖 Red 的
+模块（去重、分块、批量解析、调度计算等），因此把 ``chatsummary`` 注册为不执行
+``__init__`` 的包，测试中按需导入其中的子模块。
+"""
+import sys
+import types
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "chatsummary"
+
+if "chatsummary" not in sys.modules:
+    package = types.ModuleType("chatsummary")
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["chatsummary"] = package
@@ -0,0 +1,182 @@
+"""小频道批量总结（chatsummary/batching.py）"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from chatsummary.batching import (  # noqa: E402
+    BatchCollector,
+    BatchItem,
+    build_batch_content,
+    parse_batch_response,
+)
+from chatsummary.llm import TokenUsage  # noqa: E402
+
+USAGE = TokenUsage(1, 1)
+
+
+def item(title: str, tokens: int = 10) -> BatchItem:
+    return BatchItem(title, f"[12:00] user: {title}", tokens)
+
+
+# ---- 请求内容 ----
+
+def test_build_batch_content_numbers_sections():
+    content = build_batch_content([item("闲聊"), item("公告")])
+    assert content == (
+        "<<<频道 1: 闲聊>>>\n[12:00] user: 闲聊\n\n"
+        "<<<频道 2: 公告>>>\n[12:00] user: 公告"
+    )
+
+
+# ---- 回复解析 ----
+
+def test_parse_all_sections():
+    text = "<<<频道 1>>>\n第一个总结\n\n<<<频道 2>>>\n第二个总结\n"
+    assert parse_batch_response(text, 2) == ["第一个总结", "第二个总结"]
+
+
+def test_parse_tolerates_markdown_decoration_and_titles():
+    text = "## <<<频道 1: 闲聊>>>\n总结一\n**<<<频道 2>>>**\n总结二"
+    assert parse_batch_response(text, 2) == ["总结一", "总结二"]
+
+
+def test_parse_out_of_order_sections():
+    text = "<<<频道 2>>>\nB\n<<<频道 1>>>\nA"
+    assert parse_batch_response(text, 2) == ["A", "B"]
+
+
+def test_parse_missing_section_is_none():
+    text = "<<<频道 1>>>\n只有第一个"
+    assert parse_batch_response(text, 3) == ["只有第一个", None, None]
+
+
+def test_parse_duplicated_section_is_none():
+    text = "<<<频道 1>>>\nA\n<<<频道 2>>>\nB\n<<<频道 1>>>\nA2"
+    assert parse_batch_response(text, 2) == [None, "B"]
+
+
+def test_parse_duplicated_section_stays_none_on_third_occurrence():
+    text = "<<<频道 1>>>\nA\n<<<频道 1>>>\nA2\n<<<频道 1>>>\nA3"
+    assert parse_batch_response(text, 1) == [None]
+
+
+def test_parse_empty_section_is_none():
+    text = "<<<频道 1>>>\n\n<<<频道 2>>>\nB"
+    assert parse_batch_response(text, 2) == [None, "B"]
+
+
+def test_parse_ignores_out_of_range_index():
+    text = "<<<频道 1>>>\nA\n<<<频道 7>>>\n多出来的"
+    assert parse_batch_response(text, 2) == ["A", None]
+
+
+def test_parse_garbled_response():
+    assert parse_batch_response("模型没有按格式回复", 2) == [None, None]
+    # 标记不在单独一行时不算分隔标记
+    assert parse_batch_response("前文 <<<频道 1>>> 后文", 1) == [None]
+
+
+def test_parse_text_before_first_mark_is_ignored():
+    text = "以下是各频道的总结：\n<<<频道 1>>>\nA"
+    assert parse_batch_response(text, 1) == ["A"]
+
+
+# ---- 收集器 ----
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_collector_flushes_when_all_channels_reported():
+    batches = []
+
+    async def run_batch(items):
+        batches.append([i.title for i in items])
+        return [(f"总结 {i.title}", USAGE) for i in items]
+
+    async def main():
+        collector = BatchCollector(run_batch, token_budget=100, max_items=8, expected=3)
+        first = collector.submit(item("a"))
+        collector.decline()
+        second = collector.submit(item("b"))
+        return await first, await second
+
+    (text_a, _), (text_b, _) = run(main())
+    assert batches == [["a", "b"]]
+    assert (text_a, text_b) == ("总结 a", "总结 b")
+
+
+def test_collector_splits_on_token_budget():
+    batches = []
+
+    async def run_batch(items):
+        batches.append([i.title for i in items])
+        return [(i.title, USAGE) for i in items]
+
+    async def main():
+        collector = BatchCollector(run_batch, token_budget=25, max_items=8, expected=4)
+        futures = [collector.submit(item(name)) for name in "abcd"]
+        return await asyncio.gather(*futures)
+
+    run(main())
+    assert batches == [["a", "b"], ["c", "d"]]
+
+
+def test_collector_splits_on_max_items():
+    batches = []
+
+    async def run_batch(items):
+        batches.append(len(items))
+        return [(i.title, USAGE) for i in items]
+
+    async def main():
+        collector = BatchCollector(run_batch, token_budget=1000, max_items=2, expected=5)
+        futures = [collector.submit(item(name)) for name in "abcde"]
+        return await asyncio.gather(*futures)
+
+    results = run(main())
+    assert batches == [2, 2]
+    # 最后只剩一个频道时不合并，交给调用方单独总结
+    assert results[-1] is None
+
+
+def test_collector_single_item_is_not_batched():
+    async def run_batch(items):
+        raise AssertionError("不应该为单个频道发出批量请求")
+
+    async def main():
+        collector = BatchCollector(run_batch, token_budget=100, max_items=8, expected=2)
+        future = collector.submit(item("a"))
+        collector.decline()
+        return await future
+
+    assert run(main()) is None
+
+
+def test_collector_batch_failure_falls_back_to_none():
+    async def run_batch(items):
+        raise RuntimeError("接口错误")
+
+    async def main():
+        collector = BatchCollector(run_batch, token_budget=100, max_items=8, expected=2)
+        futures = [collector.submit(item("a")), collector.submit(item("b"))]
+        return await asyncio.gather(*futures)
+
+    assert run(main()) == [None, None]
+
+
+def test_collector_close_cancels_pending():
+    async def run_batch(items):
+        await asyncio.sleep(10)
+
+    async def main():
+        collector = BatchCollector(run_batch, token_budget=100, max_items=8, expected=3)
+        running = [collector.submit(item("a")), collector.submit(item("b"))]
+        await asyncio.sleep(0)
+        collector.close()
+        results = await asyncio.gather(*running, return_exceptions=True)
+        return [isinstance(result, asyncio.CancelledError) for result in results]
+
+    assert run(main()) == [True, True]
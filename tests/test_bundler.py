@@ -0,0 +1,81 @@
+"""导出文件打包与分卷（chatsummary/bundler.py）"""
+import os
+import random
+import zipfile
+
+from chatsummary.bundler import bundle_files, estimate_compressed_size
+
+
+def write_text(path, size: int, seed: int = 0) -> str:
+    """生成类似导出 CSV 的可压缩文本"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        while written < size:
+            row = f"{rng.randrange(10**17, 10**18)},user{rng.randrange(50)},2025-01-01 12:00,今天的会议改到下午三点\n"
+            f.write(row)
+            written += len(row.encode("utf-8"))
+    return str(path)
+
+
+def write_random(path, size: int) -> str:
+    """不可压缩的数据"""
+    with open(path, "wb") as f:
+        f.write(random.Random(1).randbytes(size))
+    return str(path)
+
+
+def test_estimate_compressible_file_is_much_smaller(tmp_path):
+    path = write_text(tmp_path / "a.csv", 200_000)
+    assert estimate_compressed_size(path, "a.csv") < os.path.getsize(path) / 2
+
+
+def test_estimate_already_compressed_file_uses_raw_size(tmp_path):
+    path = write_random(tmp_path / "a.xlsx", 10_000)
+    assert estimate_compressed_size(path, "a.xlsx") >= 10_000
+
+
+def test_compressible_files_share_one_archive(tmp_path):
+    # 原始总大小是上限的 4 倍，压缩后放得进一个压缩包
+    files = [(write_text(tmp_path / f"{i}.csv", 100_000, seed=i), f"{i}.csv") for i in range(4)]
+    outputs = bundle_files(files, str(tmp_path / "out"), 100_000)
+    assert outputs == [str(tmp_path / "out.zip")]
+    with zipfile.ZipFile(outputs[0]) as zf:
+        assert zf.namelist() == ["0.csv", "1.csv", "2.csv", "3.csv"]
+
+
+def test_archives_respect_limit_and_keep_order(tmp_path):
+    files = [(write_random(tmp_path / f"{i}.bin", 30_000 + i), f"{i}.bin") for i in range(5)]
+    outputs = bundle_files(files, str(tmp_path / "out"), 70_000)
+    assert len(outputs) > 1
+    names = []
+    for index, path in enumerate(outputs, 1):
+        assert path.endswith(f"out.part{index}.zip")
+        assert os.path.getsize(path) <= 70_000
+        with zipfile.ZipFile(path) as zf:
+            names.extend(zf.namelist())
+    assert names == [name for _, name in files]
+    assert not [name for name in os.listdir(tmp_path) if ".tmp" in name]
+
+
+def test_underestimated_group_is_repacked(tmp_path, monkeypatch):
+    # 估算严重偏小时，写出后超限的组被拆开重新打包，而不是按字节拆分
+    from chatsummary import bundler
+    monkeypatch.setattr(bundler, "estimate_compressed_size", lambda path, arcname: 1)
+    files = [(write_random(tmp_path / f"{i}.bin", 30_000), f"{i}.bin") for i in range(4)]
+    outputs = bundle_files(files, str(tmp_path / "out"), 70_000)
+    assert all(path.endswith(".zip") for path in outputs)
+    assert all(os.path.getsize(path) <= 70_000 for path in outputs)
+
+
+def test_single_oversized_file_is_split_into_volumes(tmp_path):
+    path = write_random(tmp_path / "big.bin", 250_000)
+    outputs = bundle_files([(path, "big.bin")], str(tmp_path / "out"), 100_000)
+    assert [os.path.basename(part) for part in outputs] == ["out.zip.001", "out.zip.002", "out.zip.003"]
+    joined = tmp_path / "joined.zip"
+    with open(joined, "wb") as dst:
+        for part in outputs:
+            with open(part, "rb") as src:
+                dst.write(src.read())
+    with zipfile.ZipFile(joined) as zf:
+        assert len(zf.read("big.bin")) == 250_000
@@ -0,0 +1,84 @@
+"""配置显示的嵌入消息（chatsummary/config_view.py）"""
+import pytest
+
+pytest.importorskip("discord")
+
+from chatsummary.config_view import MAX_EMBED_FIELDS, build_config_embed, summary_settings_text  # noqa: E402
+
+# 与 ChatSummary.__init__ 中 register_guild 的默认配置一致（只列出显示用到的键）
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "api_key": None,
+    "api_base": "https://api.openai.com/v1",
+    "model": "gpt-3.5-turbo",
+    "max_messages": 100,
+    "export_max_messages": 1000,
+    "export_format": "xlsx",
+    "export_bundle_format": "zip",
+    "summary_channel": None,
+    "export_channel": None,
+    "scheduled_tasks": {},
+    "export_tasks": {},
+    "excluded_channels": [],
+    "excluded_categories": [],
+    "export_excluded_channels": [],
+    "export_excluded_categories": [],
+    "include_bots": False,
+    "summary_concurrency": 3,
+    "api_max_connections": 10,
+    "api_rpm": 0,
+    "api_tpm": 0,
+    "hierarchical_summary": False,
+    "summary_chunk_tokens": 2000,
+    "summary_prompt_tokens": 3000,
+    "summary_dedup": True,
+    "summary_batching": False,
+    "summary_cache_enabled": True,
+    "stream_summaries": False,
+}
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.mention = f"<#{channel_id}>"
+
+
+class FakeGuild:
+    def __init__(self, channel_ids=()):
+        self._channels = {channel_id: FakeChannel(channel_id) for channel_id in channel_ids}
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+
+def test_config_embed_within_field_limit():
+    embed = build_config_embed(FakeGuild(), DEFAULT_CONFIG, "✅ 正常", 2, 120)
+    assert len(embed.fields) <= MAX_EMBED_FIELDS
+
+
+def test_config_embed_with_everything_configured_within_field_limit():
+    config = dict(
+        DEFAULT_CONFIG,
+        enabled=True,
+        api_key="sk-test",
+        summary_channel=1,
+        export_channel=2,
+        excluded_channels=[3, 4],
+        excluded_categories=["归档"],
+        hierarchical_summary=True,
+        summary_batching=True,
+        stream_summaries=True,
+    )
+    embed = build_config_embed(FakeGuild([1, 2, 3, 4]), config, "🔄 正在探测", 2, 120)
+    assert len(embed.fields) <= MAX_EMBED_FIELDS
+    names = [field.name for field in embed.fields]
+    assert len(names) == len(set(names))
+
+
+def test_summary_settings_field_lists_tuning_settings():
+    text = summary_settings_text(dict(DEFAULT_CONFIG, hierarchical_summary=True, summary_batching=True))
+    for label in ("聊天记录预算", "并发数", "总结缓存", "分层总结", "重复消息合并", "小频道批量总结", "流式总结"):
+        assert label in text
+    assert "2000 tokens/块" in text
+    # 嵌入消息字段值最多 1024 个字符
+    assert len(text) <= 1024
@@ -0,0 +1,79 @@
+"""近似重复消息合并（chatsummary/dedup.py）"""
+from chatsummary.dedup import (
+    EXACT_MATCH_LENGTH,
+    SIGNATURE_SIZE,
+    collapse_duplicates,
+    jaccard,
+    minhash,
+    normalize,
+    shingles,
+)
+
+ANNOUNCEMENT = "公告：今晚 22:00 服务器维护，预计持续一小时，请提前保存进度"
+
+
+def test_empty_input():
+    assert collapse_duplicates([]) == []
+
+
+def test_distinct_messages_are_all_kept():
+    texts = ["今天的会议改到下午三点", "有人看了昨晚的比赛吗", "新版本什么时候发布"]
+    assert collapse_duplicates(texts) == [1, 1, 1]
+
+
+def test_first_occurrence_is_representative():
+    texts = ["+1", "别的话题", "+1", "+1"]
+    assert collapse_duplicates(texts) == [3, 1, 0, 0]
+
+
+def test_counts_sum_to_input_length():
+    texts = [ANNOUNCEMENT, "+1", ANNOUNCEMENT + "!", "+1", "完全无关的一条普通聊天消息", ANNOUNCEMENT]
+    counts = collapse_duplicates(texts)
+    assert sum(counts) == len(texts)
+    assert counts[0] == 3
+
+
+def test_normalization_ignores_case_and_whitespace():
+    assert normalize("  Hello   World\n") == "helloworld"
+    assert collapse_duplicates(["LOL", "lol", "l o l"]) == [3, 0, 0]
+
+
+def test_short_texts_only_match_exactly():
+    # 规范化后短于 EXACT_MATCH_LENGTH 的消息不走 MinHash，只合并完全相同的
+    short = "哈哈哈哈"
+    assert len(normalize(short)) < EXACT_MATCH_LENGTH
+    assert collapse_duplicates([short, "哈哈哈哈哈"]) == [1, 1]
+
+
+def test_near_duplicates_above_threshold_are_merged():
+    # 相似度约 0.93：LSH 漏掉候选的概率约为 1e-5（哈希按进程随机化）
+    edited = ANNOUNCEMENT + "！！"
+    assert jaccard(shingles(normalize(ANNOUNCEMENT)), shingles(normalize(edited))) >= 0.9
+    assert collapse_duplicates([ANNOUNCEMENT, edited]) == [2, 0]
+
+
+def test_dissimilar_long_texts_are_not_merged():
+    other = "明天下午两点在三号会议室讨论新版本的发布计划和测试安排"
+    assert jaccard(shingles(normalize(ANNOUNCEMENT)), shingles(normalize(other))) < 0.7
+    assert collapse_duplicates([ANNOUNCEMENT, other]) == [1, 1]
+
+
+def test_minhash_is_deterministic_and_complete():
+    shingle_set = shingles(normalize(ANNOUNCEMENT))
+    signature = minhash(shingle_set)
+    assert len(signature) == SIGNATURE_SIZE
+    assert all(value >= 0 for value in signature)
+    assert minhash(frozenset(shingle_set)) == signature
+
+
+def test_minhash_of_sparse_set_fills_empty_positions():
+    # 只有一个 n-gram 时大部分位置为空，借用后仍然没有空位
+    signature = minhash(shingles("abc"))
+    assert all(value >= 0 for value in signature)
+    assert len(set(signature)) == SIGNATURE_SIZE
+
+
+def test_jaccard_edge_cases():
+    assert jaccard(frozenset(), frozenset()) == 1.0
+    assert jaccard(frozenset({1}), frozenset()) == 0.0
+    assert jaccard(frozenset({1, 2}), frozenset({2, 3})) == 1 / 3
@@ -0,0 +1,233 @@
+"""AI 接口请求调度与熔断（chatsummary/llm_scheduler.py）"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from chatsummary import llm_scheduler  # noqa: E402
+from chatsummary.llm import LLMError  # noqa: E402
+from chatsummary.llm_scheduler import (  # noqa: E402
+    BACKOFF_MAX,
+    CIRCUIT_COOLDOWN,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_MAX_COOLDOWN,
+    WINDOW_SECONDS,
+    CircuitBreaker,
+    CircuitOpenError,
+    EndpointLimiter,
+    _Reservation,
+    backoff_delay,
+    is_retryable,
+)
+
+
+def limiter_with(entries, rpm=0, tpm=0) -> EndpointLimiter:
+    """构造窗口中已有若干请求的限制器，entries 为 [(时间, token 数)]"""
+    limiter = EndpointLimiter(rpm, tpm)
+    for at, tokens in entries:
+        limiter._entries.append(_Reservation(at, tokens))
+        limiter._tokens += tokens
+    return limiter
+
+
+# ---- RPM ----
+
+def test_unlimited_never_waits():
+    limiter = limiter_with([(0.0, 10**6)] * 100)
+    assert limiter._wait_time(1.0, 10**6) == 0.0
+
+
+def test_rpm_below_limit_does_not_wait():
+    limiter = limiter_with([(0.0, 1), (1.0, 1)], rpm=3)
+    assert limiter._wait_time(2.0, 1) == 0.0
+
+
+def test_rpm_at_limit_waits_for_oldest_to_expire():
+    limiter = limiter_with([(0.0, 1), (10.0, 1), (20.0, 1)], rpm=3)
+    assert limiter._wait_time(30.0, 1) == pytest.approx(WINDOW_SECONDS - 30.0)
+
+
+def test_rpm_over_limit_waits_for_enough_entries():
+    # 限制降低后窗口中可能多于 rpm 个请求，需要等到只剩 rpm - 1 个
+    limiter = limiter_with([(0.0, 1), (10.0, 1), (20.0, 1)], rpm=2)
+    assert limiter._wait_time(30.0, 1) == pytest.approx(10.0 + WINDOW_SECONDS - 30.0)
+
+
+# ---- TPM ----
+
+def test_tpm_within_budget_does_not_wait():
+    limiter = limiter_with([(0.0, 400)], tpm=1000)
+    assert limiter._wait_time(5.0, 600) == 0.0
+
+
+def test_tpm_waits_until_enough_tokens_expire():
+    limiter = limiter_with([(0.0, 400), (10.0, 400), (20.0, 100)], tpm=1000)
+    # 需要 300 token：最早的一个请求（400）移出窗口即可
+    assert limiter._wait_time(30.0, 300) == pytest.approx(WINDOW_SECONDS - 30.0)
+    # 需要 700 token：前两个请求都要移出窗口
+    assert limiter._wait_time(30.0, 700) == pytest.approx(10.0 + WINDOW_SECONDS - 30.0)
+
+
+def test_request_larger_than_tpm_waits_for_empty_window():
+    limiter = limiter_with([(0.0, 100), (10.0, 100)], tpm=1000)
+    assert limiter._wait_time(30.0, 5000) == pytest.approx(10.0 + WINDOW_SECONDS - 30.0)
+
+
+def test_request_larger_than_tpm_goes_through_empty_window():
+    limiter = EndpointLimiter(tpm=1000)
+    assert limiter._wait_time(0.0, 5000) == 0.0
+
+
+# ---- 暂停、过期与修正 ----
+
+def test_pause_takes_precedence(monkeypatch):
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", lambda: 100.0)
+    limiter = EndpointLimiter()
+    limiter.pause(15.0)
+    assert limiter._wait_time(105.0, 1) == pytest.approx(10.0)
+    assert limiter._wait_time(116.0, 1) == 0.0
+
+
+def test_expire_removes_old_entries_and_tokens():
+    limiter = limiter_with([(0.0, 300), (30.0, 200)], tpm=1000)
+    limiter._expire(WINDOW_SECONDS)
+    assert len(limiter._entries) == 1
+    assert limiter._tokens == 200
+
+
+def test_settle_replaces_estimate_with_actual_usage():
+    async def main():
+        limiter = EndpointLimiter(tpm=1000)
+        reservation = await limiter.reserve(800)
+        limiter.settle(reservation, 250)
+        return limiter._tokens
+
+    assert asyncio.run(main()) == 250
+
+
+def test_settle_after_expiry_is_ignored():
+    limiter = EndpointLimiter(tpm=1000)
+    limiter.settle(_Reservation(0.0, 500), 100)
+    assert limiter._tokens == 0
+
+
+# ---- 重试 ----
+
+def test_is_retryable():
+    assert is_retryable(LLMError("限流", status=429))
+    assert is_retryable(LLMError("服务器错误", status=503))
+    assert not is_retryable(LLMError("认证失败", status=401))
+    assert not is_retryable(LLMError("超时"))
+
+
+def test_backoff_delay_bounds():
+    assert backoff_delay(0, retry_after=7.0) == 7.0
+    assert backoff_delay(0, retry_after=10_000.0) == BACKOFF_MAX
+    for attempt in range(10):
+        delay = backoff_delay(attempt)
+        assert 0 < delay <= BACKOFF_MAX
+
+
+# ---- 熔断器 ----
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", fake)
+    return fake
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_stays_closed_below_threshold(clock):
+    breaker = CircuitBreaker("test")
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test")
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_and_rejects_during_cooldown(clock):
+    breaker = open_breaker()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.remaining == pytest.approx(CIRCUIT_COOLDOWN)
+    clock.now += CIRCUIT_COOLDOWN - 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = open_breaker()
+    clock.now += CIRCUIT_COOLDOWN
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_success_closes_breaker(clock):
+    breaker = open_breaker()
+    clock.now += CIRCUIT_COOLDOWN
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.cooldown == CIRCUIT_COOLDOWN
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_probe_failure_reopens_with_doubled_cooldown(clock):
+    breaker = open_breaker()
+    expected = CIRCUIT_COOLDOWN
+    while expected < CIRCUIT_MAX_COOLDOWN:
+        clock.now += breaker.cooldown
+        breaker.before_call()
+        breaker.record_failure()
+        expected = min(expected * 2, CIRCUIT_MAX_COOLDOWN)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.cooldown == expected
+        assert breaker.remaining == pytest.approx(expected)
+    # 达到上限后不再增加
+    clock.now += breaker.cooldown
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.cooldown == CIRCUIT_MAX_COOLDOWN
+
+
+def test_cancelled_probe_releases_slot(clock):
+    breaker = open_breaker()
+    clock.now += CIRCUIT_COOLDOWN
+    breaker.before_call()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+
+
+def test_remaining_is_zero_when_closed(clock):
+    assert CircuitBreaker("test").remaining == 0.0
@@ -0,0 +1,105 @@
+"""PDF 报告的 Markdown 解析（chatsummary/markdown_pdf.py）"""
+import time
+
+from chatsummary.markdown_pdf import (
+    HEADING,
+    ITEM,
+    LIST_END,
+    PARAGRAPH,
+    RULE,
+    inline_markup,
+    tokenize,
+)
+
+
+# ---- 行内标记 ----
+
+def test_inline_markup_bold_pairs():
+    assert inline_markup("**要点**：说明") == "<b>要点</b>：说明"
+    assert inline_markup("a **b** c **d** e") == "a <b>b</b> c <b>d</b> e"
+
+
+def test_inline_markup_unpaired_or_empty_bold_is_kept():
+    assert inline_markup("a ** b") == "a ** b"
+    assert inline_markup("**a** b **c") == "<b>a</b> b **c"
+    assert inline_markup("****") == "****"
+
+
+def test_inline_markup_escapes_xml():
+    assert inline_markup("1 < 2 & **<x>**") == "1 &lt; 2 &amp; <b>&lt;x&gt;</b>"
+
+
+# ---- 分行标记 ----
+
+def test_headings():
+    assert tokenize("# 一\n## 二\n### 三\n#### 四") == [
+        (HEADING, (1, "一")),
+        (HEADING, (2, "二")),
+        (HEADING, (3, "三")),
+        (HEADING, (3, "四")),
+    ]
+
+
+def test_hash_without_space_is_paragraph():
+    assert tokenize("#标签\n#") == [(PARAGRAPH, "#标签 #")]
+
+
+def test_unordered_and_ordered_lists():
+    text = "- 甲\n* 乙\n+ 丙\n\n1. 第一\n2) 第二"
+    assert tokenize(text) == [
+        (ITEM, "甲"),
+        (ITEM, "乙"),
+        (ITEM, "丙"),
+        (LIST_END, None),
+        (ITEM, "1. 第一"),
+        (ITEM, "2) 第二"),
+        (LIST_END, None),
+    ]
+
+
+def test_number_without_marker_is_paragraph():
+    assert tokenize("2025 年总结") == [(PARAGRAPH, "2025 年总结")]
+
+
+def test_list_ends_before_paragraph():
+    assert tokenize("- 项\n普通文字") == [(ITEM, "项"), (LIST_END, None), (PARAGRAPH, "普通文字")]
+
+
+def test_consecutive_plain_lines_join_into_paragraph():
+    assert tokenize("第一行\n  第二行  \n\n第二段") == [
+        (PARAGRAPH, "第一行 第二行"),
+        (PARAGRAPH, "第二段"),
+    ]
+
+
+def test_bold_line_is_its_own_paragraph():
+    assert tokenize("前文\n**要点**：说明\n后文") == [
+        (PARAGRAPH, "前文"),
+        (PARAGRAPH, "**要点**：说明"),
+        (PARAGRAPH, "后文"),
+    ]
+
+
+def test_rules():
+    assert tokenize("上\n---\n-----\n--") == [
+        (PARAGRAPH, "上"),
+        (RULE, None),
+        (RULE, None),
+        (PARAGRAPH, "--"),
+    ]
+
+
+def test_empty_input():
+    assert tokenize("") == []
+    assert tokenize("\n\n   \n") == []
+
+
+def test_pathological_input_is_linear():
+    # 大量未配对的 ** 和没有空格的 # 也应在线性时间内处理完
+    text = ("**" * 20000 + "#" * 20000 + "\n") * 5
+    start = time.perf_counter()
+    tokenize(text)
+    for _, value in tokenize(text):
+        if isinstance(value, str):
+            inline_markup(value)
+    assert time.perf_counter() - start < 2.0
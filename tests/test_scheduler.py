@@ -0,0 +1,125 @@
+"""定时任务调度器的运行时间计算（chatsummary/scheduler.py）"""
+import asyncio
+import time
+
+from chatsummary.scheduler import JobScheduler, _Job, first_run, job_phase, next_aligned_run
+
+
+# ---- 对齐 ----
+
+def test_next_aligned_run_future_time_is_unchanged():
+    assert next_aligned_run(1000.0, 60.0, 900.0) == 1000.0
+
+
+def test_next_aligned_run_keeps_cadence():
+    # 错过 3 个多间隔后回到原节奏中的下一个时间点
+    assert next_aligned_run(1000.0, 60.0, 1190.0) == 1240.0
+
+
+def test_next_aligned_run_exactly_on_boundary_moves_forward():
+    assert next_aligned_run(1000.0, 60.0, 1000.0) == 1060.0
+    assert next_aligned_run(1000.0, 60.0, 1060.0) == 1120.0
+
+
+# ---- 补跑 ----
+
+def test_add_without_catch_up_skips_missed_runs():
+    scheduler = JobScheduler(None, None)
+    now = time.time()
+    missed = now - 3 * 3600 - 100
+    next_run = scheduler.add("job", 3600, next_run=missed, catch_up=False)
+    assert now < next_run <= now + 3600
+    assert (next_run - missed) % 3600 == 0
+
+
+def test_add_with_catch_up_keeps_past_time():
+    scheduler = JobScheduler(None, None)
+    missed = time.time() - 3 * 3600
+    assert scheduler.add("job", 3600, next_run=missed, catch_up=True) == missed
+    assert scheduler.next_run("job") == missed
+
+
+def test_missed_runs_are_caught_up_at_most_once():
+    runs = []
+    saved = []
+
+    async def run_job(key):
+        runs.append(key)
+
+    async def save_next_run(key, next_run):
+        saved.append(next_run)
+
+    async def main():
+        scheduler = JobScheduler(run_job, save_next_run)
+        interval = 60.0
+        missed = time.time() - 10 * interval - 5
+        scheduler.add("job", interval, next_run=missed, catch_up=True)
+        scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            scheduler.stop()
+        return missed, interval
+
+    missed, interval = asyncio.run(main())
+    assert runs == ["job"]
+    # 补跑之后回到原节奏，而不是逐次补跑错过的 10 次
+    assert len(saved) == 1
+    assert saved[0] > time.time()
+    assert (saved[0] - missed) % interval == 0
+
+
+def test_remove_forgets_job():
+    scheduler = JobScheduler(None, None)
+    scheduler.add("job", 60)
+    assert len(scheduler) == 1
+    scheduler.remove("job")
+    assert len(scheduler) == 0
+    assert scheduler.next_run("job") is None
+
+
+# ---- 相位与抖动 ----
+
+def test_job_phase_is_stable_and_in_range():
+    for key in ["job", ("summary", 1, 2), 12345]:
+        phase = job_phase(key, 3600)
+        assert 0 <= phase < 3600
+        assert job_phase(key, 3600) == phase
+    assert job_phase(("summary", 1, 2), 3600) == job_phase("summary/1/2", 3600)
+
+
+def test_job_phase_spreads_keys():
+    phases = {job_phase(("summary", 1, channel_id), 3600) for channel_id in range(100)}
+    assert len(phases) > 90
+
+
+def test_first_run_lands_on_phase_within_one_interval():
+    now = 1_700_000_123.0
+    for key in ["a", "b", ("export", 1, "all")]:
+        run_at = first_run(key, 3600, now)
+        assert now < run_at <= now + 3600
+        assert (run_at - job_phase(key, 3600)) % 3600 == 0
+
+
+def test_jitter_delays_fire_time_within_bounds():
+    job = _Job(3600, 1000.0, 60.0)
+    for _ in range(200):
+        job.schedule(1000.0)
+        assert job.next_run == 1000.0
+        assert 1000.0 <= job.fire_at <= 1060.0
+
+
+def test_no_jitter_fires_on_time():
+    job = _Job(3600, 1000.0, 0.0)
+    job.schedule(2000.0)
+    assert job.fire_at == job.next_run == 2000.0
+
+
+def test_add_caps_jitter_at_half_interval_and_saves_unjittered_time():
+    scheduler = JobScheduler(None, None)
+    now = time.time()
+    next_run = scheduler.add("job", 600, next_run=now + 100, jitter=10_000)
+    assert next_run == now + 100
+    job = scheduler._jobs["job"]
+    assert job.jitter == 300
+    assert next_run <= job.fire_at <= next_run + 300
@@ -0,0 +1,181 @@
+"""聊天记录的 token 估算、截断、打包与分块（chatsummary/transcript.py）"""
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from chatsummary.transcript import (
+    DEFAULT_PROFILE,
+    TRUNCATION_MARK,
+    chunk_lines,
+    clean_content,
+    estimate_tokens,
+    join_lines,
+    model_profile,
+    pack_lines,
+    prompt_token_budget,
+    transcript_lines,
+    truncate_to_tokens,
+)
+
+
+class Record(NamedTuple):
+    author_id: int
+    author_name: str
+    created_at: datetime
+    content: str
+
+
+START = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def record(author_id: int, minutes: float, content: str) -> Record:
+    return Record(author_id, f"user{author_id}", START + timedelta(minutes=minutes), content)
+
+
+def line(index: int) -> str:
+    # 每行 "[12:mm] user: word" 估算为固定的 token 数，便于计算边界
+    return f"[12:{index:02d}] user: hello"
+
+
+LINE_TOKENS = estimate_tokens(line(0)) + 1  # 加上换行
+
+
+# ---- token 估算 ----
+
+def test_estimate_tokens_rules():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello") == 1
+    assert estimate_tokens("abcdefghijkl") == 2
+    assert estimate_tokens("123456") == 2
+    assert estimate_tokens("!?") == 2
+    assert estimate_tokens("中文字", cjk_ratio=1.0) == 3
+    assert estimate_tokens("中文字", cjk_ratio=0.7) == 2
+    assert estimate_tokens("😀") == 2
+
+
+def test_model_profile_lookup():
+    assert model_profile("gpt-4o-mini").context_window == 128000
+    assert model_profile("openai/GPT-4o").context_window == 128000
+    assert model_profile("gpt-4-32k").context_window == 32768
+    assert model_profile("gpt-4").context_window == 8192
+    assert model_profile("unknown-model") == DEFAULT_PROFILE
+
+
+def test_prompt_token_budget_is_capped_by_context_window():
+    assert prompt_token_budget("gpt-4o", 3000, 1000) == 3000
+    assert prompt_token_budget("gpt-4", 100000, 1000) == 8192 - 1000
+    assert prompt_token_budget("gpt-4", 3000, 10000) == 100
+
+
+# ---- 截断 ----
+
+def test_truncate_keeps_text_within_budget():
+    text = "word " * 50
+    assert truncate_to_tokens(text, 100) == text
+    assert truncate_to_tokens(text, 50) == text
+
+    truncated = truncate_to_tokens(text, 10)
+    assert truncated.endswith(TRUNCATION_MARK)
+    assert estimate_tokens(truncated) <= 10
+
+
+def test_truncate_cjk_text():
+    text = "这是一条很长的中文消息" * 20
+    truncated = truncate_to_tokens(text, 30, cjk_ratio=0.8)
+    assert truncated.endswith(TRUNCATION_MARK)
+    assert estimate_tokens(truncated, 0.8) <= 30
+
+
+def test_truncate_to_zero_budget():
+    assert truncate_to_tokens("hello world", 0) == TRUNCATION_MARK
+
+
+# ---- 打包 ----
+
+def test_pack_lines_empty():
+    assert pack_lines([], 100) == ""
+
+
+def test_pack_lines_exact_budget_keeps_everything():
+    lines = [line(i) for i in range(5)]
+    assert pack_lines(lines, LINE_TOKENS * 5) == join_lines(lines)
+
+
+def test_pack_lines_drops_oldest_when_over_budget():
+    lines = [line(i) for i in range(5)]
+    packed = pack_lines(lines, LINE_TOKENS * 5 - 1)
+    assert packed == join_lines(lines[1:])
+    assert pack_lines(lines, LINE_TOKENS * 2) == join_lines(lines[-2:])
+
+
+def test_pack_lines_truncates_single_oversized_newest_line():
+    lines = [line(0), "[12:01] user: " + "word " * 200]
+    packed = pack_lines(lines, 20)
+    assert "\n" not in packed
+    assert packed.endswith(TRUNCATION_MARK)
+    assert estimate_tokens(packed) + 1 <= 20
+
+
+def test_join_lines_drops_repeated_timestamps():
+    lines = ["[12:00] a: x", "[12:00] b: y", "[12:01] a: z", "no time", "[12:01] b: w"]
+    assert join_lines(lines) == "[12:00] a: x\nb: y\n[12:01] a: z\nno time\n[12:01] b: w"
+
+
+# ---- 分块 ----
+
+def test_chunk_lines_respects_budget():
+    lines = [line(i) for i in range(10)]
+    chunks = chunk_lines(lines, LINE_TOKENS * 3)
+    assert [chunk.count("\n") + 1 for chunk in chunks] == [3, 3, 3, 1]
+
+
+def test_chunk_lines_exact_fit_is_one_chunk():
+    lines = [line(i) for i in range(4)]
+    assert chunk_lines(lines, LINE_TOKENS * 4) == [join_lines(lines)]
+
+
+def test_chunk_lines_oversized_line_is_its_own_chunk():
+    big = "[12:30] user: " + "word " * 100
+    lines = [line(0), big, line(1)]
+    chunks = chunk_lines(lines, LINE_TOKENS * 2)
+    assert chunks == [line(0), big, line(1)]
+
+
+def test_chunk_lines_empty():
+    assert chunk_lines([], 100) == []
+
+
+# ---- 清理与转换 ----
+
+def test_clean_content_replaces_discord_markup():
+    text = "看 https://example.com/a/b?c=1 <@123> <@&45> <#67> <:pepe:89> <t:1700000000:R>\n好的"
+    assert clean_content(text) == "看 [链接:example.com] @用户 @身份组 #频道 :pepe: [时间] 好的"
+    assert clean_content("") == ""
+
+
+def test_transcript_lines_merges_same_author_within_window():
+    messages = [
+        record(1, 0, "第一条"),
+        record(1, 1, "第二条"),
+        record(2, 2, "别人的消息"),
+        record(2, 20, "很久以后"),
+        record(1, 21, ""),
+    ]
+    assert transcript_lines(messages, 100) == [
+        "[12:00] user1: 第一条 / 第二条",
+        "[12:02] user2: 别人的消息",
+        "[12:20] user2: 很久以后",
+    ]
+
+
+def test_transcript_lines_dedup_marks_count():
+    messages = [record(1, 0, "+1"), record(2, 1, "+1"), record(3, 2, "+1"), record(4, 3, "好")]
+    assert transcript_lines(messages, 100, dedup=True) == [
+        "[12:00] user1: +1（共 3 条相似消息）",
+        "[12:03] user4: 好",
+    ]
+
+
+def test_transcript_lines_truncates_each_message():
+    messages = [record(1, 0, "word " * 100)]
+    [only] = transcript_lines(messages, 10)
+    assert only.endswith(TRUNCATION_MARK)